@@ -8,5 +8,20 @@ __version__= "4.0.1"
 # from .dev.bump_version import bump_version
 # from .gpkgs import message as msg
 from .gpkgs import shell_helpers as _shell
-from .dev.gitlib import GitLib, SwitchDir, BranchStatus, Remote
-
+from .dev.gitlib import GitLib, SwitchDir, BranchStatus, BranchCompare, Remote, PushBatch, CommitResult, Message, FetchedRef
+from .dev.errors import GitLibError, GitCommandError, GitTimeoutError, NotGitRepositoryError, NotBareRepositoryError, BranchNameError, RemoteNameError, PrincipalBranchError, ClonePathError, PromptRequiredError
+from .dev.catfile import CatFile, CatFileObject
+from .dev.gitdir import GitDir, GitConfig
+from .dev.async_gitlib import AsyncGitLib
+from .dev.fleet import GitFleet, FleetResult
+from .dev.remote_refs import LsRemoteCache, RemoteRefs
+from .dev.stats import GitCall, GitStats
+from .dev.status import StatusEntry
+from .dev.status_cache import StatusCache
+from .dev.watcher import RepoWatcher, RepoEvent, RepoEventKind
+from .dev.ssh_mux import SshMux
+from .dev.plan import CommandPlan, PlanStep
+from .dev.snapshot import RepoSnapshot, RefEntry, RefChange
+from .dev.commit_graph import CommitGraph
+from .dev.maintenance import MaintenanceScheduler, MaintenanceResult, MaintenanceTask, RepoHealth, get_repo_health, maintain
+from .dev.clone_cache import CloneCache
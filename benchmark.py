@@ -0,0 +1,238 @@
+#!/usr/bin/env python3
+"""
+benchmarks GitLib operations on synthetic local repositories.
+Remotes are local bare repositories. Results are saved as json to compare versions:
+    ./benchmark.py --branches 50 --commits 2000 --output bench.json
+    ./benchmark.py --output bench_new.json --compare bench.json
+"""
+import argparse
+import contextlib
+import importlib
+import io
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+def run_git(cmd:list, direpa:str, stdin:bytes|None=None):
+    subprocess.run(["git", *cmd], cwd=direpa, input=stdin, check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+def get_fast_import_stream(commits:int, branches:int, tags:int) -> bytes:
+    lines=[]
+    for index in range(1, commits+1):
+        content=f"line {index}\n".encode()
+        lines.extend([
+            b"commit refs/heads/main",
+            f"mark :{index}".encode(),
+            f"committer bench <bench@example.com> {1700000000+index} +0000".encode(),
+            f"data {len(f'commit {index}')}".encode(),
+            f"commit {index}".encode(),
+        ])
+        if index > 1:
+            lines.append(f"from :{index-1}".encode())
+        lines.extend([
+            f"M 644 inline file_{index % 100}.txt".encode(),
+            f"data {len(content)}".encode(),
+            content.rstrip(b"\n"),
+            b"",
+        ])
+    for index in range(branches):
+        lines.extend([
+            f"reset refs/heads/branch_{index}".encode(),
+            f"from :{max(1, commits-index)}".encode(),
+            b"",
+        ])
+    for index in range(tags):
+        lines.extend([
+            f"reset refs/tags/v{index}".encode(),
+            f"from :{max(1, commits-index*3)}".encode(),
+            b"",
+        ])
+    return b"\n".join(lines)+b"\n"
+
+def build_repositories(direpa_bench:str, commits:int, branches:int, remotes:int, tags:int, untracked:int) -> dict:
+    direpa_src=os.path.join(direpa_bench, "src")
+    os.makedirs(direpa_src)
+    run_git(["init", "--quiet", "--initial-branch=main"], direpa_src)
+    run_git(["config", "user.name", "bench"], direpa_src)
+    run_git(["config", "user.email", "bench@example.com"], direpa_src)
+    run_git(["fast-import", "--quiet"], direpa_src, stdin=get_fast_import_stream(commits=commits, branches=branches, tags=tags))
+    run_git(["checkout", "--quiet", "main"], direpa_src)
+
+    direpas_remote=[]
+    for index in range(remotes):
+        direpa_remote=os.path.join(direpa_bench, f"remote_{index}.git")
+        run_git(["clone", "--quiet", "--bare", direpa_src, direpa_remote], direpa_bench)
+        run_git(["remote", "add", f"remote_{index}", direpa_remote], direpa_src)
+        run_git(["fetch", "--quiet", f"remote_{index}"], direpa_src)
+        direpas_remote.append(direpa_remote)
+    for index in range(min(branches, 10)):
+        if remotes > 0:
+            run_git(["branch", "--quiet", f"--set-upstream-to=remote_0/branch_{index}", f"branch_{index}"], direpa_src)
+
+    for index in range(untracked):
+        with open(os.path.join(direpa_src, f"untracked_{index}.txt"), "w") as f:
+            f.write(f"{index}\n")
+
+    # rename_branch pushes without remote name, it needs a repository with a single remote.
+    # The active branch is renamed on each run.
+    direpa_single=os.path.join(direpa_bench, "single")
+    if remotes > 0:
+        run_git(["clone", "--quiet", direpas_remote[0], direpa_single], direpa_bench)
+        run_git(["config", "user.name", "bench"], direpa_single)
+        run_git(["config", "user.email", "bench@example.com"], direpa_single)
+        run_git(["checkout", "--quiet", "-b", "bench_rename"], direpa_single)
+        run_git(["push", "--quiet", "--set-upstream", "origin", "bench_rename"], direpa_single)
+
+    return dict(
+        direpa_src=direpa_src,
+        direpa_single=direpa_single,
+        direpas_remote=direpas_remote,
+    )
+
+def measure(pkg, name:str, func, repeat:int) -> dict:
+    walls=[]
+    spawns=[]
+    for _ in range(repeat):
+        stats=pkg.GitStats()
+        start=time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            func(stats)
+        walls.append(time.perf_counter()-start)
+        spawns.append(stats.get_spawns())
+    result=dict(
+        runs=repeat,
+        wall_min=min(walls),
+        wall_median=statistics.median(walls),
+        spawns=max(spawns),
+    )
+    print(f"{name:<28} {result['wall_median']*1000:>10.2f}ms {result['spawns']:>6} spawns")
+    return result
+
+def run_benchmarks(pkg, repositories:dict, repeat:int, gitlib_options:dict) -> dict:
+    direpa_src=repositories["direpa_src"]
+    direpa_single=repositories["direpa_single"]
+
+    def get_gitlib(stats, direpa:str=direpa_src):
+        return pkg.GitLib(direpa=direpa, prompt_success=False, quiet=True, on_cmd=stats, **gitlib_options)
+
+    def commit(stats):
+        gitlib=get_gitlib(stats)
+        with open(os.path.join(direpa_src, "bench_commit.txt"), "a") as f:
+            f.write("commit\n")
+        gitlib.commit(message="bench commit")
+
+    renames=dict(count=0)
+    def rename_branch(stats):
+        gitlib=get_gitlib(stats, direpa=direpa_single)
+        branch_name=f"renamed_{renames['count']}"
+        renames["count"]+=1
+        gitlib.rename_branch(new_branch_name=branch_name, remote_name="origin")
+
+    benchmarks=dict(
+        init_update=lambda stats: get_gitlib(stats).update(),
+        get_all_branches=lambda stats: get_gitlib(stats).get_all_branches(),
+        get_branch_compare_status=lambda stats: get_gitlib(stats).get_branch_compare_status(active_branch="branch_0", compare_branch="main"),
+        get_branches_compare_status=lambda stats: get_gitlib(stats).get_branches_compare_status(),
+        need_commit=lambda stats: get_gitlib(stats).need_commit(),
+        get_untracked_files=lambda stats: get_gitlib(stats).get_untracked_files(),
+        commit=commit,
+        get_first_commit=lambda stats: get_gitlib(stats).get_first_commit(),
+        get_local_branches=lambda stats: get_gitlib(stats).get_local_branches(),
+    )
+    if len(repositories["direpas_remote"]) > 0:
+        benchmarks["rename_branch"]=rename_branch
+
+    results=dict()
+    for name, func in benchmarks.items():
+        results[name]=measure(pkg, name, func, repeat=repeat)
+    return results
+
+def compare_results(results:dict, previous:dict, threshold:float):
+    print(f"\ncompared to version {previous.get('version')}:")
+    for name, result in results.items():
+        previous_result=previous["results"].get(name)
+        if previous_result is None:
+            continue
+        ratio=result["wall_median"]/max(previous_result["wall_median"], 1e-9)
+        flag=""
+        if ratio > 1+threshold or result["spawns"] > previous_result["spawns"]:
+            flag="REGRESSION"
+        print(f"{name:<28} x{ratio:>6.2f} spawns {previous_result['spawns']:>4} -> {result['spawns']:<4} {flag}")
+
+if __name__ == "__main__":
+    direpa_script_parent=os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+    module_name=os.path.basename(os.path.dirname(os.path.realpath(__file__)))
+    sys.path.insert(0, direpa_script_parent)
+    pkg = importlib.import_module(module_name)
+    del sys.path[0]
+
+    parser=argparse.ArgumentParser(description="benchmark GitLib operations on synthetic repositories")
+    parser.add_argument("--commits", type=int, default=500)
+    parser.add_argument("--branches", type=int, default=20)
+    parser.add_argument("--remotes", type=int, default=2)
+    parser.add_argument("--tags", type=int, default=20)
+    parser.add_argument("--untracked", type=int, default=50)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--native", action="store_true", help="GitLib(native=True)")
+    parser.add_argument("--batch", action="store_true", help="GitLib(batch=True)")
+    parser.add_argument("--no-chdir", action="store_true", help="GitLib(chdir=False)")
+    parser.add_argument("--output", help="json file to save results")
+    parser.add_argument("--compare", help="json file of a previous run")
+    parser.add_argument("--threshold", type=float, default=0.2, help="slowdown ratio reported as regression")
+    parser.add_argument("--keep", action="store_true", help="keep synthetic repositories")
+    args=parser.parse_args()
+
+    gitlib_options=dict(
+        native=args.native,
+        batch=args.batch,
+        chdir=not args.no_chdir,
+    )
+    params=dict(
+        commits=args.commits,
+        branches=args.branches,
+        remotes=args.remotes,
+        tags=args.tags,
+        untracked=args.untracked,
+        repeat=args.repeat,
+        **gitlib_options,
+    )
+
+    direpa_bench=tempfile.mkdtemp(prefix="gitlib_bench_")
+    try:
+        repositories=build_repositories(
+            direpa_bench,
+            commits=args.commits,
+            branches=args.branches,
+            remotes=args.remotes,
+            tags=args.tags,
+            untracked=args.untracked,
+        )
+        results=run_benchmarks(pkg, repositories, repeat=args.repeat, gitlib_options=gitlib_options)
+    finally:
+        if args.keep is True:
+            print(f"repositories kept at '{direpa_bench}'")
+        else:
+            shutil.rmtree(direpa_bench)
+
+    report=dict(
+        version=pkg.__version__,
+        git_version=subprocess.run(["git", "--version"], capture_output=True, text=True).stdout.strip(),
+        python_version=platform.python_version(),
+        timestamp=time.time(),
+        params=params,
+        results=results,
+    )
+
+    if args.compare is not None:
+        with open(args.compare, "r") as f:
+            compare_results(results, json.load(f), threshold=args.threshold)
+
+    if args.output is not None:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=4, sort_keys=True)
@@ -0,0 +1,219 @@
+#!/usr/bin/env python3
+import asyncio
+import shlex
+import subprocess
+import time
+from typing import Callable, cast
+
+from .commands import get_active_branch_name_cmd, get_branch_on_remote_cmd, get_branch_uptodate_cmd, get_checkout_cmd, get_commit_empty_cmd, get_fetch_cmd, get_fetch_tags_cmd, get_has_head_cmd, get_local_branches_cmd, get_ls_remote_cmd, get_merge_base_cmd, get_merge_cmd, get_pull_cmd, get_push_cmd, get_remote_names_cmd, get_rev_parse_cmd, get_status_cmd, parse_has_head, parse_local_branches, parse_ls_remote, parse_remote_names
+from .errors import GitCommandError, BranchNameError, RemoteNameError
+from .gitlib import GitLib, BranchStatus, get_branch_status
+from .remote_refs import RemoteRefs
+from .ssh_mux import SshMux
+from .stats import GitCall
+from .status import StatusEntry, parse_status
+
+class AsyncGitLib():
+    """awaitable counterpart of GitLib built on asyncio.create_subprocess_exec.
+    Commands are built and their output parsed by the same helpers as GitLib's, only spawning is asynchronous.
+    They run from the repository root without changing the process directory.
+    Errors always raise GitLibError subclasses, even without service, exiting would stop every task of the event loop.
+    """
+    def __init__(self,
+        direpa:str|None=None,
+        prompt_success:bool=True,
+        quiet:bool=False,
+        on_cmd:Callable[[GitCall], None]|None=None,
+        ssh_mux:SshMux|None=None,
+        service:bool=False,
+    ):
+        self.gitlib=GitLib(direpa=direpa, prompt_success=prompt_success, quiet=quiet, chdir=False, on_cmd=on_cmd, ssh_mux=ssh_mux, service=service)
+        self.direpa_root:str|None=None
+
+    async def get_direpa_root(self) -> str:
+        if self.direpa_root is None:
+            # lazy GitLib properties spawn git synchronously, keep them off the event loop
+            self.direpa_root=await asyncio.to_thread(lambda: self.gitlib.direpa_root)
+        return self.direpa_root
+
+    async def run(self, cmd:list, capture:bool=True) -> tuple[int, bytes, str|None]:
+        """returns exit code, stdout and stderr, stderr is only captured in service mode."""
+        stdout_pipe=subprocess.PIPE if capture is True or self.gitlib.service is True else None
+        stderr_pipe=subprocess.PIPE if self.gitlib.service is True else None
+        direpa_root=await self.get_direpa_root()
+        start=time.perf_counter()
+        process=await asyncio.create_subprocess_exec(
+            *self.gitlib.get_exec_cmd(cmd),
+            cwd=direpa_root,
+            stdout=stdout_pipe,
+            stderr=stderr_pipe,
+        )
+        try:
+            stdout, stderr=await process.communicate()
+        except asyncio.CancelledError:
+            # a cancelled task must not leave git running
+            process.kill()
+            await process.wait()
+            raise
+        returncode=cast(int, process.returncode)
+        if self.gitlib.on_cmd is not None:
+            self.gitlib.on_cmd(GitCall(
+                cmd=cmd,
+                direpa=self.gitlib.direpa,
+                direpa_cwd=direpa_root,
+                elapsed=time.perf_counter()-start,
+                exit_code=returncode,
+                output_size=len(stdout) if capture is True and stdout is not None else None,
+            ))
+        return returncode, stdout or b"", None if stderr is None else stderr.decode(errors="replace")
+
+    async def cmd_get_value(self, cmd:list, none_on_error:bool=False) -> str|None:
+        returncode, stdout, stderr=await self.run(cmd)
+        output=stdout.decode(errors="replace")
+        if returncode != 0 and none_on_error is False:
+            raise GitCommandError(cmd, returncode, stdout=output, stderr=stderr, direpa=await self.get_direpa_root())
+        return self.gitlib.get_cmd_value(cmd, returncode, output, stderr, none_on_error=none_on_error)
+
+    async def cmd_devnull(self, cmd:list) -> int:
+        returncode, _, _=await self.run(cmd)
+        return returncode
+
+    async def execute(self, cmd:list, show_only:bool):
+        if show_only is True:
+            print(shlex.join(cmd))
+        else:
+            returncode, stdout, stderr=await self.run(cmd, capture=False)
+            if returncode != 0:
+                raise GitCommandError(cmd, returncode, stdout=stdout.decode(errors="replace") or None, stderr=stderr, direpa=await self.get_direpa_root())
+
+    async def checkout(self, branch_name:str, quiet:bool|None=None, show_only:bool=False):
+        if await self.get_active_branch_name(show_cmds=show_only) != branch_name:
+            await self.execute(get_checkout_cmd(branch_name, self.gitlib.get_quiet_arg(quiet)), show_only=show_only)
+
+    async def commit_empty(self, message:str, quiet:bool|None=None, show_only:bool=False):
+        await self.execute(get_commit_empty_cmd(message, self.gitlib.get_quiet_arg(quiet)), show_only=show_only)
+
+    async def fetch_tags(self, show_only:bool=False):
+        await self.execute(get_fetch_tags_cmd(), show_only=show_only)
+
+    async def fetch(self, remote:str|None=None, quiet:bool|None=None, show_only:bool=False):
+        await self.execute(get_fetch_cmd(remote, self.gitlib.get_quiet_arg(quiet)), show_only=show_only)
+
+    async def get_active_branch_name(self, show_cmds:bool=False):
+        cmd=get_active_branch_name_cmd()
+        if show_cmds is True:
+            print("branch_name:", shlex.join(cmd))
+        branch_name=await self.cmd_get_value(cmd)
+        if not branch_name:
+            raise BranchNameError("No branch name from command git rev-parse --abbrev-ref HEAD at path '{}'".format(await self.get_direpa_root()))
+        else:
+            return branch_name
+
+    async def get_branch_compare_status(self, active_branch:str, compare_branch:str, show_cmds:bool=False) -> BranchStatus:
+        cmds=dict(
+            active_branch_last_commit=get_rev_parse_cmd(active_branch),
+            compare_branch_last_commit=get_rev_parse_cmd(compare_branch),
+            common_ancestor=get_merge_base_cmd(active_branch, compare_branch),
+        )
+        if show_cmds is True:
+            for label, cmd in cmds.items():
+                print(f"{label}:", shlex.join(cmd))
+        active_branch_last_commit, compare_branch_last_commit, common_ancestor=await asyncio.gather(
+            *[self.cmd_get_value(cmd) for cmd in cmds.values()]
+        )
+        return get_branch_status(active_branch_last_commit, compare_branch_last_commit, common_ancestor)
+
+    async def get_local_branches(self, show_cmds:bool=False):
+        cmd=get_local_branches_cmd()
+        if show_cmds is True:
+            print("raw_branches:", shlex.join(cmd))
+        return parse_local_branches(await self.cmd_get_value(cmd))
+
+    async def get_remote_refs(self, remote_name:str|None=None, label:str="refs", show_cmds:bool=False) -> RemoteRefs:
+        if remote_name is None:
+            remote_name=await self.get_remote_name()
+        cmd=get_ls_remote_cmd(remote_name)
+        if show_cmds is True:
+            print(f"{label}:", shlex.join(cmd))
+        return RemoteRefs(remote_name=remote_name, location=remote_name, refs=parse_ls_remote(await self.cmd_get_value(cmd)))
+
+    async def get_remote_branches(self, remote_name:str|None=None, show_cmds:bool=False):
+        remote_refs=await self.get_remote_refs(remote_name, label="raw_branches", show_cmds=show_cmds)
+        return remote_refs.get_branches()
+
+    async def get_remote_name(self):
+        remote_names=await self.get_remote_names()
+        if len(remote_names) == 0:
+            return self.gitlib.default_remote
+        elif len(remote_names) == 1:
+            return remote_names[0]
+        else:
+            raise RemoteNameError(f"Please choose a remote name from {remote_names}.")
+
+    async def get_remote_names(self, show_cmds:bool=False):
+        cmd=get_remote_names_cmd()
+        if show_cmds is True:
+            print("raw_remotes:", shlex.join(cmd))
+        return parse_remote_names(await self.cmd_get_value(cmd))
+
+    async def get_status(self, label:str="status", show_cmds:bool=False) -> list[StatusEntry]:
+        cmd=get_status_cmd()
+        if show_cmds is True:
+            print(f"{label}:", shlex.join(cmd))
+        returncode, stdout, stderr=await self.run(cmd)
+        if returncode != 0:
+            raise GitCommandError(cmd, returncode, stderr=stderr, direpa=await self.get_direpa_root())
+        return list(parse_status(iter(stdout.split(b"\0"))))
+
+    async def get_untracked_files(self, show_cmds:bool=False) -> list:
+        """returns 'git status --porcelain' lines."""
+        return [entry.to_porcelain_v1() for entry in await self.get_status(label="files_to_commit", show_cmds=show_cmds)]
+
+    async def has_head(self, show_cmds:bool=False):
+        cmd=get_has_head_cmd()
+        if show_cmds is True:
+            print("output:", shlex.join(cmd))
+        return parse_has_head(await self.cmd_get_value(cmd, none_on_error=True))
+
+    async def is_branch_on_remote(self, remote_name:str|None=None, branch_name:str|None=None, show_cmds:bool=False):
+        if remote_name is None:
+            remote_name=self.gitlib.default_remote
+        if branch_name is None:
+            branch_name=await self.get_active_branch_name(show_cmds=show_cmds)
+        cmd=get_branch_on_remote_cmd(remote_name, branch_name)
+        if show_cmds is True:
+            print("result:", shlex.join(cmd))
+        result=await self.cmd_get_value(cmd)
+        if result is None:
+            return False
+        else:
+            return True
+
+    async def is_branch_uptodate(self, show_cmds:bool=False):
+        cmd=get_branch_uptodate_cmd()
+        if show_cmds is True:
+            print("is_uptodate:", shlex.join(cmd))
+        return (await self.cmd_get_value(cmd) is None)
+
+    async def merge(self, branch_name:str, show_only:bool=False):
+        await self.execute(get_merge_cmd(branch_name), show_only=show_only)
+
+    async def need_commit(self, show_files:bool=False, show_cmds:bool=False):
+        files_to_commit=await self.get_untracked_files(show_cmds=show_cmds)
+        if show_files is True and len(files_to_commit) > 0:
+            self.gitlib.print("__untracked files present__")
+            for f in files_to_commit:
+                self.gitlib.print("  {}".format(f))
+        return len(files_to_commit) > 0
+
+    async def pull(self, remote:str|None=None, branch_name:str|None=None, quiet:bool|None=None, show_only:bool=False):
+        if branch_name is None:
+            branch_name=await self.get_active_branch_name(show_cmds=show_only)
+        await self.execute(get_pull_cmd(branch_name, remote, self.gitlib.get_quiet_arg(quiet)), show_only=show_only)
+
+    async def push(self, remote_name:str|None=None, branch_name:str|None=None, set_upstream:bool=False, quiet:bool|None=None, show_only:bool=False):
+        if remote_name is None:
+            remote_name=await self.get_remote_name()
+        if branch_name is None and set_upstream is True:
+            branch_name=await self.get_active_branch_name(show_cmds=show_only)
+        await self.execute(get_push_cmd(remote_name, branch_name, set_upstream, self.gitlib.get_quiet_arg(quiet)), show_only=show_only)
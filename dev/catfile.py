@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+import subprocess
+import threading
+from typing import IO, cast
+
+class CatFileObject():
+    def __init__(self, sha:str, type:str, size:int, content:bytes|None=None):
+        self.sha=sha
+        self.type=type
+        self.size=size
+        self.content=content
+
+class CatFile():
+    """keeps 'git cat-file --batch-check' and 'git cat-file --batch' processes open for a repository.
+    Each lookup is one pipe round-trip. A process that died is restarted on next lookup.
+    """
+    def __init__(self, direpa:str):
+        self.direpa=direpa
+        self.processes:dict[str, subprocess.Popen]=dict()
+        self.lock=threading.Lock()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
+
+    def get_process(self, mode:str) -> subprocess.Popen:
+        process=self.processes.get(mode)
+        if process is None or process.poll() is not None:
+            process=subprocess.Popen(
+                ["git", "cat-file", mode],
+                cwd=self.direpa,
+                stdin=subprocess.PIPE,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.DEVNULL,
+            )
+            self.processes[mode]=process
+        return process
+
+    def stop_process(self, mode:str):
+        process=self.processes.pop(mode, None)
+        if process is not None:
+            try:
+                if process.stdin is not None:
+                    process.stdin.close()
+                process.wait(timeout=5)
+            except (OSError, subprocess.TimeoutExpired):
+                process.kill()
+                process.wait()
+            if process.stdout is not None:
+                process.stdout.close()
+
+    def stop(self):
+        with self.lock:
+            for mode in list(self.processes):
+                self.stop_process(mode)
+
+    def query(self, rev:str, mode:str) -> CatFileObject|None:
+        if "\n" in rev:
+            raise ValueError(f"cat-file revision must not contain newline '{rev!r}'")
+
+        with self.lock:
+            for attempt in range(2):
+                process=self.get_process(mode)
+                stdin=cast(IO[bytes], process.stdin)
+                stdout=cast(IO[bytes], process.stdout)
+                try:
+                    stdin.write(f"{rev}\n".encode())
+                    stdin.flush()
+                    header=stdout.readline()
+                    if not header:
+                        raise BrokenPipeError()
+
+                    fields=header.decode().rstrip("\n").rsplit(" ", 2)
+                    if fields[-1] in ["missing", "ambiguous"]:
+                        return None
+                    sha, object_type, size=fields
+                    content=None
+                    if mode == "--batch":
+                        content=stdout.read(int(size))
+                        stdout.read(1)
+                    return CatFileObject(sha=sha, type=object_type, size=int(size), content=content)
+                except (BrokenPipeError, ConnectionResetError, ValueError):
+                    self.stop_process(mode)
+                    if attempt == 1:
+                        raise
+        return None
+
+    def check(self, rev:str) -> CatFileObject|None:
+        return self.query(rev, "--batch-check")
+
+    def read(self, rev:str) -> CatFileObject|None:
+        return self.query(rev, "--batch")
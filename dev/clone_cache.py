@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+import contextlib
+import hashlib
+import os
+import re
+import shlex
+import shutil
+import subprocess
+import threading
+import time
+
+try:
+    import fcntl
+except ImportError:
+    fcntl=None
+
+from .errors import GitCommandError
+from .ssh_mux import SshMux
+
+class CloneCache():
+    """pool of bare mirrors in direpa, one per source url, used by GitLib.clone(clone_cache=...) as '--reference'.
+    A clone made through the cache only fetches objects missing from the mirror, its objects/info/alternates points
+    to the mirror unless the clone is made with dissociate=True.
+        clone_cache=CloneCache("/var/cache/git", max_age=300)
+        gitlib.clone(url, direpa_dst, clone_cache=clone_cache)
+    A mirror older than max_age seconds is fetched before it is used, max_age=None never fetches an existing mirror.
+    Mirrors are locked with flock while they are created or fetched, so CI jobs sharing a cache directory wait for each other.
+    """
+    def __init__(self, direpa:str, max_age:float|None=300, ssh_mux:SshMux|None=None):
+        self.direpa=os.path.abspath(direpa)
+        self.max_age=max_age
+        self.ssh_mux=ssh_mux
+        self.locks:dict[str, threading.Lock]=dict()
+        self.lock=threading.Lock()
+
+    def get_direpa_mirror(self, url:str) -> str:
+        name=re.sub(r"\.git$", "", os.path.basename(url.rstrip("/"))) or "repo"
+        digest=hashlib.sha1(url.encode()).hexdigest()[:16]
+        return os.path.join(self.direpa, f"{name}-{digest}.git")
+
+    def get_mirrors(self) -> list[str]:
+        if not os.path.isdir(self.direpa):
+            return []
+        return sorted(os.path.join(self.direpa, filen) for filen in os.listdir(self.direpa) if filen.endswith(".git"))
+
+    @contextlib.contextmanager
+    def lock_mirror(self, direpa_mirror:str):
+        with self.lock:
+            lock=self.locks.setdefault(direpa_mirror, threading.Lock())
+        with lock:
+            os.makedirs(self.direpa, exist_ok=True)
+            with open(f"{direpa_mirror}.lock", "a") as f:
+                if fcntl is not None:
+                    fcntl.flock(f, fcntl.LOCK_EX)
+                try:
+                    yield
+                finally:
+                    if fcntl is not None:
+                        fcntl.flock(f, fcntl.LOCK_UN)
+
+    def get_age(self, direpa_mirror:str) -> float|None:
+        try:
+            return time.time()-os.stat(os.path.join(direpa_mirror, "FETCH_HEAD")).st_mtime
+        except FileNotFoundError:
+            return None
+
+    def run(self, cmd:list, show_only:bool=False):
+        if show_only is True:
+            print(shlex.join(cmd))
+            return
+        exec_cmd=cmd
+        if self.ssh_mux is not None:
+            exec_cmd=[cmd[0], *self.ssh_mux.get_git_args(), *cmd[1:]]
+        process=subprocess.run(exec_cmd, capture_output=True, text=True, errors="replace")
+        if process.returncode != 0:
+            raise GitCommandError(cmd, process.returncode, stdout=process.stdout, stderr=process.stderr)
+
+    def get_mirror(self, url:str, show_only:bool=False) -> str:
+        """returns the mirror of url, it is cloned when missing and fetched when older than max_age.
+        A local url must be absolute, git runs from the process directory.
+        """
+        direpa_mirror=self.get_direpa_mirror(url)
+        if show_only is True:
+            self.update(url, show_only=True)
+            return direpa_mirror
+        with self.lock_mirror(direpa_mirror):
+            age=self.get_age(direpa_mirror)
+            if not os.path.isdir(direpa_mirror) or age is None or self.max_age is None or age > self.max_age:
+                self.update(url, locked=True)
+        return direpa_mirror
+
+    def update(self, url:str, locked:bool=False, show_only:bool=False) -> str:
+        """clones or fetches the mirror of url now."""
+        direpa_mirror=self.get_direpa_mirror(url)
+        if locked is False and show_only is False:
+            with self.lock_mirror(direpa_mirror):
+                return self.update(url, locked=True)
+
+        if os.path.isdir(direpa_mirror):
+            self.run(["git", "-C", direpa_mirror, "fetch", "--prune", "--quiet", "origin"], show_only=show_only)
+        else:
+            # cloned next to its final path, an interrupted clone never looks like a mirror
+            direpa_tmp=f"{direpa_mirror}.tmp"
+            if show_only is False:
+                shutil.rmtree(direpa_tmp, ignore_errors=True)
+            self.run(["git", "clone", "--mirror", "--quiet", url, direpa_tmp], show_only=show_only)
+            if show_only is False:
+                os.rename(direpa_tmp, direpa_mirror)
+        if show_only is False:
+            with open(os.path.join(direpa_mirror, "FETCH_HEAD"), "a"):
+                os.utime(os.path.join(direpa_mirror, "FETCH_HEAD"))
+        return direpa_mirror
+
+    def remove(self, url:str):
+        direpa_mirror=self.get_direpa_mirror(url)
+        with self.lock_mirror(direpa_mirror):
+            shutil.rmtree(direpa_mirror, ignore_errors=True)
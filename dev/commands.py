@@ -0,0 +1,176 @@
+#!/usr/bin/env python3
+import re
+
+# git command lines and parsers of their output, shared by GitLib and AsyncGitLib so both run the same commands.
+# quiet_arg is the result of GitLib.get_quiet_arg().
+
+def add_quiet_arg(cmd:list, quiet_arg:str|None) -> list:
+    if quiet_arg is not None:
+        cmd.append(quiet_arg)
+    return cmd
+
+def get_checkout_cmd(branch_name:str, quiet_arg:str|None=None) -> list:
+    cmd=add_quiet_arg([
+        "git",
+        "checkout",
+    ], quiet_arg)
+    cmd.append(branch_name)
+    return cmd
+
+def get_commit_empty_cmd(message:str, quiet_arg:str|None=None) -> list:
+    cmd=add_quiet_arg([
+        "git",
+        "commit",
+    ], quiet_arg)
+    cmd.extend([
+        "--allow-empty",
+        "-m",
+        message,
+    ])
+    return cmd
+
+def get_fetch_tags_cmd() -> list:
+    return [
+        "git",
+        "fetch",
+        "--tags",
+    ]
+
+def get_fetch_cmd(remote:str|None=None, quiet_arg:str|None=None) -> list:
+    cmd=add_quiet_arg([
+        "git",
+        "fetch",
+    ], quiet_arg)
+    if remote is not None:
+        cmd.append(remote)
+    return cmd
+
+def get_active_branch_name_cmd() -> list:
+    return [
+        "git",
+        "rev-parse",
+        "--abbrev-ref",
+        "HEAD",
+    ]
+
+def get_rev_parse_cmd(rev:str) -> list:
+    return [
+        "git",
+        "rev-parse",
+        rev,
+    ]
+
+def get_merge_base_cmd(rev1:str, rev2:str) -> list:
+    return [
+        "git",
+        "merge-base",
+        rev1,
+        rev2,
+    ]
+
+def get_local_branches_cmd() -> list:
+    return [
+        "git",
+        "branch",
+    ]
+
+def parse_local_branches(output:str|None) -> list[str]:
+    branches=[]
+    if output is not None:
+        # remove the asterisk and strip all
+        for branch in output.splitlines():
+            branches.append(re.sub(r"^\* ","",branch).strip())
+    return branches
+
+def get_ls_remote_cmd(remote_name:str) -> list:
+    return [
+        "git",
+        "ls-remote",
+        remote_name,
+    ]
+
+def parse_ls_remote(output:str|None) -> dict[str, str]:
+    """
+    string format
+    d06a492857eea71f64c51257ec81645e50f40957        refs/heads/develop
+    """
+    refs=dict()
+    if output is not None:
+        for line in output.splitlines():
+            sha, _, refname=line.partition("\t")
+            refs[refname.strip()]=sha.strip()
+    return refs
+
+def get_remote_names_cmd() -> list:
+    return [
+        "git",
+        "remote",
+    ]
+
+def parse_remote_names(output:str|None) -> list[str]:
+    remotes=[]
+    if output is not None:
+        for remote in output.splitlines():
+            remotes.append(remote.strip())
+    return remotes
+
+def get_status_cmd() -> list:
+    return [
+        "git",
+        "status",
+        "--porcelain=v2",
+        "-z",
+    ]
+
+def get_has_head_cmd() -> list:
+    return get_rev_parse_cmd("HEAD")
+
+def parse_has_head(output:str|None) -> bool:
+    """output of get_has_head_cmd() read with none_on_error, without commit git fails and may print 'HEAD'."""
+    return output is not None and output != "HEAD"
+
+def get_branch_on_remote_cmd(remote_name:str, branch_name:str) -> list:
+    return [
+        "git",
+        "ls-remote",
+        "--heads",
+        remote_name,
+        branch_name,
+    ]
+
+def get_branch_uptodate_cmd() -> list:
+    return [
+        "git",
+        "fetch",
+        "--dry-run",
+    ]
+
+def get_merge_cmd(branch_name:str) -> list:
+    return [
+        "git",
+        "merge",
+        "--no-edit",
+        branch_name,
+    ]
+
+def get_pull_cmd(branch_name:str, remote:str|None=None, quiet_arg:str|None=None) -> list:
+    cmd=add_quiet_arg([
+        "git",
+        "pull",
+    ], quiet_arg)
+    if remote is not None:
+        cmd.append(remote)
+    cmd.append(branch_name)
+    return cmd
+
+def get_push_cmd(remote_name:str, branch_name:str|None=None, set_upstream:bool=False, quiet_arg:str|None=None) -> list:
+    cmd=add_quiet_arg([
+        "git",
+        "push",
+    ], quiet_arg)
+    if set_upstream is True:
+        cmd.append("--set-upstream")
+    cmd.append(remote_name)
+    if branch_name is not None:
+        cmd.append(branch_name)
+    return cmd
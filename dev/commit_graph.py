@@ -0,0 +1,310 @@
+#!/usr/bin/env python3
+import heapq
+import os
+import struct
+from array import array
+from typing import cast
+
+from .gitdir import get_signature
+
+GRAPH_PARENT_NONE=0x70000000
+GRAPH_EXTRA_EDGES=0x80000000
+GRAPH_LAST_EDGE=0x80000000
+CORRECTED_DATE_OVERFLOW=0x80000000
+
+class CommitGraphLayer():
+    """one commit-graph file, commit data is unpacked from the file content when a commit is visited."""
+    def __init__(self, filenpa:str, data:bytes, position:int):
+        self.filenpa=filenpa
+        self.data=data
+        self.position=position
+        if data[:4] != b"CGPH" or data[4] != 1:
+            raise ValueError(f"'{filenpa}' is not a version 1 commit-graph")
+        hash_version=data[5]
+        if hash_version == 1:
+            self.hash_size=20
+        elif hash_version == 2:
+            self.hash_size=32
+        else:
+            raise ValueError(f"'{filenpa}' has unknown hash version {hash_version}")
+
+        self.chunks:dict[bytes, tuple[int, int]]=dict()
+        num_chunks=data[6]
+        for index in range(num_chunks):
+            chunk_id, offset=struct.unpack_from(">4sQ", data, 8+index*12)
+            _, next_offset=struct.unpack_from(">4sQ", data, 8+(index+1)*12)
+            self.chunks[chunk_id]=(offset, next_offset)
+        for chunk_id in [b"OIDF", b"OIDL", b"CDAT"]:
+            if chunk_id not in self.chunks:
+                raise ValueError(f"'{filenpa}' has no {chunk_id.decode()} chunk")
+
+        self.fanout=array("I", data[self.chunks[b"OIDF"][0]:self.chunks[b"OIDF"][0]+256*4])
+        if array("I", [1]).tobytes() != b"\x00\x00\x00\x01":
+            self.fanout.byteswap()
+        self.count=self.fanout[255]
+        self.oidl=self.chunks[b"OIDL"][0]
+        self.cdat=self.chunks[b"CDAT"][0]
+        self.edge=self.chunks.get(b"EDGE", (None, None))[0]
+        self.gda2=self.chunks.get(b"GDA2", (None, None))[0]
+        self.gdo2=self.chunks.get(b"GDO2", (None, None))[0]
+
+    def get_local_position(self, oid:bytes) -> int|None:
+        first=oid[0]
+        low=0 if first == 0 else self.fanout[first-1]
+        high=self.fanout[first]
+        size=self.hash_size
+        while low < high:
+            middle=(low+high)//2
+            start=self.oidl+middle*size
+            value=self.data[start:start+size]
+            if value == oid:
+                return middle
+            elif value < oid:
+                low=middle+1
+            else:
+                high=middle
+        return None
+
+class CommitGraph():
+    """in-process reader for objects/info/commit-graph and split commit-graph chains.
+    Commits are addressed by their position in the graph, reachability walks visit commits by decreasing generation
+    number and stop as soon as the answer is known.
+    Queries return None when a commit is not in the graph, the caller then asks git, 'git commit-graph write' adds new commits.
+        graph=CommitGraph.load(os.path.join(direpa_git, "objects"))
+        graph.get_ahead_behind([(sha_branch, sha_upstream), (sha_other, sha_upstream)])
+    """
+    def __init__(self, layers:list[CommitGraphLayer]):
+        self.layers=layers
+        self.count=sum(layer.count for layer in layers)
+        # corrected commit dates are only comparable when every layer has them
+        self.use_corrected_dates=all(layer.gda2 is not None for layer in layers)
+
+    @staticmethod
+    def get_filenpas(direpa_objects:str) -> list[str]:
+        filenpa_chain=os.path.join(direpa_objects, "info", "commit-graphs", "commit-graph-chain")
+        if os.path.isfile(filenpa_chain):
+            with open(filenpa_chain, "r") as f:
+                return [os.path.join(direpa_objects, "info", "commit-graphs", f"graph-{line.strip()}.graph") for line in f if line.strip()]
+        filenpa_graph=os.path.join(direpa_objects, "info", "commit-graph")
+        if os.path.isfile(filenpa_graph):
+            return [filenpa_graph]
+        return []
+
+    @staticmethod
+    def get_signature(direpa_objects:str):
+        filenpa_chain=os.path.join(direpa_objects, "info", "commit-graphs", "commit-graph-chain")
+        return (get_signature(filenpa_chain), get_signature(os.path.join(direpa_objects, "info", "commit-graph")))
+
+    @staticmethod
+    def load(direpa_objects:str) -> "CommitGraph|None":
+        """returns None when the repository has no commit-graph or when it can't be read."""
+        layers:list[CommitGraphLayer]=[]
+        try:
+            position=0
+            for filenpa in CommitGraph.get_filenpas(direpa_objects):
+                with open(filenpa, "rb") as f:
+                    layer=CommitGraphLayer(filenpa, f.read(), position)
+                layers.append(layer)
+                position+=layer.count
+        except (OSError, ValueError, struct.error):
+            return None
+        if len(layers) == 0:
+            return None
+        graph=CommitGraph(layers)
+        if graph.count > 0 and graph.get_generation(0) == 0:
+            # written by a git version without generation numbers, walks can't be ordered
+            return None
+        return graph
+
+    def get_layer(self, position:int) -> CommitGraphLayer:
+        for layer in self.layers:
+            if position < layer.position+layer.count:
+                return layer
+        raise IndexError(f"commit-graph position {position} out of range")
+
+    def get_position(self, sha:str) -> int|None:
+        try:
+            oid=bytes.fromhex(sha)
+        except ValueError:
+            return None
+        for layer in self.layers:
+            if len(oid) != layer.hash_size:
+                return None
+            position=layer.get_local_position(oid)
+            if position is not None:
+                return layer.position+position
+        return None
+
+    def get_sha(self, position:int) -> str:
+        layer=self.get_layer(position)
+        start=layer.oidl+(position-layer.position)*layer.hash_size
+        return layer.data[start:start+layer.hash_size].hex()
+
+    def get_parents(self, position:int) -> list[int]:
+        layer=self.get_layer(position)
+        start=layer.cdat+(position-layer.position)*(layer.hash_size+16)+layer.hash_size
+        parent1, parent2=struct.unpack_from(">II", layer.data, start)
+        parents=[]
+        if parent1 != GRAPH_PARENT_NONE:
+            parents.append(parent1)
+        if parent2 == GRAPH_PARENT_NONE:
+            return parents
+        elif parent2 & GRAPH_EXTRA_EDGES:
+            if layer.edge is None:
+                raise ValueError(f"'{layer.filenpa}' has octopus merges and no EDGE chunk")
+            index=parent2 & ~GRAPH_EXTRA_EDGES
+            while True:
+                edge,=struct.unpack_from(">I", layer.data, layer.edge+index*4)
+                parents.append(edge & ~GRAPH_LAST_EDGE)
+                if edge & GRAPH_LAST_EDGE:
+                    break
+                index+=1
+        else:
+            parents.append(parent2)
+        return parents
+
+    def get_generation(self, position:int) -> int:
+        """corrected commit date when every layer has it, topological level otherwise. A commit's generation is always
+        greater than the generation of its parents.
+        """
+        layer=self.get_layer(position)
+        local_position=position-layer.position
+        value,=struct.unpack_from(">Q", layer.data, layer.cdat+local_position*(layer.hash_size+16)+layer.hash_size+8)
+        if self.use_corrected_dates is False:
+            return value >> 34
+        commit_time=value & ((1 << 34)-1)
+        offset,=struct.unpack_from(">I", layer.data, cast(int, layer.gda2)+local_position*4)
+        if offset & CORRECTED_DATE_OVERFLOW:
+            if layer.gdo2 is None:
+                raise ValueError(f"'{layer.filenpa}' has no GDO2 chunk")
+            offset,=struct.unpack_from(">Q", layer.data, layer.gdo2+(offset & ~CORRECTED_DATE_OVERFLOW)*8)
+        return commit_time+offset
+
+    def get_positions(self, shas:list[str]) -> list[int]|None:
+        positions=[]
+        for sha in shas:
+            position=self.get_position(sha)
+            if position is None:
+                return None
+            positions.append(position)
+        return positions
+
+    def is_ancestor(self, ancestor:str, descendant:str) -> bool|None:
+        """same answer as 'git merge-base --is-ancestor ancestor descendant'."""
+        positions=self.get_positions([ancestor, descendant])
+        if positions is None:
+            return None
+        position_ancestor, position_descendant=positions
+        generation_ancestor=self.get_generation(position_ancestor)
+        stack=[position_descendant]
+        seen={position_descendant}
+        while len(stack) > 0:
+            position=stack.pop()
+            if position == position_ancestor:
+                return True
+            for parent in self.get_parents(position):
+                # a commit with a lower generation can't reach the ancestor
+                if parent not in seen and self.get_generation(parent) >= generation_ancestor:
+                    seen.add(parent)
+                    stack.append(parent)
+        return False
+
+    def get_merge_bases(self, sha1:str, sha2:str) -> list[str]|None:
+        """same commits as 'git merge-base --all sha1 sha2', highest generation first."""
+        positions=self.get_positions([sha1, sha2])
+        if positions is None:
+            return None
+        position1, position2=positions
+        if position1 == position2:
+            return [sha1]
+
+        parent1, parent2, stale=1, 2, 4
+        flags={position1: parent1, position2: parent2}
+        queue=[(-self.get_generation(position1), position1), (-self.get_generation(position2), position2)]
+        heapq.heapify(queue)
+        active=2
+        candidates=[]
+        while active > 0:
+            _, position=heapq.heappop(queue)
+            flag=flags[position]
+            if not flag & stale:
+                active-=1
+            if flag & (parent1 | parent2) == (parent1 | parent2) and not flag & stale:
+                candidates.append(position)
+                flag|=stale
+            for parent in self.get_parents(position):
+                parent_flag=flags.get(parent)
+                if parent_flag is None:
+                    flags[parent]=flag
+                    heapq.heappush(queue, (-self.get_generation(parent), parent))
+                    if not flag & stale:
+                        active+=1
+                elif parent_flag | flag != parent_flag:
+                    if not parent_flag & stale and flag & stale:
+                        active-=1
+                    flags[parent]=parent_flag | flag
+
+        # a candidate reachable from another candidate is not a merge base
+        merge_bases=[]
+        for candidate in candidates:
+            sha=self.get_sha(candidate)
+            if not any(other != candidate and self.is_ancestor(sha, self.get_sha(other)) for other in candidates):
+                merge_bases.append(sha)
+        return merge_bases
+
+    def get_merge_base(self, sha1:str, sha2:str) -> str|None:
+        """returns the best common ancestor like 'git merge-base', an empty string when there is none,
+        None when a commit is not in the graph.
+        """
+        merge_bases=self.get_merge_bases(sha1, sha2)
+        if merge_bases is None:
+            return None
+        if len(merge_bases) == 0:
+            return ""
+        return merge_bases[0]
+
+    def get_ahead_behind(self, pairs:list[tuple[str, str]]) -> list[tuple[int, int]]|None:
+        """returns (ahead, behind) for every (sha, base) pair like 'git rev-list --left-right --count sha...base'.
+        All pairs are counted with one walk: each commit gets a bit mask of the tips reaching it,
+        the walk ends when every queued commit is reached by all tips.
+        """
+        shas=sorted({sha for pair in pairs for sha in pair})
+        positions=self.get_positions(shas)
+        if positions is None:
+            return None
+        bits={sha: 1 << index for index, sha in enumerate(shas)}
+        all_bits=(1 << len(shas))-1
+
+        masks:dict[int, int]=dict()
+        for sha, position in zip(shas, positions):
+            masks[position]=masks.get(position, 0) | bits[sha]
+        queue=[(-self.get_generation(position), position) for position in masks]
+        heapq.heapify(queue)
+        active=sum(1 for mask in masks.values() if mask != all_bits)
+        # commits are counted by mask, the number of distinct masks stays small
+        counts:dict[int, int]=dict()
+        while active > 0 and len(queue) > 0:
+            _, position=heapq.heappop(queue)
+            mask=masks[position]
+            if mask != all_bits:
+                active-=1
+            counts[mask]=counts.get(mask, 0)+1
+            for parent in self.get_parents(position):
+                parent_mask=masks.get(parent)
+                if parent_mask is None:
+                    masks[parent]=mask
+                    heapq.heappush(queue, (-self.get_generation(parent), parent))
+                    if mask != all_bits:
+                        active+=1
+                elif parent_mask | mask != parent_mask:
+                    masks[parent]=parent_mask | mask
+                    if parent_mask | mask == all_bits:
+                        active-=1
+
+        results=[]
+        for sha, base in pairs:
+            bit_sha, bit_base=bits[sha], bits[base]
+            ahead=sum(count for mask, count in counts.items() if mask & bit_sha and not mask & bit_base)
+            behind=sum(count for mask, count in counts.items() if mask & bit_base and not mask & bit_sha)
+            results.append((ahead, behind))
+        return results
@@ -0,0 +1,55 @@
+#!/usr/bin/env python3
+import shlex
+import subprocess
+
+class GitLibError(Exception):
+    """base error raised by GitLib(service=True) instead of printing and exiting."""
+    pass
+
+class GitCommandError(GitLibError, subprocess.CalledProcessError):
+    def __init__(self, cmd:list, returncode:int, stdout:str|None=None, stderr:str|None=None, direpa:str|None=None):
+        subprocess.CalledProcessError.__init__(self, returncode, cmd, output=stdout, stderr=stderr)
+        self.direpa=direpa
+
+    def __str__(self):
+        text=f"Command '{shlex.join(self.cmd)}' returned exit status {self.returncode}"
+        if self.direpa is not None:
+            text+=f" at path '{self.direpa}'"
+        if self.stderr:
+            text+=f": {self.stderr.strip()}"
+        return text
+
+class GitTimeoutError(GitLibError, subprocess.TimeoutExpired):
+    """the command was killed because the GitLib deadline was reached."""
+    def __init__(self, cmd:list, timeout:float, direpa:str|None=None):
+        subprocess.TimeoutExpired.__init__(self, cmd, timeout)
+        self.direpa=direpa
+
+    def __str__(self):
+        text=f"Command '{shlex.join(self.cmd)}' timed out after {self.timeout:.1f}s"
+        if self.direpa is not None:
+            text+=f" at path '{self.direpa}'"
+        return text
+
+class NotGitRepositoryError(GitLibError):
+    pass
+
+class NotBareRepositoryError(GitLibError):
+    pass
+
+class BranchNameError(GitLibError):
+    pass
+
+class RemoteNameError(GitLibError):
+    pass
+
+class PrincipalBranchError(GitLibError):
+    pass
+
+class ClonePathError(GitLibError):
+    """the local source of a clone does not exist."""
+    pass
+
+class PromptRequiredError(GitLibError):
+    """service mode does not prompt, the value must be given as argument."""
+    pass
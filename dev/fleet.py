@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+import queue
+import threading
+import time
+from typing import Callable, Iterator
+
+from .errors import GitTimeoutError
+from .gitlib import GitLib
+
+class FleetResult():
+    def __init__(self,
+        direpa:str,
+        value=None,
+        error:BaseException|None=None,
+        elapsed:float=0.0,
+        timed_out:bool=False,
+    ):
+        self.direpa=direpa
+        self.value=value
+        self.error=error
+        self.elapsed=elapsed
+        self.timed_out=timed_out
+
+class GitFleet():
+    """runs a GitLib operation across many repositories with at most workers repositories in flight.
+    Results are yielded as each repository finishes. The GitLib of each repository gets a deadline timeout seconds
+    after its start, the git command running at the deadline is killed and the repository is reported with timed_out=True.
+    A worker stuck outside of git is reported at its deadline too, it keeps its slot until it returns so no more
+    than workers threads and git processes are ever alive.
+    """
+    def __init__(self,
+        direpas:list[str],
+        workers:int=8,
+        timeout:float|None=None,
+        **gitlib_options,
+    ):
+        self.direpas=direpas
+        self.workers=workers
+        self.timeout=timeout
+        # seconds given to a worker after its deadline to report the killed git command itself
+        self.grace=1.0
+        self.gitlib_options=gitlib_options
+
+    def get_gitlib(self, direpa:str, deadline:float|None=None) -> GitLib:
+        return GitLib(direpa=direpa, chdir=False, deadline=deadline, **self.gitlib_options)
+
+    def run_one(self, index:int, operation:str|Callable, args:tuple, kwargs:dict, results:queue.Queue, start:float):
+        direpa=self.direpas[index]
+        deadline=None
+        if self.timeout is not None:
+            deadline=start+self.timeout
+        gitlib=None
+        try:
+            gitlib=self.get_gitlib(direpa, deadline=deadline)
+            if isinstance(operation, str):
+                value=getattr(gitlib, operation)(*args, **kwargs)
+            else:
+                value=operation(gitlib, *args, **kwargs)
+            results.put((index, FleetResult(direpa=direpa, value=value, elapsed=time.monotonic()-start)))
+        except (Exception, SystemExit) as e:
+            # msg.error(..., exit=1) raises SystemExit, it must not stop the fleet
+            results.put((index, FleetResult(direpa=direpa, error=e, elapsed=time.monotonic()-start, timed_out=isinstance(e, GitTimeoutError))))
+        finally:
+            if gitlib is not None:
+                gitlib.stop_batch()
+
+    def run(self, operation:str|Callable, *args, **kwargs) -> Iterator[FleetResult]:
+        """operation is a GitLib method name or a callable receiving the GitLib as first argument."""
+        results:queue.Queue=queue.Queue()
+        waiting=list(range(len(self.direpas)))
+        # running: workers whose result is not yielded yet, alive: workers whose thread has not returned yet
+        running:dict[int, float]=dict()
+        alive:set[int]=set()
+        while len(waiting) > 0 or len(running) > 0:
+            while len(waiting) > 0 and len(alive) < self.workers:
+                index=waiting.pop(0)
+                start=time.monotonic()
+                running[index]=start
+                alive.add(index)
+                threading.Thread(
+                    target=self.run_one,
+                    args=(index, operation, args, kwargs, results, start),
+                    daemon=True,
+                ).start()
+
+            wait=None
+            if self.timeout is not None and len(running) > 0:
+                wait=max(0, min(running.values())+self.timeout+self.grace-time.monotonic())
+            try:
+                index, result=results.get(timeout=wait)
+                alive.discard(index)
+                # a worker reported at its deadline returns later, only its slot is released
+                if index in running:
+                    del running[index]
+                    yield result
+            except queue.Empty:
+                pass
+
+            if self.timeout is not None:
+                now=time.monotonic()
+                for index, start in list(running.items()):
+                    # the git command is killed at the deadline, its worker reports it shortly after
+                    if now-start >= self.timeout+self.grace:
+                        del running[index]
+                        yield FleetResult(
+                            direpa=self.direpas[index],
+                            error=TimeoutError(f"operation exceeded {self.timeout}s on '{self.direpas[index]}'"),
+                            elapsed=now-start,
+                            timed_out=True,
+                        )
+
+    def run_all(self, operation:str|Callable, *args, **kwargs) -> dict[str, FleetResult]:
+        return {result.direpa: result for result in self.run(operation, *args, **kwargs)}
@@ -0,0 +1,299 @@
+#!/usr/bin/env python3
+import os
+import re
+
+class GitConfig():
+    """parses an INI-style git config file. Keys are stored as 'section.subsection.key' with
+    section and key lowercased, subsection kept case-sensitive like git does.
+    """
+    def __init__(self, filenpa:str):
+        self.filenpa=filenpa
+        self.entries:list[tuple[str, str|None]]=[]
+        self.has_includes=False
+        self.signature=None
+        self.load()
+
+    def load(self):
+        signature=get_signature(self.filenpa)
+        if signature == self.signature:
+            return
+        self.signature=signature
+        self.entries=[]
+        self.has_includes=False
+        if signature is None:
+            return
+        with open(self.filenpa, "r", encoding="utf-8", errors="surrogateescape") as f:
+            self.entries=parse_config(f.read())
+        for key, value in self.entries:
+            if key.startswith("include.") or key.startswith("includeif."):
+                self.has_includes=True
+                break
+
+    def get(self, key:str) -> str|None:
+        values=self.get_all(key)
+        if len(values) == 0:
+            return None
+        else:
+            return values[-1]
+
+    def get_all(self, key:str) -> list:
+        self.load()
+        key=normalize_key(key)
+        return [value for name, value in self.entries if name == key and value is not None]
+
+    def get_subsections(self, section:str) -> list:
+        self.load()
+        section=section.lower()
+        subsections=[]
+        for name, value in self.entries:
+            if name.startswith(f"{section}."):
+                subsection=name[len(section)+1:].rpartition(".")[0]
+                if subsection and subsection not in subsections:
+                    subsections.append(subsection)
+        return subsections
+
+def normalize_key(key:str):
+    section, _, rest=key.partition(".")
+    subsection, _, name=rest.rpartition(".")
+    if subsection:
+        return f"{section.lower()}.{subsection}.{name.lower()}"
+    else:
+        return f"{section.lower()}.{name.lower()}"
+
+def parse_config(text:str) -> list:
+    entries:list[tuple[str, str|None]]=[]
+    section=None
+    lines=text.splitlines()
+    index=0
+    while index < len(lines):
+        line=lines[index].strip()
+        index+=1
+        if line == "" or line[0] in "#;":
+            continue
+
+        if line[0] == "[":
+            reg=re.match(r'^\[\s*([A-Za-z0-9.-]+)\s*(?:"((?:[^"\\]|\\.)*)")?\s*\](.*)$', line)
+            if reg is None:
+                raise ValueError(f"invalid config section '{line}'")
+            name, subsection, line=reg.groups()
+            if subsection is None:
+                if "." in name:
+                    section_name, _, subsection=name.partition(".")
+                    section=f"{section_name.lower()}.{subsection.lower()}"
+                else:
+                    section=name.lower()
+            else:
+                subsection=re.sub(r"\\(.)", r"\1", subsection)
+                section=f"{name.lower()}.{subsection}"
+            line=line.strip()
+            if line == "" or line[0] in "#;":
+                continue
+
+        if section is None:
+            raise ValueError(f"config key outside of section '{line}'")
+
+        reg=re.match(r"^([A-Za-z][A-Za-z0-9-]*)\s*(=?)(.*)$", line)
+        if reg is None:
+            raise ValueError(f"invalid config line '{line}'")
+        name, equal, raw_value=reg.groups()
+        if equal == "":
+            entries.append((f"{section}.{name.lower()}", None))
+            continue
+
+        while raw_value.endswith("\\") and not raw_value.endswith("\\\\") and index < len(lines):
+            raw_value=raw_value[:-1]+lines[index]
+            index+=1
+        entries.append((f"{section}.{name.lower()}", parse_value(raw_value)))
+    return entries
+
+def parse_value(raw_value:str):
+    value=""
+    pending_spaces=""
+    quoted=False
+    index=0
+    escapes=dict(n="\n", t="\t", b="\b", **{"\\":"\\", '"':'"'})
+    while index < len(raw_value):
+        char=raw_value[index]
+        index+=1
+        if char == '"':
+            quoted=not quoted
+            continue
+        elif char in "#;" and quoted is False:
+            break
+        elif char == "\\" and index < len(raw_value):
+            value+=pending_spaces+escapes.get(raw_value[index], raw_value[index])
+            pending_spaces=""
+            index+=1
+            continue
+        elif char.isspace() and quoted is False:
+            if value != "":
+                pending_spaces+=char
+            continue
+        value+=pending_spaces+char
+        pending_spaces=""
+    return value
+
+def get_signature(filenpa:str):
+    try:
+        stat=os.stat(filenpa)
+        return (stat.st_mtime_ns, stat.st_size, stat.st_ino)
+    except (FileNotFoundError, NotADirectoryError):
+        return None
+
+class GitDir():
+    """reads refs and config straight from a .git directory without spawning git.
+    Methods return None when the answer can't be given natively so callers fall back to git.
+    """
+    def __init__(self, direpa_git:str):
+        self.direpa_git=direpa_git
+        self.configs:dict[str, GitConfig]=dict()
+        self.packed_refs:dict[str, str]=dict()
+        self.packed_refs_signature=None
+
+    @staticmethod
+    def find(direpa_root:str, is_bare_repository:bool=False):
+        """returns None for layouts the reader does not handle: worktrees and submodules (.git file), reftable."""
+        if is_bare_repository is True:
+            direpa_git=direpa_root
+        else:
+            direpa_git=os.path.join(direpa_root, ".git")
+
+        if not os.path.isdir(direpa_git):
+            return None
+        if not os.path.isfile(os.path.join(direpa_git, "HEAD")):
+            return None
+        if os.path.isdir(os.path.join(direpa_git, "reftable")):
+            return None
+
+        gitdir=GitDir(direpa_git)
+        ref_storage=gitdir.get_config().get("extensions.refStorage")
+        if ref_storage is not None and ref_storage != "files":
+            return None
+        return gitdir
+
+    def get_config(self, filenpa:str|None=None) -> GitConfig:
+        if filenpa is None:
+            filenpa=os.path.join(self.direpa_git, "config")
+        if filenpa not in self.configs:
+            self.configs[filenpa]=GitConfig(filenpa)
+        return self.configs[filenpa]
+
+    def get_config_filenpas(self) -> list:
+        filenpas=[]
+        if os.environ.get("GIT_CONFIG_NOSYSTEM") is None:
+            filenpas.append(os.environ.get("GIT_CONFIG_SYSTEM", "/etc/gitconfig"))
+        if "GIT_CONFIG_GLOBAL" in os.environ:
+            filenpas.append(os.environ["GIT_CONFIG_GLOBAL"])
+        else:
+            direpa_xdg=os.environ.get("XDG_CONFIG_HOME", os.path.join(os.path.expanduser("~"), ".config"))
+            filenpas.append(os.path.join(direpa_xdg, "git", "config"))
+            filenpas.append(os.path.join(os.path.expanduser("~"), ".gitconfig"))
+        filenpas.append(os.path.join(self.direpa_git, "config"))
+        return filenpas
+
+    def get_remote_names(self) -> list|None:
+        for direpa_legacy in ["remotes", "branches"]:
+            direpa=os.path.join(self.direpa_git, direpa_legacy)
+            if os.path.isdir(direpa) and len(os.listdir(direpa)) > 0:
+                return None
+        if "GIT_CONFIG_COUNT" in os.environ or "GIT_CONFIG_PARAMETERS" in os.environ:
+            return None
+
+        remote_names=[]
+        for filenpa in self.get_config_filenpas():
+            config=self.get_config(filenpa)
+            if config.has_includes is True:
+                return None
+            for name in config.get_subsections("remote"):
+                if name not in remote_names:
+                    remote_names.append(name)
+        return remote_names
+
+    def read_file(self, *names:str) -> str|None:
+        try:
+            with open(os.path.join(self.direpa_git, *names), "r") as f:
+                return f.read().strip()
+        except (FileNotFoundError, NotADirectoryError, IsADirectoryError):
+            return None
+
+    def get_packed_refs(self) -> dict:
+        filenpa=os.path.join(self.direpa_git, "packed-refs")
+        signature=get_signature(filenpa)
+        if signature != self.packed_refs_signature:
+            self.packed_refs_signature=signature
+            self.packed_refs=dict()
+            if signature is not None:
+                with open(filenpa, "r") as f:
+                    for line in f:
+                        if line[0] in "#^":
+                            continue
+                        sha, _, refname=line.rstrip("\n").partition(" ")
+                        self.packed_refs[refname]=sha
+        return self.packed_refs
+
+    def read_ref(self, refname:str) -> str|None:
+        """returns 'ref: <target>' for symbolic refs, the sha otherwise, None when ref does not exist."""
+        value=self.read_file(*refname.split("/"))
+        if value is None or value == "":
+            return self.get_packed_refs().get(refname)
+        return value
+
+    def resolve_ref(self, refname:str) -> str|None:
+        for _ in range(5):
+            value=self.read_ref(refname)
+            if value is None:
+                return None
+            elif value.startswith("ref: "):
+                refname=value[5:]
+            else:
+                return value
+        return None
+
+    def get_head_ref(self) -> str|None:
+        """returns refs/heads/<branch> or None when HEAD is detached."""
+        value=self.read_ref("HEAD")
+        if value is not None and value.startswith("ref: "):
+            return value[5:]
+        return None
+
+    def get_refs(self, prefix:str) -> dict:
+        """returns refname -> raw value ('ref: <target>' for symbolic refs) for every ref under prefix."""
+        refs=dict()
+        for refname, sha in self.get_packed_refs().items():
+            if refname.startswith(prefix):
+                refs[refname]=sha
+
+        direpa_prefix=os.path.join(self.direpa_git, *prefix.rstrip("/").split("/"))
+        for direpa, dirnames, filenames in os.walk(direpa_prefix):
+            dirnames.sort()
+            for filename in filenames:
+                if filename.endswith(".lock"):
+                    continue
+                refname="/".join(os.path.relpath(os.path.join(direpa, filename), self.direpa_git).split(os.sep))
+                value=self.read_file(*refname.split("/"))
+                if value:
+                    refs[refname]=value
+        return dict(sorted(refs.items()))
+
+    def dwim_ref(self, name:str) -> str|None:
+        """mimics 'git rev-parse --verify <name>' for plain ref names. Returns the sha, None if the name
+        does not resolve to a ref. Raises ValueError when the name is not a plain ref name.
+        """
+        if re.match(r"^[A-Za-z0-9._/-]+$", name) is None or ".." in name or re.match(r"^[0-9a-fA-F]{4,40}$", name):
+            raise ValueError(f"'{name}' is not a plain ref name")
+
+        refnames=[]
+        if re.match(r"^[A-Z_]+$", name) or name.startswith("refs/"):
+            refnames.append(name)
+        refnames.extend([
+            f"refs/{name}",
+            f"refs/tags/{name}",
+            f"refs/heads/{name}",
+            f"refs/remotes/{name}",
+            f"refs/remotes/{name}/HEAD",
+        ])
+        for refname in refnames:
+            sha=self.resolve_ref(refname)
+            if sha is not None:
+                return sha
+        return None
@@ -3,9 +3,15 @@ from pprint import pprint
 import inspect
 import os
 import re
-import sys
 import shlex
-from typing import cast
+import signal
+import subprocess
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+import functools
+from typing import IO, Callable, Iterator, cast
 from enum import Enum
 
 from ..gpkgs import message as msg
@@ -13,6 +19,20 @@ from ..gpkgs.getpath import getpath
 from ..gpkgs import shell_helpers as shell
 from ..gpkgs.prompt import prompt
 
+from .catfile import CatFile
+from .clone_cache import CloneCache
+from .commands import get_active_branch_name_cmd, get_branch_on_remote_cmd, get_branch_uptodate_cmd, get_checkout_cmd, get_commit_empty_cmd, get_fetch_cmd, get_fetch_tags_cmd, get_has_head_cmd, get_local_branches_cmd, get_ls_remote_cmd, get_merge_base_cmd, get_merge_cmd, get_pull_cmd, get_push_cmd, get_remote_names_cmd, get_rev_parse_cmd, get_status_cmd, parse_has_head, parse_local_branches, parse_ls_remote, parse_remote_names
+from .commit_graph import CommitGraph
+from .plan import CommandPlan
+from .errors import GitLibError, ClonePathError, GitCommandError, GitTimeoutError, NotGitRepositoryError, NotBareRepositoryError, BranchNameError, RemoteNameError, PrincipalBranchError, PromptRequiredError
+from .gitdir import GitDir, normalize_key
+from .remote_refs import LsRemoteCache, RemoteRefs
+from .stats import GitCall
+from .status import StatusEntry, iter_records, parse_status
+from .status_cache import StatusCache
+from .snapshot import REF_FORMAT, RefEntry, RepoSnapshot, parse_refs, parse_track
+from .ssh_mux import SshMux
+
 
 class Remote():
     def __init__(self, name, location):
@@ -26,33 +46,423 @@ class BranchStatus(str, Enum):
     DIVERGENT_WITH_COMMON_ANCESTOR="divergent_with_common_ancestor"
     DIVERGENT_WITHOUT_COMMON_ANCESTOR="divergent_without_common_ancestor"
 
+class BranchCompare():
+    def __init__(self, branch_name:str, compare_branch:str, status:BranchStatus, ahead:int, behind:int):
+        self.branch_name=branch_name
+        self.compare_branch=compare_branch
+        self.status=status
+        self.ahead=ahead
+        self.behind=behind
+
+class CommitResult():
+    def __init__(self, committed:bool, files:list[str], message:str|None=None):
+        self.committed=committed
+        self.files=files
+        self.message=message
+
+class Message():
+    def __init__(self, level:str, text:str):
+        self.level=level
+        self.text=text
+
+class FetchedRef():
+    """one ref updated by a fetch, flag is the 'git fetch --porcelain' flag and old_sha is None for a new ref."""
+    KINDS={
+        " ": "fast_forward",
+        "+": "forced",
+        "-": "pruned",
+        "t": "tag_update",
+        "*": "new",
+        "!": "rejected",
+        "=": "up_to_date",
+    }
+
+    def __init__(self, flag:str, old_sha:str|None, new_sha:str|None, refname:str):
+        self.flag=flag
+        self.old_sha=old_sha
+        self.new_sha=new_sha
+        self.refname=refname
+
+    def __repr__(self):
+        return f"FetchedRef({self.kind!r}, {self.refname!r}, {self.old_sha!r} -> {self.new_sha!r})"
+
+    @property
+    def kind(self) -> str:
+        return self.KINDS.get(self.flag, self.flag)
+
+def parse_fetch_porcelain(output:str) -> list[FetchedRef]:
+    """parses '<flag> <old-oid> <new-oid> <local-ref>' lines, a zero oid is None."""
+    fetched=[]
+    for line in output.splitlines():
+        if len(line) < 2 or line[1] != " ":
+            continue
+        old_sha, new_sha, refname=line[2:].split(" ", 2)
+        fetched.append(FetchedRef(
+            flag=line[0],
+            old_sha=None if old_sha.strip("0") == "" else old_sha,
+            new_sha=None if new_sha.strip("0") == "" else new_sha,
+            refname=refname,
+        ))
+    return fetched
+
+@functools.lru_cache(maxsize=None)
+def get_git_version() -> tuple[int, ...]:
+    output=subprocess.run(["git", "--version"], capture_output=True, text=True).stdout
+    reg=re.search(r"(\d+)\.(\d+)(?:\.(\d+))?", output)
+    if reg is None:
+        return (0,)
+    return tuple(int(number) for number in reg.groups() if number is not None)
+
+def get_branch_status(active_branch_last_commit:str|None, compare_branch_last_commit:str|None, common_ancestor:str|None) -> BranchStatus:
+    if active_branch_last_commit == compare_branch_last_commit:
+        return BranchStatus.UP_TO_DATE
+    elif active_branch_last_commit == common_ancestor:
+        return BranchStatus.PULL
+    elif compare_branch_last_commit == common_ancestor:
+        return BranchStatus.PUSH
+    else:
+        if common_ancestor:
+            return BranchStatus.DIVERGENT_WITH_COMMON_ANCESTOR
+        else:
+            return BranchStatus.DIVERGENT_WITHOUT_COMMON_ANCESTOR
+
+def status_cached(label:str, worktree:bool=False):
+    """returns the GitLib.status_cache value of the method while the repository stat signature is unchanged.
+    Calls with show_files=True or positional arguments always run.
+    """
+    def decorator(method):
+        @functools.wraps(method)
+        def wrapper(self, *args, **kwargs):
+            if self.status_cache is None or len(args) > 0 or kwargs.get("show_files") is True:
+                return method(self, *args, **kwargs)
+            return self.get_status_cached(
+                key=method.__name__,
+                label=label,
+                worktree=worktree,
+                get_value=lambda: method(self, *args, **kwargs),
+                show_cmds=kwargs.get("show_cmds") is True,
+            )
+        return wrapper
+    return decorator
+
+def writes_config(cmd:list) -> bool:
+    """commands that may change config values: remotes, upstreams of branches, user and other settings."""
+    if len(cmd) < 2 or cmd[0] != "git":
+        return False
+    return cmd[1] in ["branch", "checkout", "clone", "config", "init", "push", "remote", "submodule", "switch"]
+
+def kill_process_group(process:subprocess.Popen):
+    """kills process and the commands it started, like ssh under git fetch. process must be started with start_new_session=True."""
+    if hasattr(os, "killpg"):
+        try:
+            os.killpg(process.pid, signal.SIGKILL)
+        except ProcessLookupError:
+            pass
+    else:
+        process.kill()
+
 class GitLib():
     def __init__(self,
         direpa:str|None=None,
         prompt_success:bool=True,
         quiet:bool=False,
+        batch:bool=False,
+        native:bool=False,
+        chdir:bool=True,
+        ls_remote_cache:LsRemoteCache|None=None,
+        on_cmd:Callable[[GitCall], None]|None=None,
+        status_cache:StatusCache|None=None,
+        ssh_mux:SshMux|None=None,
+        service:bool=False,
+        deadline:float|None=None,
+        optional_locks:bool=True,
     ):
+        """
+        chdir=False runs git commands with 'git -C <directory>' instead of changing the process directory,
+        so GitLib instances can be used from several threads at once.
+        on_cmd is called with a GitCall after every git invocation, GitStats can be used as on_cmd.
+        status_cache returns need_commit, get_untracked_files, get_active_branch_name and get_local_branches
+        results from a StatusCache until HEAD, index or refs change, and the working tree with StatusCache(worktree=True).
+        ssh_mux makes git commands share ssh connections through an SshMux.
+        service=True never prints, prompts or exits: errors raise GitLibError subclasses, command output is captured,
+        info and warning messages are kept in messages and a missing value that would be prompted raises PromptRequiredError.
+        Config values and remote names are read once and kept until a GitLib command changes the config or refresh() is called.
+        deadline is a time.monotonic() value, a git command still running at the deadline is killed and raises GitTimeoutError.
+        optional_locks=False runs git with --no-optional-locks, 'git status' from a background monitor then never takes
+        index.lock and can't make a concurrent checkout or commit fail.
+        """
         if direpa is None:
-            self.direpa_root=os.getcwd()
+            self.direpa=os.getcwd()
         else:
-            self.direpa_root=getpath(direpa, "directory")
+            self.direpa=getpath(direpa, "directory")
 
         self.quiet=quiet
         self.prompt_success=prompt_success
         self.switch_root=None
-        self.remotes:list[Remote]=[]
+        self.chdir=chdir
+        self.local=threading.local()
         self.default_remote="origin"
-        self.update()
+        self.ls_remote_cache=ls_remote_cache
+        self.on_cmd=on_cmd
+        self.status_cache=status_cache
+        self.ssh_mux=ssh_mux
+        self.service=service
+        self.deadline=deadline
+        self.optional_locks=optional_locks
+        self.messages:deque[Message]=deque(maxlen=1000)
+        self.plan:CommandPlan|None=None
+        self.plan_chdir=chdir
+        self.batch=batch
+        self.catfile:CatFile|None=None
+        self.native=native
+        self.gitdir:GitDir|None=None
+        self.commit_graph:CommitGraph|None=None
+        self.commit_graph_signature=None
+        self._exists:bool|None=None
+        self._is_bare_repository:bool|None=None
+        self._direpa_root:str|None=None
+        self._remotes:list[Remote]|None=None
+        self._remote_names:list[str]|None=None
+        self._configs:dict[str, dict[str, list[str]]]=dict()
+        self._root_commits:list[str]|None=None
+
+    @property
+    def exists(self) -> bool:
+        if self._exists is None:
+            self._exists=os.path.exists(self.direpa) and self.is_direpa_git() is True
+        return self._exists
+
+    @exists.setter
+    def exists(self, exists:bool):
+        self._exists=exists
+
+    @property
+    def is_bare_repository(self) -> bool:
+        if self._is_bare_repository is None:
+            if self.exists is True:
+                self._is_bare_repository=self.get_is_bare_repository()
+            else:
+                self._is_bare_repository=False
+        return self._is_bare_repository
+
+    @is_bare_repository.setter
+    def is_bare_repository(self, is_bare_repository:bool):
+        self._is_bare_repository=is_bare_repository
+
+    @property
+    def direpa_root(self) -> str:
+        if self._direpa_root is None:
+            if self.exists is True:
+                self._direpa_root=self.get_direpa_root()
+            else:
+                return self.direpa
+        return self._direpa_root
+
+    @direpa_root.setter
+    def direpa_root(self, direpa_root:str):
+        self.direpa=direpa_root
+        self._direpa_root=direpa_root
+
+    @property
+    def remotes(self) -> list[Remote]:
+        if self._remotes is None:
+            if self.exists is True:
+                self._remotes=self.get_remotes()
+            else:
+                return []
+        return self._remotes
+
+    @remotes.setter
+    def remotes(self, remotes:list[Remote]):
+        self._remotes=remotes
+
+    def refresh(self):
+        """invalidates exists, is_bare_repository, direpa_root, remotes, config values and root commits, they are computed again on next access."""
+        self.gitdir=None
+        self._root_commits=None
+        self._exists=None
+        self._is_bare_repository=None
+        self._direpa_root=None
+        self.invalidate_config()
+
+    def invalidate_config(self):
+        """config values and remotes are read once, GitLib commands that write the config call this, config changes made outside of GitLib need it too."""
+        self._remotes=None
+        self._remote_names=None
+        self._configs=dict()
 
     def update(self):
-        if os.path.exists(self.direpa_root) and self.is_direpa_git() is True:
-            self.exists=True
-            self.is_bare_repository=self.get_is_bare_repository()
-            self.direpa_root=self.get_direpa_root()
-            self.remotes=self.get_remotes()
+        self.refresh()
+        self.remotes
+
+    def get_status_cached(self, key:str, label:str, worktree:bool, get_value:Callable, show_cmds:bool=False):
+        cache=cast(StatusCache, self.status_cache)
+        if self.exists is False:
+            return get_value()
+        direpa_root=self.direpa_root
+        signature=cache.get_signature(direpa_root, is_bare_repository=self.is_bare_repository, worktree=worktree)
+        if signature is None:
+            return get_value()
+        signature, newest=signature
+        found, value=cache.get(direpa_root, key, signature)
+        if found is True:
+            if show_cmds is True:
+                print(f"{label}:", "cached", direpa_root)
+        else:
+            value=get_value()
+            cache.set(direpa_root, key, signature, newest, value)
+        if isinstance(value, list):
+            return list(value)
+        return value
+
+    def error(self, error:GitLibError, trace:bool=False):
+        if self.service is True:
+            raise error
+        msg.error(str(error), trace=trace, exit=1)
+
+    def info(self, text:str):
+        if self.service is True:
+            self.messages.append(Message("info", text))
+        else:
+            msg.info(text)
+
+    def warning(self, text:str):
+        if self.service is True:
+            self.messages.append(Message("warning", text))
+        else:
+            msg.warning(text)
+
+    def print(self, *values):
+        if self.service is False:
+            print(*values)
+
+    def prompt(self, label:str) -> str:
+        if self.service is True:
+            raise PromptRequiredError(f"{label}: value must be given in service mode")
+        return prompt(label)
+
+    def pop_messages(self) -> list[Message]:
+        messages=list(self.messages)
+        self.messages.clear()
+        return messages
+
+    def start_plan(self, plan:CommandPlan|None=None) -> CommandPlan:
+        """commands are recorded in plan instead of being executed until stop_plan().
+        Queries still run, methods whose queries depend on planned commands (checkout, commit) skip them.
+        Directories are tracked as with chdir=False while recording, a SwitchDir entered before still restores the process directory.
+        """
+        if plan is None:
+            plan=CommandPlan()
+        if self.plan is None:
+            self.plan_chdir=self.chdir
+        self.plan=plan
+        self.chdir=False
+        return plan
+
+    def stop_plan(self) -> CommandPlan|None:
+        plan=self.plan
+        self.plan=None
+        self.chdir=self.plan_chdir
+        return plan
+
+    def get_catfile(self) -> CatFile|None:
+        if self.batch is True and self.catfile is None:
+            self.catfile=CatFile(self.direpa_root)
+        return self.catfile
+
+    def start_batch(self):
+        self.batch=True
+        return self.get_catfile()
+
+    def stop_batch(self):
+        self.batch=False
+        if self.catfile is not None:
+            self.catfile.stop()
+            self.catfile=None
+
+    def get_gitdir(self) -> GitDir|None:
+        if self.native is True and self.gitdir is None and self.exists is True:
+            self.gitdir=GitDir.find(self.direpa_root, is_bare_repository=self.is_bare_repository)
+            if self.gitdir is None:
+                self.native=False
+        return self.gitdir
+
+    def get_commit_graph(self) -> CommitGraph|None:
+        """returns the repository commit-graph when native is set, it is read again when 'git commit-graph write' replaces it."""
+        gitdir=self.get_gitdir()
+        if gitdir is None:
+            return None
+        direpa_objects=os.path.join(gitdir.direpa_git, "objects")
+        signature=CommitGraph.get_signature(direpa_objects)
+        if signature != self.commit_graph_signature:
+            self.commit_graph_signature=signature
+            self.commit_graph=CommitGraph.load(direpa_objects)
+        return self.commit_graph
+
+    def get_graph_shas(self, names:list[str], label:str, show_cmds:bool=False) -> tuple[CommitGraph, list[str]]|None:
+        """returns the commit-graph with the sha of every name when names resolve natively to commits of the graph,
+        None when git has to answer.
+        """
+        graph=self.get_commit_graph()
+        if graph is None:
+            return None
+        gitdir=cast(GitDir, self.gitdir)
+        shas=[]
+        for name in names:
+            try:
+                sha=gitdir.dwim_ref(name)
+            except ValueError:
+                return None
+            if sha is None or graph.get_position(sha) is None:
+                return None
+            shas.append(sha)
+        if show_cmds is True:
+            print(f"{label}:", "read", *[layer.filenpa for layer in graph.layers])
+        return graph, shas
+
+    def get_native_sha(self, gitdir:GitDir, name:str, label:str, show_cmds:bool=False) -> str|None:
+        """raises ValueError when name is not a plain ref name and git must resolve it."""
+        sha=gitdir.dwim_ref(name)
+        if show_cmds is True:
+            print(f"{label}:", "read", os.path.join(gitdir.direpa_git, "refs"), shlex.quote(name))
+        return sha
+
+    def get_native_config_value(self, filenpa_config:str, key:str, label:str, show_cmds:bool=False) -> str|None:
+        """raises ValueError when the config file can't be parsed natively."""
+        gitdir=cast(GitDir, self.gitdir)
+        if show_cmds is True:
+            print(f"{label}:", "read", filenpa_config, key)
+        value=gitdir.get_config(filenpa_config).get(key)
+        if not value:
+            return None
         else:
-            self.exists=False
-            self.is_bare_repository=False
+            return value
+
+    def get_catfile_sha(self, catfile:CatFile, rev:str, label:str, show_cmds:bool=False):
+        if show_cmds is True:
+            print(f"{label}:", "git cat-file --batch-check", "<<<", shlex.quote(rev))
+        start=time.perf_counter()
+        obj=catfile.check(rev)
+        self.record_cmd(["git", "cat-file", "--batch-check", rev], start=start, exit_code=0, output_size=0 if obj is None else len(obj.sha), kind="pipe")
+        if obj is None:
+            return None
+        else:
+            return obj.sha
+
+    def get_object(self, rev:str, show_cmds:bool=False):
+        if show_cmds is True:
+            print("object:", "git cat-file --batch", "<<<", shlex.quote(rev))
+        start=time.perf_counter()
+        kind="pipe"
+        catfile=self.get_catfile()
+        if catfile is None:
+            kind="spawn"
+            with CatFile(self.direpa_root) as catfile:
+                obj=catfile.read(rev)
+        else:
+            obj=catfile.read(rev)
+        self.record_cmd(["git", "cat-file", "--batch", rev], start=start, exit_code=0, output_size=0 if obj is None else obj.size, kind=kind)
+        return obj
 
     def get_quiet_arg(self, quiet:bool|None):
         if quiet is None:
@@ -63,11 +473,210 @@ class GitLib():
         else:
             return None
         
-    def execute(self, cmd:list, show_only:bool):
+    def get_direpas(self) -> list:
+        """per thread directory stack used by SwitchDir and SimpleSwitchDir when chdir is False."""
+        if not hasattr(self.local, "direpas"):
+            self.local.direpas=[]
+            self.local.switch_root=None
+        return self.local.direpas
+
+    def get_direpa_current(self) -> str:
+        direpas=self.get_direpas()
+        if self.chdir is False and len(direpas) > 0:
+            return direpas[-1]
+        else:
+            return os.getcwd()
+
+    def get_exec_cmd(self, cmd:list) -> list:
+        if len(cmd) == 0 or cmd[0] != "git":
+            return cmd
+        args=[]
+        if self.chdir is False:
+            direpas=self.get_direpas()
+            if len(direpas) > 0:
+                args.extend(["-C", direpas[-1]])
+        if self.ssh_mux is not None:
+            args.extend(self.ssh_mux.get_git_args())
+        if self.optional_locks is False:
+            args.append("--no-optional-locks")
+        if len(args) > 0:
+            return ["git", *args, *cmd[1:]]
+        return cmd
+
+    def record_cmd(self, cmd:list, start:float, exit_code:int|None=None, output_size:int|None=None, kind:str="spawn"):
+        if self.on_cmd is not None:
+            self.on_cmd(GitCall(
+                cmd=cmd,
+                direpa=self.direpa,
+                direpa_cwd=self.get_direpa_current(),
+                elapsed=time.perf_counter()-start,
+                exit_code=exit_code,
+                output_size=output_size,
+                kind=kind,
+            ))
+
+    def get_timeout(self, cmd:list) -> float|None:
+        """seconds left before deadline, None without deadline."""
+        if self.deadline is None:
+            return None
+        timeout=self.deadline-time.monotonic()
+        if timeout <= 0:
+            raise GitTimeoutError(cmd, 0, direpa=self.get_direpa_current())
+        return timeout
+
+    def run_process(self, cmd:list, capture_output:bool=False, **kwargs) -> subprocess.CompletedProcess:
+        """subprocess.run of cmd with the time left before deadline, the process and its children are killed when the deadline is reached."""
+        exec_cmd=self.get_exec_cmd(cmd)
+        timeout=self.get_timeout(cmd)
+        if timeout is None:
+            return subprocess.run(exec_cmd, capture_output=capture_output, **kwargs)
+        if capture_output is True:
+            kwargs["stdout"]=subprocess.PIPE
+            kwargs["stderr"]=subprocess.PIPE
+        with subprocess.Popen(exec_cmd, start_new_session=True, **kwargs) as process:
+            try:
+                stdout, stderr=process.communicate(timeout=timeout)
+            except subprocess.TimeoutExpired:
+                kill_process_group(process)
+                process.communicate()
+                raise GitTimeoutError(cmd, timeout, direpa=self.get_direpa_current()) from None
+        return subprocess.CompletedProcess(exec_cmd, cast(int, process.returncode), stdout, stderr)
+
+    def get_cmd_value(self, cmd:list, exit_code:int, stdout:str, stderr:str|None, none_on_error:bool=False, direpa:str|None=None) -> str|None:
+        """value of a finished query: stripped stdout or None when empty, a failure is an error unless none_on_error."""
+        if exit_code == 0:
+            return stdout.strip() or None
+        if none_on_error is False:
+            self.error(GitCommandError(cmd, exit_code, stdout=stdout, stderr=stderr, direpa=direpa))
+        return None
+
+    def cmd_get_value(self, cmd:list, none_on_error:bool=False):
+        start=time.perf_counter()
+        exit_code=None
+        value=None
+        try:
+            if self.service is True or self.deadline is not None:
+                process=self.run_process(cmd, capture_output=True, text=True, errors="replace")
+                exit_code=process.returncode
+                value=self.get_cmd_value(cmd, exit_code, process.stdout, process.stderr, none_on_error=none_on_error, direpa=self.get_direpa_current())
+            else:
+                value=shell.cmd_get_value(self.get_exec_cmd(cmd), none_on_error=none_on_error)
+            return value
+        except SystemExit as e:
+            exit_code=e.code if isinstance(e.code, int) else 1
+            raise
+        finally:
+            self.record_cmd(cmd, start=start, exit_code=exit_code, output_size=0 if value is None else len(value))
+
+    def cmd_get_stdout(self, cmd:list) -> str:
+        """returns the raw stdout of cmd, stderr is shown unless service is set and a failing cmd is an error."""
+        start=time.perf_counter()
+        exit_code=None
+        output=""
+        try:
+            process=self.run_process(
+                cmd,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.PIPE if self.service is True else None,
+                text=True,
+                errors="replace",
+            )
+            exit_code=process.returncode
+            output=process.stdout
+            if exit_code != 0:
+                self.error(GitCommandError(cmd, exit_code, stdout=process.stdout, stderr=process.stderr, direpa=self.get_direpa_current()))
+            return output
+        finally:
+            self.record_cmd(cmd, start=start, exit_code=exit_code, output_size=len(output))
+
+    def cmd_iter_records(self, cmd:list) -> Iterator[bytes]:
+        """starts the command in the current directory and returns a generator of its NUL terminated output records.
+        Records are read as the command produces them, closing the generator early stops the command.
+        """
+        start=time.perf_counter()
+        direpa_current=self.get_direpa_current()
+        timeout=self.get_timeout(cmd)
+        process=subprocess.Popen(self.get_exec_cmd(cmd), stdout=subprocess.PIPE, start_new_session=timeout is not None)
+        timer=None
+        if timeout is not None:
+            timer=threading.Timer(timeout, kill_process_group, args=(process,))
+            timer.daemon=True
+            timer.start()
+
+        def get_records():
+            exit_code=None
+            output_size=0
+            try:
+                for record in iter_records(cast(IO[bytes], process.stdout)):
+                    output_size+=len(record)+1
+                    yield record
+                exit_code=process.wait()
+                if timer is not None and timer.finished.is_set() and exit_code != 0:
+                    raise GitTimeoutError(cmd, cast(float, timeout), direpa=direpa_current)
+                if exit_code != 0:
+                    self.error(GitCommandError(cmd, exit_code, direpa=direpa_current))
+            finally:
+                if timer is not None:
+                    timer.cancel()
+                if process.poll() is None:
+                    process.kill()
+                    process.wait()
+                if process.stdout is not None:
+                    process.stdout.close()
+                self.record_cmd(cmd, start=start, exit_code=exit_code, output_size=output_size)
+
+        return get_records()
+
+    def cmd_devnull(self, cmd:list):
+        start=time.perf_counter()
+        exit_code=None
+        try:
+            if self.service is True or self.deadline is not None:
+                exit_code=self.run_process(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL).returncode
+            else:
+                exit_code=shell.cmd_devnull(self.get_exec_cmd(cmd))
+            return exit_code
+        finally:
+            self.record_cmd(cmd, start=start, exit_code=exit_code, output_size=0)
+
+    def execute(self, cmd:list, show_only:bool, unless:list|None=None):
+        """with unless, cmd is only executed when unless fails."""
         if show_only is True:
-            print(shlex.join(cmd))
+            if unless is None:
+                print(shlex.join(cmd))
+            else:
+                print(f"{shlex.join(unless)} || {shlex.join(cmd)}")
+        elif self.plan is not None:
+            direpas=self.get_direpas()
+            self.plan.add(cmd, direpa=direpas[-1] if len(direpas) > 0 else None, unless=unless)
+        elif unless is not None and self.cmd_devnull(unless) == 0:
+            return
         else:
-            shell.cmd_prompt(cmd, success=self.prompt_success)
+            start=time.perf_counter()
+            exit_code=None
+            try:
+                cwd=None
+                if self.chdir is False and (len(cmd) == 0 or cmd[0] != "git") and len(self.get_direpas()) > 0:
+                    # not a git command, it can't use 'git -C'
+                    cwd=self.get_direpa_current()
+                if self.service is True:
+                    process=self.run_process(cmd, cwd=cwd, capture_output=True, text=True, errors="replace")
+                    exit_code=process.returncode
+                    if exit_code != 0:
+                        raise GitCommandError(cmd, exit_code, stdout=process.stdout, stderr=process.stderr, direpa=self.get_direpa_current())
+                elif cwd is not None or self.deadline is not None:
+                    exit_code=self.run_process(cmd, cwd=cwd).returncode
+                    if exit_code != 0:
+                        raise subprocess.CalledProcessError(exit_code, cmd)
+                else:
+                    shell.cmd_prompt(self.get_exec_cmd(cmd), success=self.prompt_success)
+            except SystemExit as e:
+                exit_code=e.code if isinstance(e.code, int) else 1
+                raise
+            finally:
+                self.record_cmd(cmd, start=start, exit_code=exit_code)
+                if writes_config(cmd):
+                    self.invalidate_config()
         
     def append_quiet_arg(self, cmd:list, quiet:bool|None=None):
         quiet_arg=self.get_quiet_arg(quiet)
@@ -76,18 +685,12 @@ class GitLib():
 
     def checkout(self, branch_name:str, quiet:bool|None=None, show_only:bool=False):
         with SwitchDir(self, show_cmds=show_only):
-            if self.get_active_branch_name(show_cmds=show_only) != branch_name:
-                cmd=[
-                    "git",
-                    "checkout",
-                ]
-                self.append_quiet_arg(cmd, quiet)
-                cmd.append(branch_name)
-                self.execute(cmd, show_only=show_only)
+            if self.plan is not None or self.get_active_branch_name(show_cmds=show_only) != branch_name:
+                self.execute(get_checkout_cmd(branch_name, self.get_quiet_arg(quiet)), show_only=show_only)
 
     def checkoutb(self, branch_name:str, quiet:bool|None=None, show_only:bool=False):
         with SwitchDir(self, show_cmds=show_only):
-            if self.get_active_branch_name(show_cmds=show_only) != branch_name:
+            if self.plan is not None or self.get_active_branch_name(show_cmds=show_only) != branch_name:
                 cmd=[
                     "git",
                     "checkout",
@@ -108,11 +711,29 @@ class GitLib():
         bare:bool=False,
         shared:str|None=None,
         default_branch:str|None=None,
+        branch:str|None=None,
+        depth:int|None=None,
+        single_branch:bool=False,
+        filter_spec:str|None=None,
+        no_checkout:bool=False,
+        reference:str|None=None,
+        dissociate:bool=False,
+        clone_cache:CloneCache|None=None,
         show_only:bool=False,
     ):
         """
-        direpa_dst must be of form /path/project.git and must not exist
+        direpa_dst must be of form /path/project.git and must not exist, HEAD of a bare clone is set to default_branch.
+        branch checks out branch instead of the source HEAD, with single_branch only branch or the source HEAD is fetched.
+        depth makes a shallow clone, filter_spec like 'blob:none' makes a partial clone that fetches missing objects on demand,
+        the source must allow it with uploadpack.allowFilter. Local paths are cloned through file:// for depth and filter_spec,
+        git ignores them for local clones.
+        reference borrows objects from another repository through objects/info/alternates, clone_cache gives that
+        repository from a pool of mirrors. dissociate copies the borrowed objects at the end of the clone.
+        Relative direpa_src and direpa_dst are relative to direpa_root, where git clone runs.
         """
+        direpa_src=self.get_clone_path(direpa_src, must_exist=show_only is False)
+        if direpa_dst is not None:
+            direpa_dst=self.get_clone_path(direpa_dst, must_exist=False)
 
         cmd=[
             "git",
@@ -130,7 +751,31 @@ class GitLib():
             remote_name
         ])
 
-        cmd.append(direpa_src)
+        if branch is not None:
+            cmd.extend(["--branch", branch])
+        if depth is not None:
+            cmd.extend(["--depth", str(depth)])
+        if single_branch is True:
+            cmd.append("--single-branch")
+        if filter_spec is not None:
+            cmd.append(f"--filter={filter_spec}")
+        if no_checkout is True:
+            cmd.append("--no-checkout")
+
+        if clone_cache is not None:
+            try:
+                reference=clone_cache.get_mirror(direpa_src, show_only=show_only)
+            except GitCommandError as e:
+                self.error(e)
+        if reference is not None:
+            cmd.extend(["--reference", reference])
+            if dissociate is True:
+                cmd.append("--dissociate")
+
+        if (depth is not None or filter_spec is not None) and os.path.isdir(direpa_src):
+            cmd.append(f"file://{direpa_src}")
+        else:
+            cmd.append(direpa_src)
 
         if direpa_dst is not None:
             cmd.append(direpa_dst)
@@ -144,10 +789,29 @@ class GitLib():
                 filenpa_config=os.path.join(direpa_dst, "config")
             self.set_shared_repo(filenpa_config=filenpa_config, shared=shared)
 
-        if default_branch is None:
-            default_branch=self.get_principal_branch_name()
+        if bare is True:
+            if default_branch is None:
+                if branch is None:
+                    default_branch=self.get_principal_branch_name()
+                else:
+                    default_branch=branch
+            self.set_bare_repo_default_branch(branch=default_branch, direpa_repo=direpa_dst, show_only=show_only)
 
-        self.set_bare_repo_default_branch(branch=default_branch, direpa_repo=direpa_dst, show_only=show_only)
+    def get_clone_path(self, path:str, must_exist:bool=True) -> str:
+        """returns a relative local path joined to direpa_root, urls and scp-like 'host:path' sources are returned as they are.
+        A local path that must exist and does not is an error.
+        """
+        if "://" in path:
+            return path
+        # like git, a colon before any slash is 'host:path'
+        colon=path.find(":")
+        slash=path.find("/")
+        if colon > 0 and (slash == -1 or colon < slash) and not os.path.isabs(path):
+            return path
+        path_root=os.path.normpath(os.path.join(self.direpa_root, path))
+        if must_exist is True and not os.path.exists(path_root):
+            self.error(ClonePathError(f"Clone path not found '{path_root}'"))
+        return path_root
 
     def cmd(self, cmd:str|list, show_only:bool=False):
         with SwitchDir(self, show_cmds=show_only):
@@ -158,13 +822,22 @@ class GitLib():
                 tmp_cmd=cmd
             self.execute(tmp_cmd, show_only=show_only)
 
-    def commit(self, message:str|None=None, quiet:bool|None=None, show_only:bool=False):
+    def commit(self, message:str|None=None, quiet:bool|None=None, show_only:bool=False) -> CommitResult:
         with SwitchDir(self, show_cmds=show_only):
-            files_to_commit=shell.cmd_get_value("git status --porcelain")
-            if files_to_commit is not None:
-                print("__untracked files present__")
-                for f in files_to_commit.splitlines():
-                    print("  {}".format(f))
+            if self.plan is not None:
+                return self.commit_plan(message=message, quiet=quiet, show_only=show_only)
+            entries=self.get_status()
+            files=[entry.to_porcelain_v1() for entry in entries]
+            if len(entries) > 0:
+                self.print("__untracked files present__")
+                for f in files:
+                    self.print("  {}".format(f))
+
+                # the snapshot only decides whether to prompt, 'git add' may leave nothing staged
+                # like a staged change reverted in the worktree or content changes inside submodules
+                need_commit=not all(entry.is_submodule_content_only for entry in entries)
+                if need_commit is True and message is None:
+                    message=self.prompt("Type Commit Message")
 
                 cmd=[
                     "git",
@@ -173,13 +846,19 @@ class GitLib():
                 ]
                 self.execute(cmd, show_only=show_only)
 
-                files_to_commit=shell.cmd_get_value("git status --porcelain")
-                if files_to_commit is None:
-                    msg.info("No commit needed, only 'git add' was needed.")
-                else:
-                    if message is None:
-                        message=prompt("Type Commit Message")
+                if show_only is False:
+                    cmd=[
+                        "git",
+                        "diff",
+                        "--cached",
+                        "--quiet",
+                    ]
+                    need_commit=self.cmd_devnull(cmd) != 0
 
+                if need_commit is False:
+                    self.info("No commit needed, only 'git add' was needed.")
+                    return CommitResult(committed=False, files=files)
+                else:
                     cmd=[
                         "git",
                         "commit",
@@ -191,22 +870,37 @@ class GitLib():
                         message,    
                     ])
                     self.execute(cmd, show_only=show_only)
+                    return CommitResult(committed=show_only is False, files=files, message=message)
             else:
-                msg.info("No Files To Commit")
+                self.info("No Files To Commit")
+                return CommitResult(committed=False, files=[])
+
+    def commit_plan(self, message:str|None=None, quiet:bool|None=None, show_only:bool=False) -> CommitResult:
+        """status is only known when the plan runs, commit is skipped when nothing is staged after 'git add'."""
+        if message is None:
+            message=self.prompt("Type Commit Message")
+        cmd=[
+            "git",
+            "add",
+            self.direpa_root,
+        ]
+        self.execute(cmd, show_only=show_only)
+        cmd=[
+            "git",
+            "commit",
+        ]
+        self.append_quiet_arg(cmd, quiet)
+        cmd.extend([
+            "-a",
+            "-m",
+            message,
+        ])
+        self.execute(cmd, show_only=show_only, unless=["git", "diff", "--cached", "--quiet"])
+        return CommitResult(committed=False, files=[], message=message)
 
     def commit_empty(self, message:str, quiet:bool|None=None, show_only:bool=False):
         with SwitchDir(self, show_cmds=show_only):
-            cmd=[
-                "git",
-                "commit",
-            ]
-            self.append_quiet_arg(cmd, quiet)
-            cmd.extend([
-                "--allow-empty",
-                "-m",
-                message,
-            ])
-            self.execute(cmd, show_only=show_only)
+            self.execute(get_commit_empty_cmd(message, self.get_quiet_arg(quiet)), show_only=show_only)
 
     def delete_branch_local(self, branch_name:str, force:bool=False, show_only:bool=False):
         with SwitchDir(self, show_cmds=show_only):
@@ -222,11 +916,11 @@ class GitLib():
             cmd.append(branch_name)
             self.execute(cmd, show_only=show_only)
 
-    def delete_branch_remote(self, branch_name:str, remote_name:str|None=None, show_only:bool=False):
+    def delete_branch_remote(self, branch_name:str, remote_name:str|None=None, remote_refs:RemoteRefs|None=None, show_only:bool=False):
         if remote_name is None:
             remote_name=self.get_remote_name()
         with SwitchDir(self, show_cmds=show_only):
-            if self.is_branch_on_remote(remote_name, branch_name):
+            if self.is_branch_on_remote(remote_name, branch_name, remote_refs=remote_refs):
                 cmd=[
                     "git",
                     "push",
@@ -235,8 +929,10 @@ class GitLib():
                     branch_name,    
                 ]
                 self.execute(cmd, show_only=show_only)
+                if show_only is False:
+                    self.invalidate_ls_remote(remote_name)
             else:
-                msg.warning("'{}' can't be deleted because it does not exist on remote.".format(branch_name))
+                self.warning("'{}' can't be deleted because it does not exist on remote.".format(branch_name))
 
     def delete_remote(self, remote_name:str|None=None, show_only:bool=False):
         if remote_name is None:
@@ -253,37 +949,135 @@ class GitLib():
 
     def fetch_tags(self, show_only:bool=False):
         with SwitchDir(self, show_cmds=show_only):
-            cmd=[
-                "git",
-                "fetch",
-                "--tags",
-            ]
-            self.execute(cmd, show_only=show_only)
+            self.execute(get_fetch_tags_cmd(), show_only=show_only)
 
     def fetch(self, remote:str|None=None, quiet:bool|None=None, show_only:bool=False):
         with SwitchDir(self, show_cmds=show_only):
-            cmd=[
-                "git",
-                "fetch",
-            ]
-            self.append_quiet_arg(cmd, quiet)
-            if remote is not None:
-                cmd.append(remote)
-            self.execute(cmd, show_only=show_only)
+            self.execute(get_fetch_cmd(remote, self.get_quiet_arg(quiet)), show_only=show_only)
+
+    def fetch_remotes(self,
+        remote_names:list[str]|None=None,
+        jobs:int|None=None,
+        prune:bool=False,
+        no_tags:bool=False,
+        refspecs:list[str]|None=None,
+        negotiation_tips:list[str]|None=None,
+        quiet:bool|None=None,
+        show_only:bool=False,
+    ) -> list[FetchedRef]:
+        """
+        fetches every remote with 'git fetch --all' when remote_names is None, several remotes with 'git fetch --multiple',
+        jobs fetches that many remotes in parallel. refspecs can't be given to --multiple, with several remotes and refspecs
+        one 'git fetch' per remote runs in parallel instead.
+        negotiation_tips limits the commits told to the remote as already present, like 'refs/remotes/origin/*'.
+        An empty remote_names fetches nothing.
+        Returns the updated refs, read from --porcelain with git >= 2.41 and from the refs before and after the fetch with older git.
+        """
+        if remote_names is not None and len(remote_names) == 0:
+            return []
+        with SwitchDir(self, show_cmds=show_only):
+            porcelain=get_git_version() >= (2, 41)
+            options=[]
+            if porcelain is True:
+                options.append("--porcelain")
+                # --quiet would also drop the porcelain lines, they are captured anyway so only progress is left to hide
+                if self.get_quiet_arg(quiet) is not None:
+                    options.append("--no-progress")
+            else:
+                self.append_quiet_arg(options, quiet)
+            if prune is True:
+                options.append("--prune")
+            if no_tags is True:
+                options.append("--no-tags")
+            for negotiation_tip in negotiation_tips or []:
+                options.append(f"--negotiation-tip={negotiation_tip}")
+
+            cmds=[]
+            if refspecs is not None and (remote_names is None or len(remote_names) > 1):
+                if remote_names is None:
+                    remote_names=self.get_remote_names(show_cmds=show_only)
+                for remote_name in remote_names:
+                    cmds.append(["git", "fetch", *options, remote_name, *refspecs])
+            else:
+                cmd=["git", "fetch", *options]
+                if jobs is not None:
+                    cmd.append(f"--jobs={jobs}")
+                if remote_names is None:
+                    cmd.append("--all")
+                elif len(remote_names) > 1:
+                    cmd.extend(["--multiple", *remote_names])
+                else:
+                    cmd.extend(remote_names)
+                    cmd.extend(refspecs or [])
+                cmds.append(cmd)
 
+            if show_only is True or self.plan is not None:
+                for cmd in cmds:
+                    self.execute(cmd, show_only=show_only)
+                return []
+
+            snapshot=None
+            if porcelain is False:
+                snapshot=self.get_snapshot()
+
+            def fetch_remote(cmd:list):
+                with SwitchDir(self, show_cmds=False):
+                    try:
+                        return self.cmd_get_stdout(cmd)
+                    except (Exception, SystemExit) as e:
+                        return e
+
+            with ThreadPoolExecutor(max_workers=max(1, len(cmds))) as executor:
+                outputs=list(executor.map(fetch_remote, cmds))
+            for output in outputs:
+                if isinstance(output, BaseException):
+                    raise output
+
+            if porcelain is True:
+                return [fetched_ref for output in outputs for fetched_ref in parse_fetch_porcelain(cast(str, output))]
+            else:
+                return self.get_fetched_refs(cast(RepoSnapshot, snapshot), self.get_snapshot())
+
+    def get_fetched_refs(self, previous:RepoSnapshot, current:RepoSnapshot) -> list[FetchedRef]:
+        """FetchedRef for every ref created, deleted or moved between previous and current, HEAD and local tracking changes are left out."""
+        fetched=[]
+        for change in current.diff(previous):
+            if change.name == "HEAD" or change.kind == "changed":
+                continue
+            old_sha=None if change.previous is None else change.previous.sha
+            new_sha=None if change.current is None else change.current.sha
+            if change.kind == "created":
+                flag="*"
+            elif change.kind == "deleted":
+                flag="-"
+            elif change.name.startswith("refs/tags/"):
+                flag="t"
+            elif self.cmd_devnull(["git", "merge-base", "--is-ancestor", cast(str, old_sha), cast(str, new_sha)]) == 0:
+                flag=" "
+            else:
+                flag="+"
+            fetched.append(FetchedRef(flag=flag, old_sha=old_sha, new_sha=new_sha, refname=change.name))
+        return fetched
+
+    @status_cached(label="branch_name")
     def get_active_branch_name(self, show_cmds:bool=False):
         with SwitchDir(self, show_cmds=show_cmds):
-            cmd=[
-                "git",
-                "rev-parse",
-                "--abbrev-ref",
-                "HEAD",
-            ]
+            gitdir=self.get_gitdir()
+            if gitdir is not None:
+                if show_cmds is True:
+                    print("branch_name:", "read", os.path.join(gitdir.direpa_git, "HEAD"))
+                head_ref=gitdir.get_head_ref()
+                if head_ref is None:
+                    return "HEAD"
+                elif head_ref.startswith("refs/heads/") and gitdir.resolve_ref(head_ref) is not None:
+                    return head_ref[len("refs/heads/"):]
+
+            cmd=get_active_branch_name_cmd()
             if show_cmds is True:
                 print("branch_name:", shlex.join(cmd))
-            branch_name=shell.cmd_get_value(cmd)
+            branch_name=self.cmd_get_value(cmd)
             if not branch_name:
-                msg.error("No branch name from command git rev-parse --abbrev-ref HEAD at path '{}'".format(self.direpa_root), exit=1)
+                self.error(BranchNameError("No branch name from command git rev-parse --abbrev-ref HEAD at path '{}'".format(self.direpa_root)))
             else:
                 return branch_name
             
@@ -291,13 +1085,18 @@ class GitLib():
         branches=dict()
         with SwitchDir(self, show_cmds=False):
             if self.is_direpa_git(show_cmds=show_cmds):
-                remotes=[]
-                for remote in sorted(self.get_remote_names(show_cmds=show_cmds)):
-                    remotes.append(dict(
-                        remote_name=remote,
-                        location=self.get_remote_location(name=remote, filenpa_config=filenpa_config, show_cmds=show_cmds),
-                        branches=self.get_remote_branches(remote_name=remote, show_cmds=show_cmds)
-                        ))
+                def get_remote(remote:str):
+                    # each remote is queried from its own thread, SwitchDir sets the thread directory when chdir is False
+                    with SwitchDir(self, show_cmds=False):
+                        return dict(
+                            remote_name=remote,
+                            location=self.get_remote_location(name=remote, filenpa_config=filenpa_config, show_cmds=show_cmds),
+                            branches=self.get_remote_branches(remote_name=remote, show_cmds=show_cmds)
+                        )
+
+                remote_names=sorted(self.get_remote_names(show_cmds=show_cmds))
+                with ThreadPoolExecutor(max_workers=max(1, len(remote_names))) as executor:
+                    remotes=list(executor.map(get_remote, remote_names))
                 branches=dict(
                     local=self.get_local_branches(show_cmds=show_cmds),
                     local_remote=self.get_local_remote_branches(show_cmds=show_cmds),
@@ -305,53 +1104,192 @@ class GitLib():
                 )
         return branches
     
-    def get_branch_compare_status(self, active_branch:str, compare_branch:str, show_cmds:bool=False):
+    def get_snapshot(self, show_cmds:bool=False) -> RepoSnapshot:
+        """returns every ref with its upstream tracking counts, HEAD and remote urls from one 'git for-each-ref' and the cached config.
+        HEAD needs one more 'git rev-parse' when it is detached and a 'git symbolic-ref' when its branch has no commit yet.
+        """
         with SwitchDir(self, show_cmds=show_cmds):
             cmd=[
                 "git",
-                "rev-parse",
-                active_branch,
+                "for-each-ref",
+                f"--format={REF_FORMAT}",
             ]
             if show_cmds is True:
-                print("active_branch_last_commit:", shlex.join(cmd))
-            active_branch_last_commit=shell.cmd_get_value(cmd)
+                print("raw_refs:", shlex.join(cmd))
+            refs, head=parse_refs(self.cmd_get_value(cmd))
 
-            cmd=[
-                "git",
-                "rev-parse",
-                compare_branch,
-            ]
-            if show_cmds is True:
-                print("compare_branch_last_commit:", shlex.join(cmd))
-            compare_branch_last_commit=shell.cmd_get_value(cmd)
+            head_sha=None
+            if head is None:
+                cmd=[
+                    "git",
+                    "rev-parse",
+                    "-q",
+                    "--verify",
+                    "HEAD",
+                ]
+                if show_cmds is True:
+                    print("head:", shlex.join(cmd))
+                head_sha=self.cmd_get_value(cmd, none_on_error=True)
+                if head_sha is None:
+                    cmd=[
+                        "git",
+                        "symbolic-ref",
+                        "-q",
+                        "HEAD",
+                    ]
+                    if show_cmds is True:
+                        print("head:", shlex.join(cmd))
+                    head=self.cmd_get_value(cmd, none_on_error=True)
+            else:
+                head_sha=next(ref.sha for ref in refs if ref.name == head)
+            refs.append(RefEntry("HEAD", sha=head_sha, symref=head))
 
-            cmd=[
-                "git",
-                "merge-base",
-                active_branch,
-                compare_branch,
-            ]
+            return RepoSnapshot(refs, remotes=self.get_remote_urls(show_cmds=show_cmds))
+
+    def get_branch_compare_status(self, active_branch:str, compare_branch:str, show_cmds:bool=False):
+        with SwitchDir(self, show_cmds=show_cmds):
+            graph_shas=self.get_graph_shas([active_branch, compare_branch], label="common_ancestor", show_cmds=show_cmds)
+            if graph_shas is not None:
+                graph, (active_branch_last_commit, compare_branch_last_commit)=graph_shas
+                common_ancestor=graph.get_merge_base(active_branch_last_commit, compare_branch_last_commit)
+                return get_branch_status(active_branch_last_commit, compare_branch_last_commit, common_ancestor or None)
+
+            catfile=self.get_catfile()
+            if catfile is None:
+                cmd=get_rev_parse_cmd(active_branch)
+                if show_cmds is True:
+                    print("active_branch_last_commit:", shlex.join(cmd))
+                active_branch_last_commit=self.cmd_get_value(cmd)
+
+                cmd=get_rev_parse_cmd(compare_branch)
+                if show_cmds is True:
+                    print("compare_branch_last_commit:", shlex.join(cmd))
+                compare_branch_last_commit=self.cmd_get_value(cmd)
+            else:
+                active_branch_last_commit=self.get_catfile_sha(catfile, active_branch, label="active_branch_last_commit", show_cmds=show_cmds)
+                compare_branch_last_commit=self.get_catfile_sha(catfile, compare_branch, label="compare_branch_last_commit", show_cmds=show_cmds)
+
+            cmd=get_merge_base_cmd(active_branch, compare_branch)
             if show_cmds is True:
                 print("common_ancestor:", shlex.join(cmd))
-            common_ancestor=shell.cmd_get_value(cmd)
-
-            if active_branch_last_commit == compare_branch_last_commit:
-                return BranchStatus.UP_TO_DATE
-            elif active_branch_last_commit == common_ancestor:
-                return BranchStatus.PULL
-            elif compare_branch_last_commit == common_ancestor:
-                return BranchStatus.PUSH
+            common_ancestor=self.cmd_get_value(cmd)
+            return get_branch_status(active_branch_last_commit, compare_branch_last_commit, common_ancestor)
+
+    def get_branches_compare_status(self, compare_branch:str|None=None, show_cmds:bool=False) -> dict[str, BranchCompare]:
+        """
+        returns BranchCompare for every local branch against its upstream or against compare_branch.
+        Upstream counts come from one 'git for-each-ref'. With compare_branch, git >= 2.41 answers in one
+        'git for-each-ref' with %(ahead-behind:...), older git needs one 'git rev-list --left-right --count' per branch.
+        Branches without upstream or with a gone upstream are not returned.
+        A 'git merge-base' is only needed for divergent branches to tell if they have a common ancestor.
+        With native and a commit-graph covering the branches, compare_branch counts and merge bases are read in-process.
+        """
+        with SwitchDir(self, show_cmds=show_cmds):
+            counts:dict[str, tuple[str, int, int]]=dict()
+            if compare_branch is None:
+                cmd=[
+                    "git",
+                    "for-each-ref",
+                    "--format=%(refname:short)%00%(upstream:short)%00%(upstream:track,nobracket)",
+                    "refs/heads",
+                ]
+                if show_cmds is True:
+                    print("raw_branches:", shlex.join(cmd))
+                raw_branches=self.cmd_get_value(cmd)
+                if raw_branches is not None:
+                    for line in raw_branches.splitlines():
+                        branch_name, upstream, track=line.split("\0")
+                        ahead, behind, gone=parse_track(track)
+                        if upstream == "" or gone is True:
+                            continue
+                        counts[branch_name]=(upstream, ahead, behind)
             else:
-                if common_ancestor:
-                    return BranchStatus.DIVERGENT_WITH_COMMON_ANCESTOR
+                branch_names:list[str]|None=None
+                graph_shas=None
+                if self.get_commit_graph() is not None:
+                    branch_names=self.get_local_branches(show_cmds=show_cmds)
+                    graph_shas=self.get_graph_shas([compare_branch, *branch_names], label="ahead_behind", show_cmds=show_cmds)
+                raw_branches=None
+                if graph_shas is None:
+                    cmd=[
+                        "git",
+                        "for-each-ref",
+                        f"--format=%(refname:short)%00%(ahead-behind:{compare_branch})",
+                        "refs/heads",
+                    ]
+                    if show_cmds is True:
+                        print("raw_branches:", shlex.join(cmd))
+                    raw_branches=self.cmd_get_value(cmd, none_on_error=True)
+
+                if graph_shas is not None:
+                    graph, (compare_sha, *branch_shas)=graph_shas
+                    ahead_behinds=cast(list[tuple[int, int]], graph.get_ahead_behind([(branch_sha, compare_sha) for branch_sha in branch_shas]))
+                    for branch_name, (ahead, behind) in zip(cast(list[str], branch_names), ahead_behinds):
+                        counts[branch_name]=(compare_branch, ahead, behind)
+                elif raw_branches is not None:
+                    for line in raw_branches.splitlines():
+                        branch_name, ahead_behind=line.split("\0")
+                        ahead, behind=ahead_behind.split()
+                        counts[branch_name]=(compare_branch, int(ahead), int(behind))
+                else:
+                    if branch_names is None:
+                        branch_names=self.get_local_branches(show_cmds=show_cmds)
+                    for branch_name in branch_names:
+                        cmd=[
+                            "git",
+                            "rev-list",
+                            "--left-right",
+                            "--count",
+                            f"{branch_name}...{compare_branch}",
+                        ]
+                        if show_cmds is True:
+                            print("ahead_behind:", shlex.join(cmd))
+                        ahead_behind=self.cmd_get_value(cmd, none_on_error=True)
+                        if ahead_behind is not None:
+                            ahead, behind=ahead_behind.split()
+                            counts[branch_name]=(compare_branch, int(ahead), int(behind))
+
+            branches=dict()
+            for branch_name, (compare_name, ahead, behind) in counts.items():
+                if ahead == 0 and behind == 0:
+                    status=BranchStatus.UP_TO_DATE
+                elif ahead == 0:
+                    status=BranchStatus.PULL
+                elif behind == 0:
+                    status=BranchStatus.PUSH
                 else:
-                    return BranchStatus.DIVERGENT_WITHOUT_COMMON_ANCESTOR
+                    graph_shas=self.get_graph_shas([branch_name, compare_name], label="common_ancestor", show_cmds=show_cmds)
+                    if graph_shas is not None:
+                        graph, (branch_sha, compare_sha)=graph_shas
+                        common_ancestor=graph.get_merge_base(branch_sha, compare_sha)
+                    else:
+                        cmd=[
+                            "git",
+                            "merge-base",
+                            branch_name,
+                            compare_name,
+                        ]
+                        if show_cmds is True:
+                            print("common_ancestor:", shlex.join(cmd))
+                        common_ancestor=self.cmd_get_value(cmd, none_on_error=True)
+                    if common_ancestor:
+                        status=BranchStatus.DIVERGENT_WITH_COMMON_ANCESTOR
+                    else:
+                        status=BranchStatus.DIVERGENT_WITHOUT_COMMON_ANCESTOR
+                branches[branch_name]=BranchCompare(
+                    branch_name=branch_name,
+                    compare_branch=compare_name,
+                    status=status,
+                    ahead=ahead,
+                    behind=behind,
+                )
+            return branches
 
     def get_diren_root(self):
         return os.path.basename(self.get_direpa_root())
 
     def get_direpa_root(self, show_cmds:bool=False):
-        with SwitchDir(self, show_cmds=show_cmds):
+        with SimpleSwitchDir(direpa_project=self.direpa, show_cmds=show_cmds, gitlib=self):
             cmd=[
                 "git",
                 "rev-parse",
@@ -359,17 +1297,18 @@ class GitLib():
             ]
             if show_cmds is True:
                 print(shlex.join(cmd))
-            direpa_root=shell.cmd_get_value(cmd)
+            direpa_root=self.cmd_get_value(cmd)
             if os.path.isabs(direpa_root):
                 direpa_root=os.path.dirname(direpa_root)
             else:
+                direpa_current=self.get_direpa_current()
                 if direpa_root == ".":
                     if self.is_bare_repository is True:
-                        direpa_root=os.getcwd()
+                        direpa_root=direpa_current
                     else:
-                        direpa_root=os.path.dirname(os.getcwd())
+                        direpa_root=os.path.dirname(direpa_current)
                 elif direpa_root == ".git":
-                    direpa_root=os.getcwd()
+                    direpa_root=direpa_current
                 else:
                     raise NotImplementedError()
             return direpa_root
@@ -381,40 +1320,64 @@ class GitLib():
             has commit
             git rev-parse HEAD show HEAD when no HEAD
             git rev-list -n 1 --all  looks more reliable but not sure. actually this one give the latest commit
+            root commits are listed in the same order as 'git rev-list --all' so the last one is the first line of 'git rev-list --all --reverse'
             """
+            root_commits=self.get_root_commits(show_cmds=show_cmds)
+            if len(root_commits) == 0:
+                return None
+            return root_commits[-1]
+
+    def get_root_commits(self, show_cmds:bool=False) -> list[str]:
+        """commits without parents reachable from any ref, only root commits are printed so the history is never held in memory.
+        Result is cached until refresh(), a repository without commits is not cached.
+        """
+        if self._root_commits is not None:
+            return list(self._root_commits)
+        with SwitchDir(self, show_cmds=show_cmds):
             cmd=[
                 "git",
                 "rev-list",
                 "--all",
-                "--reverse",
+                "--max-parents=0",
             ]
             if show_cmds is True:
                 print(shlex.join(cmd))
-            commit=shell.cmd_get_value(cmd, none_on_error=True)
-            if commit is not None:
-                commit=commit.splitlines()[0]
-            return commit
+            output=self.cmd_get_value(cmd, none_on_error=True)
+            if output is None:
+                return []
+            self._root_commits=output.splitlines()
+            return list(self._root_commits)
         
+    @status_cached(label="raw_branches")
     def get_local_branches(self, show_cmds:bool=False):
         with SwitchDir(self, show_cmds=show_cmds):
-            cmd=[
-                "git",
-                "branch",
-                ]
+            gitdir=self.get_gitdir()
+            if gitdir is not None and gitdir.get_head_ref() is not None:
+                if show_cmds is True:
+                    print("raw_branches:", "read", os.path.join(gitdir.direpa_git, "refs", "heads"), os.path.join(gitdir.direpa_git, "packed-refs"))
+                refs=gitdir.get_refs("refs/heads/")
+                if not any(value.startswith("ref: ") for value in refs.values()):
+                    return [refname[len("refs/heads/"):] for refname in refs]
+
+            cmd=get_local_branches_cmd()
             if show_cmds is True:
                 print("raw_branches:", shlex.join(cmd))
-
-            raw_branches=shell.cmd_get_value(cmd).splitlines()
-            branches=[]
-            # remove the asterisk and strip all
-            for branch in raw_branches:
-                branches.append(re.sub(r"^\* ","",branch).strip())
-            return branches
+            return parse_local_branches(self.cmd_get_value(cmd))
 
     def get_local_remote_branches(self, show_cmds:bool=False):
         with SwitchDir(self, show_cmds=show_cmds):
             # string format
             # remote_name/develop
+            gitdir=self.get_gitdir()
+            if gitdir is not None:
+                if show_cmds is True:
+                    print("raw_branches:", "read", os.path.join(gitdir.direpa_git, "refs", "remotes"), os.path.join(gitdir.direpa_git, "packed-refs"))
+                branches=[]
+                for refname, value in gitdir.get_refs("refs/remotes/").items():
+                    if not value.startswith("ref: "):
+                        branches.append(refname[len("refs/remotes/"):])
+                return branches
+
             cmd=[
                 "git",
                 "branch",
@@ -422,7 +1385,7 @@ class GitLib():
                 ]
             if show_cmds is True:
                 print("raw_branches:", shlex.join(cmd))
-            raw_branches=shell.cmd_get_value(cmd)
+            raw_branches=self.cmd_get_value(cmd)
             branches=[]
             # remove all unneeded string
             if raw_branches is not None:
@@ -443,32 +1406,62 @@ class GitLib():
                         main_name="master"
                 else:
                     if name in ["main", "master"]:
-                        msg.error("There are two principal branches in the repo 'main' and 'master", exit=1)
+                        self.error(PrincipalBranchError("There are two principal branches in the repo 'main' and 'master"))
             return main_name
 
 
-    def get_remote_branches(self, remote_name:str|None=None, show_cmds:bool=False):
+    def get_remote_branches(self, remote_name:str|None=None, remote_refs:RemoteRefs|None=None, show_cmds:bool=False):
         with SwitchDir(self, show_cmds=show_cmds):
             """
             string format
             d06a492857eea71f64c51257ec81645e50f40957        refs/heads/develop
             """
-            if remote_name is None:
-                remote_name=self.get_remote_name()
-            cmd=[
-                "git",
-                "ls-remote",
-                remote_name,    
-            ]
+            if remote_refs is None:
+                if remote_name is None:
+                    remote_name=self.get_remote_name()
+                remote_refs=self.get_remote_refs(remote_name, label="raw_branches", show_cmds=show_cmds)
+            return remote_refs.get_branches()
+
+    def get_ls_remote_location(self, remote_name:str) -> str:
+        location=self.get_remote_location(name=remote_name)
+        if location is None:
+            # remote_name is already an url or a path
+            return remote_name
+        else:
+            return location
+
+    def get_remote_refs(self, remote_name:str|None=None, label:str="refs", show_cmds:bool=False) -> RemoteRefs:
+        """returns a snapshot of every ref on remote, from ls_remote_cache when it is set and fresh."""
+        if remote_name is None:
+            remote_name=self.get_remote_name()
+        # resolving the url costs a config read, it is only needed as cache key
+        location=remote_name
+        if self.ls_remote_cache is not None:
+            location=self.get_ls_remote_location(remote_name)
+            remote_refs=self.ls_remote_cache.get(location)
+            if remote_refs is not None:
+                if show_cmds is True:
+                    print(f"{label}:", "cached", "git ls-remote", location)
+                return remote_refs
+
+        with SwitchDir(self, show_cmds=show_cmds):
+            cmd=get_ls_remote_cmd(remote_name)
             if show_cmds is True:
-                print("raw_branches:", shlex.join(cmd))
-            raw_branches=shell.cmd_get_value(cmd).splitlines()
-            branches=[]
-            # remove all unneeded string
-            for branch in raw_branches:
-                if re.match("^.*?refs/heads/.*$", branch):
-                    branches.append(re.sub("^.*?refs/heads/","",branch).strip())
-            return branches
+                print(f"{label}:", shlex.join(cmd))
+            refs=parse_ls_remote(self.cmd_get_value(cmd))
+
+        remote_refs=RemoteRefs(remote_name=remote_name, location=location, refs=refs)
+        if self.ls_remote_cache is not None:
+            self.ls_remote_cache.set(remote_refs)
+        return remote_refs
+
+    def invalidate_ls_remote(self, remote_name:str|None=None):
+        if self.ls_remote_cache is not None:
+            if remote_name is None:
+                for remote in self.remotes:
+                    self.ls_remote_cache.invalidate(remote.location)
+            else:
+                self.ls_remote_cache.invalidate(self.get_ls_remote_location(remote_name))
         
     def get_remote_name(self):
         remote_names=self.get_remote_names()
@@ -477,101 +1470,167 @@ class GitLib():
         elif len(remote_names) == 1:
             return remote_names[0]
         else:
-            msg.error(f"Please choose a remote name from {remote_names}.", trace=True)
-            sys.exit(1)
+            self.error(RemoteNameError(f"Please choose a remote name from {remote_names}."), trace=True)
 
     def get_remote_location(self, name:str|None=None, filenpa_config:str|None=None, show_cmds:bool=False):
         if name is None:
             name=self.get_remote_name()
-        cmd=[
-            "git",
-            "config",
-            "--file",
-            self.get_filenpa_config(filenpa_config),
-            "--get",
-            f"remote.{name}.url",
-            ]
-        if show_cmds is True:
-            print("raw_branches:", shlex.join(cmd))
-        location=shell.cmd_get_value(cmd)
-        return location
+        if self.get_gitdir() is not None:
+            try:
+                return self.get_native_config_value(self.get_filenpa_config(filenpa_config), f"remote.{name}.url", label="raw_branches", show_cmds=show_cmds)
+            except (ValueError, OSError):
+                pass
+        return self.get_config_value(f"remote.{name}.url", filenpa_config=self.get_filenpa_config(filenpa_config), label="raw_branches", show_cmds=show_cmds)
 
     def get_user_email(self, filenpa_config:str|None=None, show_cmds:bool=False):
-        cmd=[
-            "git",
-            "config",
-            "--file",
-            self.get_filenpa_config(filenpa_config),
-            "user.email",
-            ]
-        if show_cmds is True:
-            print("useremail:", shlex.join(cmd))
-        useremail=shell.cmd_get_value(cmd)
-        if not useremail:
-            return None
-        else:
-            return useremail
+        if self.get_gitdir() is not None:
+            try:
+                return self.get_native_config_value(self.get_filenpa_config(filenpa_config), "user.email", label="useremail", show_cmds=show_cmds)
+            except (ValueError, OSError):
+                pass
+        return self.get_config_value("user.email", filenpa_config=self.get_filenpa_config(filenpa_config), label="useremail", show_cmds=show_cmds)
 
     def get_user_name(self, filenpa_config:str|None=None, show_cmds:bool=False):
+        if self.get_gitdir() is not None:
+            try:
+                return self.get_native_config_value(self.get_filenpa_config(filenpa_config), "user.name", label="username", show_cmds=show_cmds)
+            except (ValueError, OSError):
+                pass
+        return self.get_config_value("user.name", filenpa_config=self.get_filenpa_config(filenpa_config), label="username", show_cmds=show_cmds)
+
+    def get_config_values(self, filenpa_config:str|None=None, label:str="config", show_cmds:bool=False) -> dict[str, list[str]]:
+        """returns every value of filenpa_config, or of all config levels when filenpa_config is None, by normalized key.
+        Values are loaded with one 'git config --list -z' and kept until invalidate_config().
+        """
+        key=filenpa_config or ""
+        values=self._configs.get(key)
+        if values is not None:
+            if show_cmds is True:
+                print(f"{label}:", "cached", "git config --list")
+            return values
+
         cmd=[
             "git",
             "config",
-            "--file",
-            self.get_filenpa_config(filenpa_config),
-            "user.name",
-            ]
+        ]
+        if filenpa_config is not None:
+            cmd.extend(["--file", filenpa_config])
+        cmd.extend(["--list", "-z"])
         if show_cmds is True:
-            print("username:", shlex.join(cmd))
-        username=shell.cmd_get_value(cmd)
-        if not username:
-            return None
+            print(f"{label}:", shlex.join(cmd))
+
+        values=dict()
+        if filenpa_config is None:
+            with SwitchDir(self):
+                records=list(self.cmd_iter_records(cmd))
+        elif os.path.isfile(filenpa_config):
+            records=list(self.cmd_iter_records(cmd))
         else:
-            return username
+            records=[]
+        for record in records:
+            # each record is 'key\nvalue', a key without value is a boolean set to true
+            name, _, value=record.decode(errors="replace").partition("\n")
+            values.setdefault(normalize_key(name), []).append(value)
+        if self.plan is None:
+            # while recording a plan the config is read before the plan steps change it
+            self._configs[key]=values
+        return values
+
+    def get_config_value(self, key:str, filenpa_config:str|None=None, label:str="config", show_cmds:bool=False) -> str|None:
+        """returns the last value of key like 'git config --get', None when key is not set or empty."""
+        values=self.get_config_values(filenpa_config=filenpa_config, label=label, show_cmds=show_cmds).get(normalize_key(key))
+        if not values or not values[-1]:
+            return None
+        return values[-1]
 
-    def get_untracked_files(self, show_cmds:bool=False) -> list:
+    def iter_status(self, label:str="status", show_cmds:bool=False) -> Iterator[StatusEntry]:
+        """streams 'git status --porcelain=v2 -z' entries, stop iterating or close the generator to stop git status."""
         with SwitchDir(self, show_cmds=show_cmds):
-            cmd=[
-                "git",
-                "status",
-                "--porcelain",
-                ]
+            cmd=get_status_cmd()
             if show_cmds is True:
-                print("files_to_commit:", shlex.join(cmd))
-            files_to_commit=shell.cmd_get_value(cmd)
-            if files_to_commit is None:
-                return []
-            else:
-                return files_to_commit.splitlines()
+                print(f"{label}:", shlex.join(cmd))
+            return parse_status(self.cmd_iter_records(cmd))
+
+    def get_status(self, show_cmds:bool=False) -> list[StatusEntry]:
+        return list(self.iter_status(show_cmds=show_cmds))
+
+    @status_cached(label="files_to_commit", worktree=True)
+    def get_untracked_files(self, show_cmds:bool=False) -> list:
+        """returns 'git status --porcelain' lines."""
+        return [entry.to_porcelain_v1() for entry in self.iter_status(label="files_to_commit", show_cmds=show_cmds)]
 
     def has_head(self, show_cmds:bool=False):
         with SwitchDir(self, show_cmds=show_cmds):
-            cmd=[
-                "git",
-                "rev-parse",
-                "HEAD",
-                ]
+            gitdir=self.get_gitdir()
+            if gitdir is not None:
+                if show_cmds is True:
+                    print("output:", "read", os.path.join(gitdir.direpa_git, "HEAD"))
+                return gitdir.resolve_ref("HEAD") is not None
+
+            catfile=self.get_catfile()
+            if catfile is not None:
+                return self.get_catfile_sha(catfile, "HEAD", label="output", show_cmds=show_cmds) is not None
+
+            cmd=get_has_head_cmd()
             if show_cmds is True:
                 print("output:", shlex.join(cmd))
-            output=shell.cmd_get_value(cmd)
-            if output == "HEAD":
-                return False
-            else:
-                return True
+            return parse_has_head(self.cmd_get_value(cmd, none_on_error=True))
 
     def get_remote_names(self, show_cmds:bool=False):
-        with SwitchDir(self, show_cmds=show_cmds):
-            cmd=[
-                "git",
-                "remote",
-                ]
+        if self._remote_names is not None:
             if show_cmds is True:
-                print("raw_remotes:", shlex.join(cmd))
-            raw_remotes=shell.cmd_get_value(cmd)
-            remotes=[]
-            if raw_remotes is not None:
-                for remote in raw_remotes.splitlines():
-                    remotes.append(remote.strip())
-            return remotes
+                print("raw_remotes:", "cached", "remotes")
+            return list(self._remote_names)
+
+        with SwitchDir(self, show_cmds=show_cmds):
+            remotes=None
+            gitdir=self.get_gitdir()
+            if gitdir is not None:
+                try:
+                    remotes=gitdir.get_remote_names()
+                    if remotes is not None and show_cmds is True:
+                        print("raw_remotes:", "read", *gitdir.get_config_filenpas())
+                except (ValueError, OSError):
+                    remotes=None
+
+            if remotes is None and self.has_legacy_remotes() is False:
+                remotes=[]
+                for key in self.get_config_values(label="raw_remotes", show_cmds=show_cmds):
+                    section, _, rest=key.partition(".")
+                    name, _, _=rest.rpartition(".")
+                    if section == "remote" and name and name not in remotes:
+                        remotes.append(name)
+
+            if remotes is None:
+                cmd=get_remote_names_cmd()
+                if show_cmds is True:
+                    print("raw_remotes:", shlex.join(cmd))
+                remotes=parse_remote_names(self.cmd_get_value(cmd))
+
+            if self.plan is None:
+                self._remote_names=remotes
+            return list(remotes)
+
+    def get_remote_urls(self, show_cmds:bool=False) -> dict[str, str]:
+        """returns the url of every remote by name from the cached 'git config --list -z' values of all config levels.
+        Remotes defined in .git/remotes or .git/branches files are not returned.
+        """
+        urls:dict[str, str]=dict()
+        for key, values in self.get_config_values(label="remotes", show_cmds=show_cmds).items():
+            section, _, rest=key.partition(".")
+            name, _, option=rest.rpartition(".")
+            if section == "remote" and option == "url" and name and values[-1]:
+                urls[name]=values[-1]
+        return urls
+
+    def has_legacy_remotes(self) -> bool:
+        """remotes defined in .git/remotes or .git/branches files are only listed by 'git remote'."""
+        direpa_git=self.direpa_root if self.is_bare_repository is True else os.path.join(self.direpa_root, ".git")
+        for direpa_legacy in ["remotes", "branches"]:
+            direpa=os.path.join(direpa_git, direpa_legacy)
+            if os.path.isdir(direpa) and len(os.listdir(direpa)) > 0:
+                return True
+        return False
         
     def get_remotes(self, filenpa_config:str|None=None, show_cmds:bool=False):
         remotes:list[Remote]=[]
@@ -596,11 +1655,24 @@ class GitLib():
         self.append_quiet_arg(cmd, quiet)
         cmd.append(self.direpa_root)
         self.execute(cmd, show_only=show_only)
+        if show_only is False:
+            self.refresh()
 
     def is_branch_on_local(self, branch_name:str|None=None, show_cmds:bool=False):
         with SwitchDir(self, show_cmds=show_cmds):
             if branch_name is None:
                 branch_name=self.get_active_branch_name(show_cmds=show_cmds)
+            gitdir=self.get_gitdir()
+            if gitdir is not None:
+                try:
+                    return self.get_native_sha(gitdir, branch_name, label="has_branch_name", show_cmds=show_cmds) is not None
+                except ValueError:
+                    pass
+
+            catfile=self.get_catfile()
+            if catfile is not None:
+                return self.get_catfile_sha(catfile, branch_name, label="has_branch_name", show_cmds=show_cmds) is not None
+
             cmd=[
                 "git",
                 "rev-parse",
@@ -609,7 +1681,7 @@ class GitLib():
                 ]
             if show_cmds is True:
                 print("has_branch_name:", shlex.join(cmd))
-            has_branch_name=shell.cmd_devnull(cmd) == 0
+            has_branch_name=self.cmd_devnull(cmd) == 0
             return has_branch_name
 
     def is_branch_on_local_remote(self, remote_name:str|None=None, branch_name:str|None=None, show_cmds:bool=False):
@@ -618,6 +1690,17 @@ class GitLib():
         with SwitchDir(self, show_cmds=show_cmds):
             if branch_name is None:
                 branch_name=self.get_active_branch_name(show_cmds=show_cmds)
+            gitdir=self.get_gitdir()
+            if gitdir is not None:
+                try:
+                    return self.get_native_sha(gitdir, f"{remote_name}/{branch_name}", label="has_branch_name", show_cmds=show_cmds) is not None
+                except ValueError:
+                    pass
+
+            catfile=self.get_catfile()
+            if catfile is not None:
+                return self.get_catfile_sha(catfile, f"{remote_name}/{branch_name}", label="has_branch_name", show_cmds=show_cmds) is not None
+
             cmd=[
                 "git",
                 "rev-parse",
@@ -626,28 +1709,26 @@ class GitLib():
                 ]
             if show_cmds is True:
                 print("has_branch_name:", shlex.join(cmd))
-            has_branch_name=shell.cmd_devnull(cmd) == 0
+            has_branch_name=self.cmd_devnull(cmd) == 0
             return has_branch_name
 
-    def is_branch_on_remote(self, remote_name:str|None=None, branch_name:str|None=None, show_cmds:bool=False):
+    def is_branch_on_remote(self, remote_name:str|None=None, branch_name:str|None=None, remote_refs:RemoteRefs|None=None, show_cmds:bool=False):
         if remote_name is None:
             remote_name=self.default_remote
         with SwitchDir(self, show_cmds=show_cmds):
             if branch_name is None:
                 branch_name=self.get_active_branch_name(show_cmds=show_cmds)
 
-            cmd=[
-                "git",
-                "ls-remote",
-                "--heads",
-                remote_name,
-                branch_name,
-                ]
+            if remote_refs is None and self.ls_remote_cache is not None:
+                remote_refs=self.get_remote_refs(remote_name, label="result", show_cmds=show_cmds)
+            if remote_refs is not None:
+                return len(remote_refs.get_heads_matching(branch_name)) > 0
 
+            cmd=get_branch_on_remote_cmd(remote_name, branch_name)
             if show_cmds is True:
                 print("result:", shlex.join(cmd))
 
-            result=shell.cmd_get_value(cmd)
+            result=self.cmd_get_value(cmd)
             if result is None:
                 return False
             else:
@@ -655,20 +1736,16 @@ class GitLib():
 
     def is_branch_uptodate(self, show_cmds:bool=False):
         with SwitchDir(self, show_cmds=show_cmds):
-            cmd=[
-                "git",
-                "fetch",
-                "--dry-run",
-                ]
+            cmd=get_branch_uptodate_cmd()
             if show_cmds is True:
                 print("is_uptodate:", shlex.join(cmd))
 
-            is_uptodate=(shell.cmd_get_value(cmd) is None)
+            is_uptodate=(self.cmd_get_value(cmd) is None)
             return is_uptodate
 
     def is_direpa_git(self, fail_exit:bool=False, show_cmds:bool=False):
         git_directory_found=False
-        with SwitchDir(self, show_cmds=show_cmds):
+        with SimpleSwitchDir(direpa_project=self.direpa, show_cmds=show_cmds, gitlib=self):
             cmd=[
                 "git",
                 "rev-parse",
@@ -677,10 +1754,10 @@ class GitLib():
             if show_cmds is True:
                 print("git_directory_found:", shlex.join(cmd))
 
-            git_directory_found=shell.cmd_devnull(cmd) == 0
+            git_directory_found=self.cmd_devnull(cmd) == 0
             if fail_exit is True:
                 if git_directory_found is False:
-                    msg.error("This is not a git directory '{}'".format(self.direpa_root), exit=1)
+                    self.error(NotGitRepositoryError("This is not a git directory '{}'".format(self.direpa_root)))
 
             return git_directory_found
 
@@ -693,7 +1770,7 @@ class GitLib():
             if show_cmds is True:
                 print("num_objects:", shlex.join(cmd))
 
-            num_objects=int(shell.cmd_get_value(cmd).split()[0])
+            num_objects=int(self.cmd_get_value(cmd).split()[0])
             if num_objects == 0:
                 return True
             else:
@@ -701,13 +1778,7 @@ class GitLib():
 
     def merge(self, branch_name:str, show_only:bool=False):
         with SwitchDir(self, show_cmds=show_only):
-            cmd=[
-                "git",
-                "merge",
-                "--no-edit",
-                branch_name,
-            ]
-            self.execute(cmd, show_only=show_only)
+            self.execute(get_merge_cmd(branch_name), show_only=show_only)
 
     def merge_noff(self, branch_name:str, show_only:bool=False):
         with SwitchDir(self, show_cmds=show_only):
@@ -720,65 +1791,41 @@ class GitLib():
             ]
             self.execute(cmd, show_only=show_only)
 
+    @status_cached(label="files_to_commit", worktree=True)
     def need_commit(self, show_files:bool=False, show_cmds:bool=False):
-        with SwitchDir(self, show_cmds=show_cmds):
-            cmd=[
-                "git",
-                "status",
-                "--porcelain",
-            ]
-            if show_cmds is True:
-                print("files_to_commit:", shlex.join(cmd))
-
-            files_to_commit=shell.cmd_get_value(cmd)
-            if show_files is True:
-                if files_to_commit is not None:
-                    print("__untracked files present__")
-                    for f in files_to_commit.splitlines():
-                        print("  {}".format(f))
-            if files_to_commit:
-                return True
-            else:
-                return False
+        entries=self.iter_status(label="files_to_commit", show_cmds=show_cmds)
+        try:
+            need_commit=False
+            for entry in entries:
+                if need_commit is False and show_files is True:
+                    self.print("__untracked files present__")
+                need_commit=True
+                if show_files is False:
+                    # first entry is enough, git status is stopped
+                    break
+                self.print("  {}".format(entry.to_porcelain_v1()))
+            return need_commit
+        finally:
+            entries.close()
             
     def pull(self, remote:str|None=None, branch_name:str|None=None, quiet:bool|None=None, show_only:bool=False):
         with SwitchDir(self, show_cmds=show_only):
-            cmd=[
-                "git",
-                "pull",
-            ]
-            self.append_quiet_arg(cmd, quiet)
-            if remote is not None:
-                cmd.append(remote)
-
             if branch_name is None:
                 branch_name=self.get_active_branch_name(show_cmds=show_only)
-            cmd.append(branch_name)
-
-            self.execute(cmd, show_only=show_only)
+            self.execute(get_pull_cmd(branch_name, remote, self.get_quiet_arg(quiet)), show_only=show_only)
         
     def push(self, remote_name:str|None=None, branch_name:str|None=None, set_upstream:bool=False, quiet:bool|None=None, show_only:bool=False):
         with SwitchDir(self, show_cmds=show_only):
-            cmd=[
-                "git",
-                "push",
-            ]
-            self.append_quiet_arg(cmd, quiet)
-            if set_upstream is True:
-                cmd.append("--set-upstream")
-
             if remote_name is None:
-                cmd.append(self.get_remote_name())
-            else:
-                cmd.append(remote_name)
-
-            if branch_name is None:
-                if set_upstream is True:
-                    cmd.append(self.get_active_branch_name(show_cmds=show_only))
-            else:
-                cmd.append(branch_name)
+                remote_name=self.get_remote_name()
+            if branch_name is None and set_upstream is True:
+                branch_name=self.get_active_branch_name(show_cmds=show_only)
+            self.execute(get_push_cmd(remote_name, branch_name, set_upstream, self.get_quiet_arg(quiet)), show_only=show_only)
+            if show_only is False:
+                self.invalidate_ls_remote(remote_name)
 
-            self.execute(cmd, show_only=show_only)
+    def get_push_batch(self, atomic:bool=True, quiet:bool|None=None) -> "PushBatch":
+        return PushBatch(self, atomic=atomic, quiet=quiet)
 
     def rename_branch(self, new_branch_name:str, branch_name:str|None=None, remote_name:str|None=None, show_only:bool=False):
         with SwitchDir(self, show_cmds=show_only):
@@ -792,7 +1839,8 @@ class GitLib():
                     restore_branch=True
 
             self.commit(message=f"commit before renaming branch {branch_name} to {new_branch_name}")
-            self.push(set_upstream=True, show_only=show_only)
+            if remote_name is None:
+                remote_name=self.get_remote_name()
             cmd=[
                 "git",
                 "branch",
@@ -801,14 +1849,14 @@ class GitLib():
                 new_branch_name,
             ]
             self.execute(cmd, show_only=show_only)
-            self.delete_branch_remote(branch_name=branch_name, remote_name=remote_name, show_only=show_only)
-            cmd=[
-                "git",
-                "branch",
-                "--unset-upstream",
-            ]
-            self.execute(cmd, show_only=show_only)
-            self.push(set_upstream=True, branch_name=new_branch_name, remote_name=remote_name, show_only=show_only)
+            # new branch is pushed and old branch deleted in the same atomic push, --set-upstream replaces the moved upstream
+            batch=self.get_push_batch()
+            batch.add_branch(new_branch_name, remote_names=[remote_name], set_upstream=True)
+            if self.is_branch_on_remote(remote_name, branch_name):
+                batch.delete_branch(branch_name, remote_names=[remote_name])
+            else:
+                self.warning("'{}' can't be deleted because it does not exist on remote.".format(branch_name))
+            batch.push(show_only=show_only)
 
             if restore_branch is True:
                 self.checkout(active_branch, show_only=show_only)
@@ -826,14 +1874,10 @@ class GitLib():
                 message,
             ]
             self.execute(cmd, show_only=show_only)
-            for remote_name in remote_names:
-                cmd=[
-                    "git",
-                    "push",
-                    remote_name,
-                    tag,    
-                ]
-                self.execute(cmd, show_only=show_only)
+            if len(remote_names) > 0:
+                batch=self.get_push_batch(atomic=False, quiet=False)
+                batch.add_tag(tag, remote_names=remote_names)
+                batch.push(show_only=show_only)
     
     def set_remote(self, repository_path:str, name:str|None=None, show_only:bool=False):
         if name is None:
@@ -862,12 +1906,12 @@ class GitLib():
         filenpa_config=self.get_filenpa_config()
         if self.get_user_name(filenpa_config=filenpa_config, show_cmds=show_only) is None:
             if username is None:
-                username=prompt("git user.name")
+                username=self.prompt("git user.name")
             self.set_user_name(username, filenpa_config=filenpa_config, show_only=show_only)
 
         if self.get_user_email(filenpa_config=filenpa_config, show_cmds=show_only) is None:
             if email is None:
-                email=prompt("git user.email")
+                email=self.prompt("git user.email")
             self.set_user_email(email, filenpa_config=filenpa_config, show_only=show_only)
 
     def get_filenpa_config(self, filenpa_config:str|None=None):
@@ -913,10 +1957,10 @@ class GitLib():
 
     def get_is_bare_repository(self, direpa_repo=None, show_cmds:bool=False):
         if direpa_repo is None:
-            direpa_repo=self.direpa_root
+            direpa_repo=self.direpa
 
         is_bare:bool=False
-        with SimpleSwitchDir(direpa_project=direpa_repo, show_cmds=show_cmds):
+        with SimpleSwitchDir(direpa_project=direpa_repo, show_cmds=show_cmds, gitlib=self):
             cmd=[
                 "git",
                 "rev-parse",
@@ -924,7 +1968,7 @@ class GitLib():
                 ]
             if show_cmds is True:
                 print("is_bare:", shlex.join(cmd))
-            output=shell.cmd_get_value(cmd, none_on_error=True)
+            output=self.cmd_get_value(cmd, none_on_error=True)
             if output is None:
                 is_bare=False
             elif output == "true":
@@ -937,15 +1981,17 @@ class GitLib():
         if direpa_repo is None:
             direpa_repo=self.direpa_root
 
-        if self.get_is_bare_repository(direpa_repo=direpa_repo) is False:
+        if self.plan is not None and not os.path.exists(direpa_repo):
+            # repository created by an earlier step of the plan, only bare repositories have their default branch set
+            pass
+        elif self.get_is_bare_repository(direpa_repo=direpa_repo) is False:
             remote_location=self.get_remote_location(name=remote_name, filenpa_config=filenpa_config, show_cmds=show_only)
             if remote_location is None:
-                msg.error(f"Path is not a bare repository '{direpa_repo}'")
-                sys.exit(1)
+                self.error(NotBareRepositoryError(f"Path is not a bare repository '{direpa_repo}'"))
             else:
                 direpa_repo=remote_location
 
-        with SimpleSwitchDir(direpa_project=cast(str,direpa_repo), show_cmds=show_only):
+        with SimpleSwitchDir(direpa_project=cast(str,direpa_repo), show_cmds=show_only, gitlib=self):
             cmd=[
                 "git",
                 "symbolic-ref",
@@ -954,7 +2000,9 @@ class GitLib():
             ]
             self.execute(cmd, show_only=show_only)
 
-    def set_upstream(self, branch_name:str, remote_name:str|None=None, filenpa_config:str|None=None, show_only:bool=False):
+    def set_upstream(self, branch_name:str, remote_name:str|None=None, filenpa_config:str|None=None, remote_branch_name:str|None=None, show_only:bool=False):
+        if remote_branch_name is None:
+            remote_branch_name=branch_name
         if remote_name is None:
             remote_name=self.get_remote_name()
         cmd=[
@@ -973,19 +2021,148 @@ class GitLib():
             "--file",
             self.get_filenpa_config(filenpa_config),
             f"branch.{branch_name}.merge",
-            f"refs/heads/{branch_name}"
+            f"refs/heads/{remote_branch_name}"
             ]
         self.execute(cmd, show_only=show_only)
 
+class PushBatch():
+    """collects branch, tag and deletion ref updates and sends them with one 'git push --atomic' per remote.
+    Remotes are pushed in parallel, one after the other in the order they were added while a plan is recording.
+        batch=gitlib.get_push_batch()
+        batch.add_branch("main", remote_names=["origin", "mirror"])
+        batch.add_tag("v1.0.0", remote_names=["origin", "mirror"])
+        batch.delete_branch("old", remote_names=["origin"])
+        batch.push()
+    set_upstream on a branch sets its upstream to the first of its remote_names. The push of that remote gets --set-upstream
+    when every branch pushed to it asked for it, otherwise the upstream of the branches that asked is set after the push.
+    """
+    def __init__(self, gitlib:GitLib, atomic:bool=True, quiet:bool|None=None):
+        self.gitlib=gitlib
+        self.atomic=atomic
+        self.quiet=quiet
+        self.refspecs:dict[str, list[str]]=dict()
+        # branch names pushed to each remote, and the ones whose upstream is set with their remote branch name
+        self.branches:dict[str, set[str]]=dict()
+        self.upstreams:dict[str, dict[str, str]]=dict()
+
+    def get_remote_names(self, remote_names:list|None=None) -> list:
+        if remote_names is None:
+            return [self.gitlib.get_remote_name()]
+        return remote_names
+
+    def add_refspec(self, refspec:str, remote_names:list|None=None):
+        for remote_name in self.get_remote_names(remote_names):
+            refspecs=self.refspecs.setdefault(remote_name, [])
+            if refspec not in refspecs:
+                refspecs.append(refspec)
+
+    def add_branch(self, branch_name:str, remote_names:list|None=None, remote_branch_name:str|None=None, force:bool=False, set_upstream:bool=False):
+        if remote_branch_name is None:
+            remote_branch_name=branch_name
+        remote_names=self.get_remote_names(remote_names)
+        self.add_refspec(f"{'+' if force is True else ''}refs/heads/{branch_name}:refs/heads/{remote_branch_name}", remote_names)
+        for remote_name in remote_names:
+            self.branches.setdefault(remote_name, set()).add(branch_name)
+        if set_upstream is True:
+            self.upstreams.setdefault(remote_names[0], dict())[branch_name]=remote_branch_name
+
+    def add_tag(self, tag:str, remote_names:list|None=None, force:bool=False):
+        self.add_refspec(f"{'+' if force is True else ''}refs/tags/{tag}:refs/tags/{tag}", remote_names)
+
+    def delete_branch(self, branch_name:str, remote_names:list|None=None):
+        self.add_refspec(f":refs/heads/{branch_name}", remote_names)
+
+    def delete_tag(self, tag:str, remote_names:list|None=None):
+        self.add_refspec(f":refs/tags/{tag}", remote_names)
+
+    def has_set_upstream(self, remote_name:str) -> bool:
+        """--set-upstream applies to every branch of the push, it is only used when all of them asked for it."""
+        upstreams=self.upstreams.get(remote_name, dict())
+        return len(upstreams) > 0 and set(upstreams) == self.branches.get(remote_name, set())
+
+    def set_upstreams(self, remote_name:str, show_only:bool=False):
+        if self.has_set_upstream(remote_name):
+            return
+        for branch_name, remote_branch_name in self.upstreams.get(remote_name, dict()).items():
+            self.gitlib.set_upstream(branch_name, remote_name=remote_name, remote_branch_name=remote_branch_name, show_only=show_only)
+
+    def get_cmds(self) -> dict[str, list]:
+        cmds=dict()
+        for remote_name, refspecs in self.refspecs.items():
+            if len(refspecs) == 0:
+                continue
+            cmd=[
+                "git",
+                "push",
+            ]
+            self.gitlib.append_quiet_arg(cmd, self.quiet)
+            if self.atomic is True:
+                cmd.append("--atomic")
+            if self.has_set_upstream(remote_name):
+                cmd.append("--set-upstream")
+            cmd.append(remote_name)
+            cmd.extend(refspecs)
+            cmds[remote_name]=cmd
+        return cmds
+
+    def push(self, show_only:bool=False):
+        """all remotes are pushed even when one fails, then the first error is raised."""
+        cmds=self.get_cmds()
+        with SwitchDir(self.gitlib, show_cmds=show_only):
+            if show_only is True:
+                for remote_name, cmd in cmds.items():
+                    self.gitlib.execute(cmd, show_only=True)
+                    self.set_upstreams(remote_name, show_only=True)
+                return
+
+            def push_remote(remote_name:str):
+                with SwitchDir(self.gitlib, show_cmds=False):
+                    try:
+                        self.gitlib.execute(cmds[remote_name], show_only=False)
+                        self.set_upstreams(remote_name)
+                        return None
+                    except (Exception, SystemExit) as e:
+                        return e
+                    finally:
+                        self.gitlib.invalidate_ls_remote(remote_name)
+
+            if self.gitlib.plan is not None:
+                # recorded steps keep the order of the remotes so the plan is the same on every run
+                errors=[push_remote(remote_name) for remote_name in cmds]
+            else:
+                with ThreadPoolExecutor(max_workers=max(1, len(cmds))) as executor:
+                    errors=list(executor.map(push_remote, cmds))
+        self.refspecs.clear()
+        self.branches.clear()
+        self.upstreams.clear()
+        for error in errors:
+            if error is not None:
+                raise error
+
 class SimpleSwitchDir():
     """with SimpleSwitchDir switches to provided directory and returns to previous directory.
+    When gitlib is provided with chdir=False, the directory is only pushed on gitlib's thread directory stack.
     """
-    def __init__(self, direpa_project:str, show_cmds:bool=False):
+    def __init__(self, direpa_project:str, show_cmds:bool=False, gitlib:"GitLib|None"=None):
         self.direpa_project=direpa_project
         self.direpa_previous=None
         self.show_cmds=show_cmds
+        self.gitlib=gitlib
+        self.pushed=False
 
     def __enter__(self):
+        if self.gitlib is not None and self.gitlib.chdir is False:
+            direpa_current=self.gitlib.get_direpa_current()
+            if direpa_current != self.direpa_project:
+                self.direpa_previous=direpa_current
+                if self.show_cmds is True:
+                    print(f"cd {self.direpa_project}")
+                if not os.path.isdir(self.direpa_project) and self.show_cmds is False and self.gitlib.plan is None:
+                    raise FileNotFoundError(f"No such file or directory: '{self.direpa_project}'")
+            self.gitlib.get_direpas().append(self.direpa_project)
+            self.pushed=True
+            return
+
         direpa_current=os.getcwd()
         if direpa_current != self.direpa_project:
             self.direpa_previous=direpa_current
@@ -998,6 +2175,13 @@ class SimpleSwitchDir():
                     raise
                     
     def __exit__(self, exc_type, exc_value, traceback):
+        if self.pushed is True:
+            cast(GitLib, self.gitlib).get_direpas().pop()
+            self.pushed=False
+            if self.direpa_previous is not None and self.show_cmds is True:
+                print(f"cd {self.direpa_previous}")
+            return
+
         if self.direpa_previous is not None:
             if self.show_cmds is True:
                 print(f"cd {self.direpa_previous}")
@@ -1010,13 +2194,32 @@ class SimpleSwitchDir():
 
 class SwitchDir():
     """with SwitchDir switches to git root directory and returns to previous directory.
+    With gitlib chdir=False the root is pushed on gitlib's thread directory stack instead of changing directory.
+    The mode is kept from enter to exit, start_plan() or stop_plan() inside the block do not change how it is left.
     """
     def __init__(self, gitlib: GitLib, show_cmds:bool=False):
         self.gitlib=gitlib
         self.direpa_previous=None
         self.show_cmds=show_cmds
+        self.chdir=gitlib.chdir
 
     def __enter__(self):
+        self.chdir=self.gitlib.chdir
+        if self.chdir is False:
+            direpas=self.gitlib.get_direpas()
+            if self.gitlib.local.switch_root is None:
+                self.gitlib.local.switch_root=self
+                direpa_root=self.gitlib.direpa_root
+                direpa_current=self.gitlib.get_direpa_current()
+                if direpa_current != direpa_root:
+                    self.direpa_previous=direpa_current
+                    if self.show_cmds is True:
+                        print(f"cd {direpa_root}")
+                    if not os.path.isdir(direpa_root) and self.show_cmds is False and self.gitlib.plan is None:
+                        raise FileNotFoundError(f"No such file or directory: '{direpa_root}'")
+                direpas.append(direpa_root)
+            return
+
         if self.gitlib.switch_root is None:
             self.gitlib.switch_root=self
             direpa_current=os.getcwd()
@@ -1031,6 +2234,14 @@ class SwitchDir():
                         raise
             
     def __exit__(self, exc_type, exc_value, traceback):
+        if self.chdir is False:
+            if self.gitlib.local.switch_root == self:
+                self.gitlib.local.switch_root=None
+                self.gitlib.get_direpas().pop()
+                if self.direpa_previous is not None and self.show_cmds is True:
+                    print(f"cd {self.direpa_previous}")
+            return
+
         if self.gitlib.switch_root == self:
             self.gitlib.switch_root=None
             if self.direpa_previous is not None:
@@ -0,0 +1,310 @@
+#!/usr/bin/env python3
+import os
+import threading
+import time
+from enum import Enum
+from typing import Callable, Iterator
+
+from .fleet import GitFleet
+from .gitlib import GitLib, SwitchDir
+
+class MaintenanceTask(str, Enum):
+    PACK_REFS="pack-refs"
+    LOOSE_OBJECTS="loose-objects"
+    INCREMENTAL_REPACK="incremental-repack"
+    MULTI_PACK_INDEX="multi-pack-index"
+    COMMIT_GRAPH="commit-graph"
+
+class RepoHealth():
+    """counts read from the git directory without running git.
+    commit_graph_stale is True when a pack is newer than the commit-graph.
+    """
+    def __init__(self,
+        direpa_git:str,
+        loose_objects:int=0,
+        loose_refs:int=0,
+        pack_sizes:list[int]|None=None,
+        has_commit_graph:bool=False,
+        commit_graph_stale:bool=False,
+        has_multi_pack_index:bool=False,
+    ):
+        self.direpa_git=direpa_git
+        self.loose_objects=loose_objects
+        self.loose_refs=loose_refs
+        if pack_sizes is None:
+            pack_sizes=[]
+        self.pack_sizes=pack_sizes
+        self.has_commit_graph=has_commit_graph
+        self.commit_graph_stale=commit_graph_stale
+        self.has_multi_pack_index=has_multi_pack_index
+
+    def __repr__(self):
+        return f"RepoHealth({self.direpa_git!r}, loose_objects={self.loose_objects}, loose_refs={self.loose_refs}, packs={self.packs}, commit_graph={self.has_commit_graph}, multi_pack_index={self.has_multi_pack_index})"
+
+    @property
+    def packs(self) -> int:
+        return len(self.pack_sizes)
+
+    def get_tasks(self, loose_objects_limit:int=100, loose_refs_limit:int=100, packs_limit:int=10) -> list[MaintenanceTask]:
+        """tasks needed by the repository, cheapest first."""
+        tasks=[]
+        if self.loose_refs >= loose_refs_limit:
+            tasks.append(MaintenanceTask.PACK_REFS)
+        if self.loose_objects >= loose_objects_limit:
+            tasks.append(MaintenanceTask.LOOSE_OBJECTS)
+        if self.packs >= packs_limit:
+            tasks.append(MaintenanceTask.INCREMENTAL_REPACK)
+        elif self.packs > 1 and self.has_multi_pack_index is False:
+            tasks.append(MaintenanceTask.MULTI_PACK_INDEX)
+        has_objects=self.packs > 0 or self.loose_objects > 0
+        if has_objects and (self.has_commit_graph is False or self.commit_graph_stale is True or len(tasks) > 0):
+            tasks.append(MaintenanceTask.COMMIT_GRAPH)
+        return tasks
+
+class MaintenanceResult():
+    """skipped tells why the repository or its remaining tasks were not run: 'busy: ...', 'locked', 'budget' or 'not a repository'."""
+    def __init__(self,
+        direpa:str,
+        health:RepoHealth|None=None,
+        tasks:list[MaintenanceTask]|None=None,
+        skipped:str|None=None,
+        error:BaseException|None=None,
+        elapsed:float=0.0,
+    ):
+        self.direpa=direpa
+        self.health=health
+        if tasks is None:
+            tasks=[]
+        self.tasks=tasks
+        self.skipped=skipped
+        self.error=error
+        self.elapsed=elapsed
+
+    def __repr__(self):
+        return f"MaintenanceResult({self.direpa!r}, tasks={[task.value for task in self.tasks]!r}, skipped={self.skipped!r}, error={self.error!r})"
+
+def get_direpa_git(gitlib:GitLib) -> str:
+    if gitlib.is_bare_repository is True:
+        return gitlib.direpa_root
+    return os.path.join(gitlib.direpa_root, ".git")
+
+def get_repo_health(direpa_git:str) -> RepoHealth:
+    direpa_objects=os.path.join(direpa_git, "objects")
+    loose_objects=0
+    for index in range(256):
+        try:
+            loose_objects+=len(os.listdir(os.path.join(direpa_objects, f"{index:02x}")))
+        except (FileNotFoundError, NotADirectoryError):
+            pass
+
+    loose_refs=0
+    for _, _, filenames in os.walk(os.path.join(direpa_git, "refs")):
+        loose_refs+=sum(1 for filename in filenames if not filename.endswith(".lock"))
+
+    direpa_pack=os.path.join(direpa_objects, "pack")
+    pack_sizes=[]
+    pack_mtime=0
+    try:
+        filenames=os.listdir(direpa_pack)
+    except FileNotFoundError:
+        filenames=[]
+    for filename in filenames:
+        # a pack without its index is still being written
+        if filename.endswith(".pack") and f"{filename[:-5]}.idx" in filenames:
+            stat=os.stat(os.path.join(direpa_pack, filename))
+            pack_sizes.append(stat.st_size)
+            pack_mtime=max(pack_mtime, stat.st_mtime_ns)
+
+    commit_graph_mtime=None
+    for filenpa in get_commit_graph_filenpas(direpa_git):
+        if os.path.isfile(filenpa):
+            commit_graph_mtime=max(commit_graph_mtime or 0, os.stat(filenpa).st_mtime_ns)
+
+    return RepoHealth(
+        direpa_git=direpa_git,
+        loose_objects=loose_objects,
+        loose_refs=loose_refs,
+        pack_sizes=sorted(pack_sizes, reverse=True),
+        has_commit_graph=commit_graph_mtime is not None,
+        commit_graph_stale=commit_graph_mtime is not None and pack_mtime > commit_graph_mtime,
+        has_multi_pack_index=os.path.isfile(os.path.join(direpa_pack, "multi-pack-index")),
+    )
+
+def get_commit_graph_filenpas(direpa_git:str) -> list[str]:
+    direpa_info=os.path.join(direpa_git, "objects", "info")
+    return [
+        os.path.join(direpa_info, "commit-graph"),
+        os.path.join(direpa_info, "commit-graphs", "commit-graph-chain"),
+    ]
+
+def touch_commit_graph(direpa_git:str):
+    for filenpa in get_commit_graph_filenpas(direpa_git):
+        if os.path.isfile(filenpa):
+            os.utime(filenpa)
+
+def get_busy_reason(direpa_git:str) -> str|None:
+    """returns why the repository is being written, None when it is idle.
+    receive-pack keeps pushed objects in a quarantine directory until its ref updates are done, ref updates hold lock files.
+    """
+    direpa_objects=os.path.join(direpa_git, "objects")
+    try:
+        for filename in os.listdir(direpa_objects):
+            if filename.startswith("tmp_objdir-incoming-"):
+                return f"push in progress '{filename}'"
+    except FileNotFoundError:
+        pass
+
+    for filenames in [["HEAD.lock"], ["packed-refs.lock"], ["config.lock"], ["shallow.lock"], ["objects", "info", "commit-graph.lock"]]:
+        if os.path.exists(os.path.join(direpa_git, *filenames)):
+            return f"lock '{'/'.join(filenames)}'"
+
+    direpa_refs=os.path.join(direpa_git, "refs")
+    for direpa, _, filenames in os.walk(direpa_refs):
+        for filename in filenames:
+            if filename.endswith(".lock"):
+                return f"lock '{os.path.relpath(os.path.join(direpa, filename), direpa_git)}'"
+    return None
+
+def get_task_cmds(task:MaintenanceTask, health:RepoHealth) -> list[list]:
+    if task == MaintenanceTask.PACK_REFS:
+        return [["git", "pack-refs", "--all", "--prune"]]
+    elif task == MaintenanceTask.LOOSE_OBJECTS:
+        # without -a only loose objects are packed, existing packs are left as they are
+        return [["git", "repack", "-d", "-q"]]
+    elif task == MaintenanceTask.INCREMENTAL_REPACK:
+        # packs smaller than the largest one are rewritten into one pack, the largest pack is not read again
+        batch_size=sum(health.pack_sizes[1:])+1
+        return [
+            ["git", "multi-pack-index", "write"],
+            ["git", "multi-pack-index", "expire"],
+            ["git", "multi-pack-index", "repack", f"--batch-size={batch_size}"],
+        ]
+    elif task == MaintenanceTask.MULTI_PACK_INDEX:
+        return [["git", "multi-pack-index", "write"]]
+    elif task == MaintenanceTask.COMMIT_GRAPH:
+        return [["git", "commit-graph", "write", "--reachable", "--split"]]
+    raise ValueError(f"unknown maintenance task '{task}'")
+
+def maintain(
+    gitlib:GitLib,
+    deadline:float|None=None,
+    loose_objects_limit:int=100,
+    loose_refs_limit:int=100,
+    packs_limit:int=10,
+    show_only:bool=False,
+) -> MaintenanceResult:
+    """runs the tasks the repository needs while time.monotonic() is before deadline.
+    The repository is checked for pushes in progress before each task, and objects/maintenance.lock,
+    the lock of 'git maintenance run', keeps two maintenances of the same repository apart.
+    """
+    start=time.monotonic()
+    direpa_git=get_direpa_git(gitlib)
+    health=get_repo_health(direpa_git)
+    result=MaintenanceResult(direpa=gitlib.direpa_root, health=health)
+    tasks=health.get_tasks(loose_objects_limit=loose_objects_limit, loose_refs_limit=loose_refs_limit, packs_limit=packs_limit)
+    if len(tasks) == 0:
+        return result
+
+    filenpa_lock=os.path.join(direpa_git, "objects", "maintenance.lock")
+    try:
+        fd=os.open(filenpa_lock, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+        os.close(fd)
+    except FileExistsError:
+        result.skipped="locked"
+        return result
+
+    try:
+        with SwitchDir(gitlib, show_cmds=show_only):
+            for task in tasks:
+                if deadline is not None and time.monotonic() >= deadline:
+                    result.skipped="budget"
+                    break
+                busy_reason=get_busy_reason(direpa_git)
+                if busy_reason is not None:
+                    result.skipped=f"busy: {busy_reason}"
+                    break
+                for cmd in get_task_cmds(task, health):
+                    gitlib.execute(cmd, show_only=show_only)
+                if task == MaintenanceTask.COMMIT_GRAPH and show_only is False:
+                    # git leaves the graph untouched when it has no new commit, it still covers every pack
+                    touch_commit_graph(direpa_git)
+                result.tasks.append(task)
+    finally:
+        os.remove(filenpa_lock)
+        result.elapsed=time.monotonic()-start
+    return result
+
+class MaintenanceScheduler():
+    """keeps many repositories healthy within a time budget per round.
+    Repositories are checked from the file system only, the ones needing the most work run first, at most workers at once.
+    Once budget seconds have passed no new task starts, a running task is finished.
+        scheduler=MaintenanceScheduler(direpas, budget=300)
+        for result in scheduler.run():
+            print(result.direpa, result.tasks, result.skipped)
+    """
+    def __init__(self,
+        direpas:list[str],
+        budget:float|None=None,
+        workers:int=4,
+        loose_objects_limit:int=100,
+        loose_refs_limit:int=100,
+        packs_limit:int=10,
+        **gitlib_options,
+    ):
+        self.direpas=direpas
+        self.budget=budget
+        self.workers=workers
+        self.loose_objects_limit=loose_objects_limit
+        self.loose_refs_limit=loose_refs_limit
+        self.packs_limit=packs_limit
+        gitlib_options.setdefault("service", True)
+        self.gitlib_options=gitlib_options
+
+    def get_health(self) -> dict[str, RepoHealth]:
+        healths=dict()
+        for direpa in self.direpas:
+            gitlib=GitLib(direpa=direpa, chdir=False, **self.gitlib_options)
+            if gitlib.exists is True:
+                healths[direpa]=get_repo_health(get_direpa_git(gitlib))
+        return healths
+
+    def get_score(self, health:RepoHealth) -> float:
+        return (
+            health.loose_objects/self.loose_objects_limit
+            +health.loose_refs/self.loose_refs_limit
+            +health.packs/self.packs_limit
+            +(0 if health.has_commit_graph is True else 1)
+        )
+
+    def run(self, show_only:bool=False) -> Iterator[MaintenanceResult]:
+        deadline=None
+        if self.budget is not None:
+            deadline=time.monotonic()+self.budget
+        healths=self.get_health()
+        for direpa in self.direpas:
+            if direpa not in healths:
+                yield MaintenanceResult(direpa=direpa, skipped="not a repository")
+        direpas=sorted(healths, key=lambda direpa: self.get_score(healths[direpa]), reverse=True)
+        fleet=GitFleet(direpas, workers=self.workers, **self.gitlib_options)
+        for fleet_result in fleet.run(
+            maintain,
+            deadline=deadline,
+            loose_objects_limit=self.loose_objects_limit,
+            loose_refs_limit=self.loose_refs_limit,
+            packs_limit=self.packs_limit,
+            show_only=show_only,
+        ):
+            if fleet_result.error is None:
+                yield fleet_result.value
+            else:
+                yield MaintenanceResult(direpa=fleet_result.direpa, health=healths.get(fleet_result.direpa), error=fleet_result.error, elapsed=fleet_result.elapsed)
+
+    def run_every(self, interval:float, on_result:Callable[[MaintenanceResult], None], stop:threading.Event|None=None):
+        """runs a round every interval seconds until stop is set."""
+        if stop is None:
+            stop=threading.Event()
+        while not stop.is_set():
+            start=time.monotonic()
+            for result in self.run():
+                on_result(result)
+            stop.wait(max(0, interval-(time.monotonic()-start)))
@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+import json
+import shlex
+import subprocess
+
+from .errors import GitCommandError
+from .ssh_mux import SshMux
+
+class PlanStep():
+    """cmd runs from direpa or from the script directory when direpa is None, when unless is set cmd only runs if unless fails."""
+    def __init__(self, cmd:list, direpa:str|None=None, unless:list|None=None):
+        self.cmd=cmd
+        self.direpa=direpa
+        self.unless=unless
+
+    def to_dict(self) -> dict:
+        return dict(cmd=self.cmd, direpa=self.direpa, unless=self.unless)
+
+    def get_shell(self) -> str:
+        line=shlex.join(self.cmd)
+        if self.unless is not None:
+            line=f"{shlex.join(self.unless)} || {line}"
+        return line
+
+class CommandPlan():
+    """commands recorded by GitLib.start_plan() instead of being executed.
+    The plan can be inspected, saved as json and run later as one shell script, locally or over one ssh session.
+        plan=gitlib.start_plan()
+        gitlib.init()
+        gitlib.set_user(username="bot", email="bot@example.com")
+        gitlib.stop_plan()
+        plan.run()
+    """
+    def __init__(self, steps:list[PlanStep]|None=None):
+        if steps is None:
+            steps=[]
+        self.steps=steps
+
+    def add(self, cmd:list, direpa:str|None=None, unless:list|None=None):
+        self.steps.append(PlanStep(cmd=list(cmd), direpa=direpa, unless=unless))
+
+    def get_cmds(self) -> list[list]:
+        return [step.cmd for step in self.steps]
+
+    def to_json(self) -> str:
+        return json.dumps(dict(steps=[step.to_dict() for step in self.steps]), indent=4)
+
+    @staticmethod
+    def from_json(text:str) -> "CommandPlan":
+        return CommandPlan(steps=[PlanStep(**step) for step in json.loads(text)["steps"]])
+
+    def get_script(self) -> str:
+        lines=[
+            "#!/bin/sh",
+            "set -e",
+        ]
+        for step in self.steps:
+            if step.direpa is None:
+                lines.append(step.get_shell())
+            else:
+                lines.append(f"(cd {shlex.quote(step.direpa)} && {{ {step.get_shell()}; }})")
+        return "\n".join(lines)+"\n"
+
+    def run(self, shell:str="sh", check:bool=True) -> int:
+        """runs the whole plan with one shell process, the first failing step stops it."""
+        return self.run_cmd([shell, "-s"], check=check)
+
+    def run_ssh(self, host:str, ssh:str="ssh", ssh_mux:SshMux|None=None, shell:str="sh", check:bool=True) -> int:
+        """runs the whole plan on host over one ssh session, directories are paths on host."""
+        if ssh_mux is None:
+            cmd=[ssh]
+        else:
+            cmd=ssh_mux.get_ssh_cmd()
+        return self.run_cmd([*cmd, host, f"{shell} -s"], check=check)
+
+    def run_cmd(self, cmd:list, check:bool=True) -> int:
+        exit_code=subprocess.run(cmd, input=self.get_script().encode()).returncode
+        if exit_code != 0 and check is True:
+            raise GitCommandError(cmd, exit_code)
+        return exit_code
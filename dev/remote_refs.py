@@ -0,0 +1,66 @@
+#!/usr/bin/env python3
+import threading
+import time
+
+class RemoteRefs():
+    """snapshot of one 'git ls-remote <remote>' call as refname -> sha.
+    Pass it to GitLib.is_branch_on_remote or GitLib.get_remote_branches to check many branches with one round-trip.
+    """
+    def __init__(self, remote_name:str, location:str, refs:dict[str, str]):
+        self.remote_name=remote_name
+        self.location=location
+        self.refs=refs
+        self.timestamp=time.time()
+
+    def get_sha(self, refname:str) -> str|None:
+        """refname is a full ref name 'refs/heads/main' or a branch name 'main'."""
+        if refname in self.refs:
+            return self.refs[refname]
+        return self.refs.get(f"refs/heads/{refname}")
+
+    def has_ref(self, refname:str) -> bool:
+        return refname in self.refs
+
+    def has_branch(self, branch_name:str) -> bool:
+        return f"refs/heads/{branch_name}" in self.refs
+
+    def get_branches(self) -> list[str]:
+        return [refname[len("refs/heads/"):] for refname in self.refs if refname.startswith("refs/heads/")]
+
+    def get_tags(self) -> list[str]:
+        return [refname[len("refs/tags/"):] for refname in self.refs if refname.startswith("refs/tags/") and not refname.endswith("^{}")]
+
+    def get_heads_matching(self, pattern:str) -> list[str]:
+        """same tail match as 'git ls-remote --heads <remote> <pattern>'."""
+        return [refname for refname in self.refs if refname.startswith("refs/heads/") and refname.endswith(f"/{pattern}")]
+
+class LsRemoteCache():
+    """keeps 'git ls-remote' results per remote location for ttl seconds.
+    One instance can be shared by several GitLib instances.
+    """
+    def __init__(self, ttl:float=60):
+        self.ttl=ttl
+        self.entries:dict[str, tuple[float, RemoteRefs]]=dict()
+        self.lock=threading.Lock()
+
+    def get(self, location:str) -> RemoteRefs|None:
+        with self.lock:
+            entry=self.entries.get(location)
+            if entry is None:
+                return None
+            timestamp, remote_refs=entry
+            if time.monotonic()-timestamp > self.ttl:
+                del self.entries[location]
+                return None
+            return remote_refs
+
+    def set(self, remote_refs:RemoteRefs):
+        with self.lock:
+            self.entries[remote_refs.location]=(time.monotonic(), remote_refs)
+
+    def invalidate(self, location:str|None=None):
+        with self.lock:
+            if location is None:
+                self.entries.clear()
+            else:
+                self.entries.pop(location, None)
@@ -0,0 +1,204 @@
+#!/usr/bin/env python3
+import re
+import time
+from types import MappingProxyType
+from typing import Iterable
+
+# %(HEAD) is not last, a blank marker at the end of the output would be stripped
+REF_FORMAT="%(refname)%00%(HEAD)%00%(objectname)%00%(*objectname)%00%(symref)%00%(upstream)%00%(upstream:track,nobracket)"
+
+class RefEntry():
+    """one ref of a RepoSnapshot.
+    peeled is the commit of an annotated tag, symref the target of a symbolic ref like refs/remotes/origin/HEAD.
+    ahead and behind count commits against upstream, gone is True when upstream is configured but does not exist.
+    """
+    __slots__=("name", "sha", "peeled", "symref", "upstream", "ahead", "behind", "gone")
+
+    def __init__(self,
+        name:str,
+        sha:str|None,
+        peeled:str|None=None,
+        symref:str|None=None,
+        upstream:str|None=None,
+        ahead:int=0,
+        behind:int=0,
+        gone:bool=False,
+    ):
+        object.__setattr__(self, "name", name)
+        object.__setattr__(self, "sha", sha)
+        object.__setattr__(self, "peeled", peeled)
+        object.__setattr__(self, "symref", symref)
+        object.__setattr__(self, "upstream", upstream)
+        object.__setattr__(self, "ahead", ahead)
+        object.__setattr__(self, "behind", behind)
+        object.__setattr__(self, "gone", gone)
+
+    def __setattr__(self, name, value):
+        raise AttributeError(f"{type(self).__name__} is immutable")
+
+    def __repr__(self):
+        return f"RefEntry({self.name!r}, {self.sha!r}, upstream={self.upstream!r}, ahead={self.ahead}, behind={self.behind})"
+
+    def get_key(self) -> tuple:
+        return (self.name, self.sha, self.peeled, self.symref, self.upstream, self.ahead, self.behind, self.gone)
+
+    def __eq__(self, other):
+        return isinstance(other, RefEntry) and self.get_key() == other.get_key()
+
+    def __hash__(self):
+        return hash(self.get_key())
+
+    @property
+    def short_name(self) -> str:
+        for prefix in ["refs/heads/", "refs/remotes/", "refs/tags/"]:
+            if self.name.startswith(prefix):
+                return self.name[len(prefix):]
+        return self.name
+
+class RefChange():
+    """difference of one ref between two snapshots, previous is None for a created ref and current is None for a deleted ref."""
+    __slots__=("name", "previous", "current")
+
+    def __init__(self, name:str, previous:RefEntry|None, current:RefEntry|None):
+        self.name=name
+        self.previous=previous
+        self.current=current
+
+    def __repr__(self):
+        return f"RefChange({self.name!r}, {self.kind!r}, {None if self.previous is None else self.previous.sha!r} -> {None if self.current is None else self.current.sha!r})"
+
+    @property
+    def kind(self) -> str:
+        """'created', 'deleted', 'moved' when the ref points to another object, 'changed' when only symref or upstream tracking changed."""
+        if self.previous is None:
+            return "created"
+        elif self.current is None:
+            return "deleted"
+        elif self.previous.sha != self.current.sha:
+            return "moved"
+        else:
+            return "changed"
+
+class RepoSnapshot():
+    """immutable state of every ref, HEAD and remote urls taken at one point in time.
+    refs maps full ref names to RefEntry, HEAD is the 'HEAD' entry with symref set to the active branch unless HEAD is detached.
+        previous=gitlib.get_snapshot()
+        gitlib.fetch()
+        for change in gitlib.get_snapshot().diff(previous):
+            print(change.kind, change.name)
+    """
+    __slots__=("refs", "remotes", "timestamp")
+
+    def __init__(self, refs:Iterable[RefEntry], remotes:dict[str, str]|None=None, timestamp:float|None=None):
+        if remotes is None:
+            remotes=dict()
+        if timestamp is None:
+            timestamp=time.time()
+        object.__setattr__(self, "refs", MappingProxyType({ref.name: ref for ref in sorted(refs, key=lambda ref: ref.name)}))
+        object.__setattr__(self, "remotes", MappingProxyType(dict(remotes)))
+        object.__setattr__(self, "timestamp", timestamp)
+
+    def __setattr__(self, name, value):
+        raise AttributeError(f"{type(self).__name__} is immutable")
+
+    def __repr__(self):
+        return f"RepoSnapshot(refs={len(self.refs)}, head={self.head!r}, remotes={list(self.remotes)!r})"
+
+    def __eq__(self, other):
+        return isinstance(other, RepoSnapshot) and dict(self.refs) == dict(other.refs) and dict(self.remotes) == dict(other.remotes)
+
+    def __hash__(self):
+        return hash((tuple(self.refs.values()), tuple(self.remotes.items())))
+
+    @property
+    def head(self) -> str|None:
+        """full name of the active branch, None when HEAD is detached."""
+        ref=self.refs.get("HEAD")
+        if ref is None:
+            return None
+        return ref.symref
+
+    @property
+    def head_sha(self) -> str|None:
+        ref=self.refs.get("HEAD")
+        if ref is None:
+            return None
+        return ref.sha
+
+    @property
+    def active_branch_name(self) -> str|None:
+        if self.head is None or not self.head.startswith("refs/heads/"):
+            return None
+        return self.head[len("refs/heads/"):]
+
+    def get_refs(self, prefix:str) -> dict[str, RefEntry]:
+        return {ref.short_name: ref for name, ref in self.refs.items() if name.startswith(prefix)}
+
+    @property
+    def heads(self) -> dict[str, RefEntry]:
+        return self.get_refs("refs/heads/")
+
+    @property
+    def remote_branches(self) -> dict[str, RefEntry]:
+        """remote-tracking branches by 'remote/branch' name, symbolic refs like 'origin/HEAD' are left out."""
+        return {name: ref for name, ref in self.get_refs("refs/remotes/").items() if ref.symref is None}
+
+    @property
+    def tags(self) -> dict[str, RefEntry]:
+        return self.get_refs("refs/tags/")
+
+    def get_ref(self, name:str) -> RefEntry|None:
+        """name is a full ref name or a short branch, remote branch or tag name, resolved in that order."""
+        for prefix in ["", "refs/heads/", "refs/remotes/", "refs/tags/"]:
+            ref=self.refs.get(prefix+name)
+            if ref is not None:
+                return ref
+        return None
+
+    def diff(self, previous:"RepoSnapshot|None") -> list[RefChange]:
+        """refs created, deleted or changed since previous, sorted by ref name. Without previous every ref is created."""
+        if previous is None:
+            previous_refs={}
+        else:
+            previous_refs=previous.refs
+        changes=[]
+        for name in sorted(set(previous_refs) | set(self.refs)):
+            previous_ref=previous_refs.get(name)
+            current_ref=self.refs.get(name)
+            if previous_ref != current_ref:
+                changes.append(RefChange(name, previous_ref, current_ref))
+        return changes
+
+def parse_track(track:str) -> tuple[int, int, bool]:
+    """returns ahead, behind and gone from %(upstream:track,nobracket) like 'ahead 1, behind 2' or 'gone'."""
+    if track == "gone":
+        return 0, 0, True
+    ahead=re.search(r"ahead (\d+)", track)
+    behind=re.search(r"behind (\d+)", track)
+    return (
+        0 if ahead is None else int(ahead.group(1)),
+        0 if behind is None else int(behind.group(1)),
+        False,
+    )
+
+def parse_refs(output:str|None) -> tuple[list[RefEntry], str|None]:
+    """parses 'git for-each-ref --format=REF_FORMAT' output, returns refs and the full name of the branch marked as HEAD."""
+    refs=[]
+    head=None
+    if output is not None:
+        for line in output.splitlines():
+            name, is_head, sha, peeled, symref, upstream, track=line.split("\0")
+            ahead, behind, gone=parse_track(track)
+            refs.append(RefEntry(
+                name=name,
+                sha=sha or None,
+                peeled=peeled or None,
+                symref=symref or None,
+                upstream=upstream or None,
+                ahead=ahead,
+                behind=behind,
+                gone=gone,
+            ))
+            if is_head == "*":
+                head=name
+    return refs, head
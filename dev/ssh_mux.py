@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+import os
+import shlex
+import shutil
+import subprocess
+import tempfile
+import threading
+
+class SshMux():
+    """shares one authenticated ssh connection per host between git commands with OpenSSH ControlMaster.
+    Control sockets live in a private directory created by start() and removed by stop(), which also closes the masters.
+        with SshMux() as ssh_mux:
+            gitlib=GitLib(direpa, ssh_mux=ssh_mux)
+            gitlib.fetch()
+            gitlib.push()
+    GitLib passes the ssh command with 'git -c core.sshCommand=...', a GIT_SSH_COMMAND environment variable takes precedence over it.
+    ssh can be set to another binary or wrapper script accepting OpenSSH options.
+    """
+    def __init__(self, ssh:str="ssh", persist:int=60, options:list|None=None):
+        self.ssh=ssh
+        self.persist=persist
+        if options is None:
+            options=[]
+        self.options=options
+        self.direpa_control:str|None=None
+        self.lock=threading.Lock()
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
+
+    def start(self) -> str:
+        with self.lock:
+            if self.direpa_control is None:
+                # mkdtemp directory is only accessible by its owner
+                self.direpa_control=tempfile.mkdtemp(prefix="gitlib_ssh_")
+            return self.direpa_control
+
+    def get_ssh_cmd(self) -> list:
+        direpa_control=self.start()
+        return [
+            self.ssh,
+            "-o", "ControlMaster=auto",
+            # %C is a hash of local host, remote host, port and user, it keeps the socket path short
+            "-o", f"ControlPath={os.path.join(direpa_control, '%C')}",
+            "-o", f"ControlPersist={self.persist}",
+            *self.options,
+        ]
+
+    def get_git_args(self) -> list:
+        return ["-c", f"core.sshCommand={shlex.join(self.get_ssh_cmd())}"]
+
+    def get_sockets(self) -> list[str]:
+        if self.direpa_control is None or not os.path.isdir(self.direpa_control):
+            return []
+        return sorted(os.path.join(self.direpa_control, filen) for filen in os.listdir(self.direpa_control))
+
+    def stop(self):
+        with self.lock:
+            if self.direpa_control is None:
+                return
+            for filenpa_socket in self.get_sockets():
+                # the socket path is given literally, the host argument is required but not used
+                subprocess.run(
+                    [self.ssh, "-o", f"ControlPath={filenpa_socket}", "-O", "exit", "gitlib-mux"],
+                    stdout=subprocess.DEVNULL,
+                    stderr=subprocess.DEVNULL,
+                )
+            shutil.rmtree(self.direpa_control, ignore_errors=True)
+            self.direpa_control=None
@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+from collections import deque
+import threading
+
+class GitCall():
+    """one git invocation recorded by GitLib.
+    kind is 'spawn' for a new process and 'pipe' for a lookup through a long-lived cat-file process.
+    exit_code is None when the shell helper that ran the command does not report it.
+    """
+    def __init__(self,
+        cmd:list,
+        direpa:str,
+        direpa_cwd:str,
+        elapsed:float,
+        exit_code:int|None=None,
+        output_size:int|None=None,
+        kind:str="spawn",
+    ):
+        self.cmd=cmd
+        self.direpa=direpa
+        self.direpa_cwd=direpa_cwd
+        self.elapsed=elapsed
+        self.exit_code=exit_code
+        self.output_size=output_size
+        self.kind=kind
+
+    @property
+    def subcommand(self) -> str:
+        if len(self.cmd) == 0:
+            return ""
+        if self.cmd[0] != "git":
+            return self.cmd[0]
+        index=1
+        while index < len(self.cmd):
+            arg=self.cmd[index]
+            if arg in ["-C", "-c"]:
+                index+=2
+            elif arg.startswith("-"):
+                index+=1
+            else:
+                return arg
+        return "git"
+
+class GitStats():
+    """GitLib on_cmd callback that keeps counters per git subcommand and the last max_calls calls.
+    GitLib(on_cmd=GitStats())
+    """
+    def __init__(self, max_calls:int=1000):
+        self.calls:deque[GitCall]=deque(maxlen=max_calls)
+        self.counters:dict[str, dict]=dict()
+        self.lock=threading.Lock()
+
+    def __call__(self, call:GitCall):
+        self.record(call)
+
+    def record(self, call:GitCall):
+        with self.lock:
+            self.calls.append(call)
+            counter=self.counters.get(call.subcommand)
+            if counter is None:
+                counter=dict(
+                    count=0,
+                    spawns=0,
+                    errors=0,
+                    elapsed=0.0,
+                    output_size=0,
+                )
+                self.counters[call.subcommand]=counter
+            counter["count"]+=1
+            if call.kind == "spawn":
+                counter["spawns"]+=1
+            if call.exit_code is not None and call.exit_code != 0:
+                counter["errors"]+=1
+            counter["elapsed"]+=call.elapsed
+            if call.output_size is not None:
+                counter["output_size"]+=call.output_size
+
+    def get_spawns(self) -> int:
+        with self.lock:
+            return sum(counter["spawns"] for counter in self.counters.values())
+
+    def get_elapsed(self) -> float:
+        with self.lock:
+            return sum(counter["elapsed"] for counter in self.counters.values())
+
+    def get_summary(self) -> dict:
+        with self.lock:
+            return {subcommand: dict(counter) for subcommand, counter in sorted(self.counters.items())}
+
+    def reset(self):
+        with self.lock:
+            self.calls.clear()
+            self.counters.clear()
@@ -0,0 +1,143 @@
+#!/usr/bin/env python3
+import os
+from typing import IO, Iterator
+
+class StatusEntry():
+    """one entry of 'git status --porcelain=v2 -z'.
+    kind is '1' changed, '2' renamed or copied, 'u' unmerged, '?' untracked and '!' ignored.
+    index_state and worktree_state use porcelain v1 letters, ' ' when unmodified.
+    submodule is the v2 submodule field, 'N...' when the path is not a submodule.
+    """
+    __slots__=("kind", "path", "index_state", "worktree_state", "orig_path", "submodule")
+
+    def __init__(self,
+        kind:str,
+        path:str,
+        index_state:str="?",
+        worktree_state:str="?",
+        orig_path:str|None=None,
+        submodule:str="N...",
+    ):
+        self.kind=kind
+        self.path=path
+        self.index_state=index_state
+        self.worktree_state=worktree_state
+        self.orig_path=orig_path
+        self.submodule=submodule
+
+    def __repr__(self):
+        return f"StatusEntry({self.kind!r}, {self.path!r}, {self.index_state!r}, {self.worktree_state!r}, orig_path={self.orig_path!r})"
+
+    @property
+    def is_untracked(self) -> bool:
+        return self.kind == "?"
+
+    @property
+    def is_submodule_content_only(self) -> bool:
+        """submodule with modified or untracked content but same commit, 'git add' does not stage it."""
+        return (
+            self.kind == "1"
+            and self.submodule.startswith("S")
+            and self.submodule[1] != "C"
+            and self.index_state == " "
+        )
+
+    def to_porcelain_v1(self) -> str:
+        if self.kind in ["?", "!"]:
+            return f"{self.kind}{self.kind} {quote_path(self.path)}"
+        line=f"{self.index_state}{self.worktree_state} "
+        if self.orig_path is not None:
+            line+=f"{quote_path(self.orig_path)} -> "
+        return line+quote_path(self.path)
+
+def quote_path(path:str) -> str:
+    """same quoting as 'git status --porcelain' with core.quotePath=true."""
+    escapes={7: "a", 8: "b", 9: "t", 10: "n", 11: "v", 12: "f", 13: "r", 34: '"', 92: "\\"}
+    raw=os.fsencode(path)
+    if not any(byte < 0x21 or byte >= 0x7f or byte in escapes for byte in raw):
+        return path
+    quoted=""
+    for byte in raw:
+        if byte in escapes:
+            quoted+="\\"+escapes[byte]
+        elif byte < 0x20 or byte >= 0x7f:
+            quoted+=f"\\{byte:03o}"
+        else:
+            quoted+=chr(byte)
+    return f'"{quoted}"'
+
+def get_state(state:str) -> str:
+    if state == ".":
+        return " "
+    return state
+
+def iter_records(stream:IO[bytes], chunk_size:int=65536) -> Iterator[bytes]:
+    """yields NUL terminated records without reading the whole stream."""
+    buffer=b""
+    while True:
+        chunk=stream.read1(chunk_size) if hasattr(stream, "read1") else stream.read(chunk_size)
+        if not chunk:
+            break
+        buffer+=chunk
+        records=buffer.split(b"\0")
+        buffer=records.pop()
+        yield from records
+    if buffer:
+        yield buffer
+
+def parse_status(records:Iterator[bytes]) -> Iterator[StatusEntry]:
+    """parses records of 'git status --porcelain=v2 -z' lazily, header lines '# ...' are skipped.
+    records is closed when parsing stops early.
+    """
+    try:
+        yield from parse_records(records)
+    finally:
+        close=getattr(records, "close", None)
+        if close is not None:
+            close()
+
+def parse_records(records:Iterator[bytes]) -> Iterator[StatusEntry]:
+    for record in records:
+        if not record:
+            continue
+        kind=chr(record[0])
+        if kind == "#":
+            continue
+        elif kind in ["?", "!"]:
+            yield StatusEntry(kind=kind, path=os.fsdecode(record[2:]))
+        elif kind == "1":
+            # 1 XY sub mH mI mW hH hI path
+            fields=record.split(b" ", 8)
+            xy=fields[1].decode()
+            yield StatusEntry(
+                kind=kind,
+                path=os.fsdecode(fields[8]),
+                index_state=get_state(xy[0]),
+                worktree_state=get_state(xy[1]),
+                submodule=fields[2].decode(),
+            )
+        elif kind == "2":
+            # 2 XY sub mH mI mW hH hI Xscore path NUL origPath
+            fields=record.split(b" ", 9)
+            xy=fields[1].decode()
+            yield StatusEntry(
+                kind=kind,
+                path=os.fsdecode(fields[9]),
+                index_state=get_state(xy[0]),
+                worktree_state=get_state(xy[1]),
+                orig_path=os.fsdecode(next(records, b"")),
+                submodule=fields[2].decode(),
+            )
+        elif kind == "u":
+            # u XY sub m1 m2 m3 mW h1 h2 h3 path
+            fields=record.split(b" ", 10)
+            xy=fields[1].decode()
+            yield StatusEntry(
+                kind=kind,
+                path=os.fsdecode(fields[10]),
+                index_state=xy[0],
+                worktree_state=xy[1],
+                submodule=fields[2].decode(),
+            )
+        else:
+            raise ValueError(f"unknown git status record {record!r}")
@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+import os
+import threading
+import time
+
+from .gitdir import get_signature
+
+class StatusCache():
+    """keeps GitLib results until the stat signature (mtime, size, inode) of the repository changes.
+    By default the signature only covers HEAD, index, packed-refs, info/exclude and the refs directory, so a cached
+    working tree result (need_commit, get_untracked_files) is not refreshed by an edit made outside of git:
+    call invalidate() after such edits, or use it where the working tree only changes through git commands.
+    worktree=True also stats every directory and file of the working tree, ignored trees like node_modules or build
+    output included. Results then follow any edit, but on a large working tree that walk can cost more than the
+    'git status' it saves.
+    One instance can be shared by several GitLib instances.
+    """
+    def __init__(self, worktree:bool=False, racy_window:float=1.0):
+        self.worktree=worktree
+        # results computed while files are modified within the same timestamp tick can't be trusted
+        self.racy_window_ns=int(racy_window*1e9)
+        self.entries:dict[tuple[str, str], tuple[int, object]]=dict()
+        self.lock=threading.Lock()
+
+    def get_direpa_git(self, direpa_root:str, is_bare_repository:bool) -> str|None:
+        """returns None for .git files (worktrees and submodules), their refs live in another directory."""
+        if is_bare_repository is True:
+            direpa_git=direpa_root
+        else:
+            direpa_git=os.path.join(direpa_root, ".git")
+        if os.path.isfile(os.path.join(direpa_git, "HEAD")):
+            return direpa_git
+        return None
+
+    def get_signature(self, direpa_root:str, is_bare_repository:bool, worktree:bool) -> tuple[int, int]|None:
+        """returns a hash of the stat signatures and the newest mtime seen, None when the repository layout is not supported."""
+        direpa_git=self.get_direpa_git(direpa_root, is_bare_repository)
+        if direpa_git is None:
+            return None
+
+        signatures=[]
+        for filen in ["HEAD", "index", "packed-refs", os.path.join("info", "exclude")]:
+            signatures.append(get_signature(os.path.join(direpa_git, filen)))
+        signatures.extend(get_tree_signatures(os.path.join(direpa_git, "refs")))
+        if worktree is True and self.worktree is True and is_bare_repository is False:
+            signatures.extend(get_tree_signatures(direpa_root, exclude=".git"))
+
+        newest=max((signature[0] for signature in signatures if signature is not None), default=0)
+        return hash(tuple(signatures)), newest
+
+    def get(self, direpa_root:str, key:str, signature:int) -> tuple[bool, object]:
+        with self.lock:
+            entry=self.entries.get((direpa_root, key))
+            if entry is None or entry[0] != signature:
+                return False, None
+            return True, entry[1]
+
+    def set(self, direpa_root:str, key:str, signature:int, newest:int, value):
+        if newest >= time.time_ns()-self.racy_window_ns:
+            return
+        with self.lock:
+            self.entries[(direpa_root, key)]=(signature, value)
+
+    def invalidate(self, direpa_root:str|None=None):
+        with self.lock:
+            if direpa_root is None:
+                self.entries.clear()
+            else:
+                for key in [key for key in self.entries if key[0] == direpa_root]:
+                    del self.entries[key]
+
+def get_tree_signatures(direpa:str, exclude:str|None=None) -> list:
+    """stat of every directory and file under direpa, directories are listed so added and deleted entries are seen."""
+    signatures=[]
+    direpas=[direpa]
+    while len(direpas) > 0:
+        direpa_current=direpas.pop()
+        try:
+            stat=os.stat(direpa_current)
+            signatures.append((stat.st_mtime_ns, stat.st_size, stat.st_ino, direpa_current))
+            with os.scandir(direpa_current) as entries:
+                for entry in entries:
+                    if entry.name == exclude:
+                        continue
+                    if entry.is_dir(follow_symlinks=False):
+                        direpas.append(entry.path)
+                    else:
+                        stat=entry.stat(follow_symlinks=False)
+                        signatures.append((stat.st_mtime_ns, stat.st_size, stat.st_ino, entry.path))
+        except (FileNotFoundError, NotADirectoryError, PermissionError):
+            signatures.append(None)
+    return signatures
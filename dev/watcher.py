@@ -0,0 +1,358 @@
+#!/usr/bin/env python3
+import ctypes
+import ctypes.util
+import os
+import select
+import struct
+import sys
+import threading
+import time
+from enum import Enum
+from typing import Callable
+
+from .errors import GitLibError
+from .gitlib import GitLib, SwitchDir
+from .status_cache import get_tree_signatures
+
+class RepoEventKind(str, Enum):
+    BRANCH_SWITCHED="branch_switched"
+    NEW_COMMIT="new_commit"
+    DIRTY="dirty"
+    CLEAN="clean"
+    REMOTE_REFS="remote_refs"
+    ERROR="error"
+
+class RepoEvent():
+    """value and previous are branch names for BRANCH_SWITCHED, commit shas for NEW_COMMIT,
+    and for REMOTE_REFS value is refname -> sha of the new or updated remote refs.
+    for ERROR value is the GitLibError or OSError raised while querying the repository.
+    """
+    def __init__(self, kind:RepoEventKind, direpa:str, value=None, previous=None):
+        self.kind=kind
+        self.direpa=direpa
+        self.value=value
+        self.previous=previous
+        self.timestamp=time.time()
+
+    def __repr__(self):
+        return f"RepoEvent({self.kind.value!r}, {self.direpa!r}, {self.value!r}, previous={self.previous!r})"
+
+class RepoState():
+    def __init__(self, gitlib:GitLib, direpa_git:str):
+        self.gitlib=gitlib
+        self.direpa_git=direpa_git
+        self.branch_name:str|None=None
+        self.head:str|None=None
+        self.dirty:bool|None=None
+        self.remote_refs:dict[str, str]=dict()
+
+# 'head' is .git/HEAD, 'index' is .git/index, 'refs' is .git/refs and packed-refs, 'worktree' is the working tree
+CATEGORIES=["head", "index", "refs", "worktree"]
+GIT_FILES={"HEAD": "head", "index": "index", "packed-refs": "refs"}
+
+class InotifyWatcher():
+    """one inotify file descriptor for all repositories, directories are watched recursively as they are created."""
+    IN_MODIFY=0x2
+    IN_ATTRIB=0x4
+    IN_CLOSE_WRITE=0x8
+    IN_MOVED_FROM=0x40
+    IN_MOVED_TO=0x80
+    IN_CREATE=0x100
+    IN_DELETE=0x200
+    IN_Q_OVERFLOW=0x4000
+    IN_IGNORED=0x8000
+    IN_ISDIR=0x40000000
+    MASK=IN_MODIFY | IN_ATTRIB | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE
+
+    def __init__(self):
+        self.libc=ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        self.fd=self.libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self.fd < 0:
+            errno=ctypes.get_errno()
+            raise OSError(errno, os.strerror(errno))
+        # wd -> (repository index, category, directory)
+        self.watches:dict[int, tuple[int, str, str]]=dict()
+
+    @staticmethod
+    def is_available() -> bool:
+        if not sys.platform.startswith("linux"):
+            return False
+        try:
+            libc=ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6")
+            return hasattr(libc, "inotify_init1")
+        except OSError:
+            return False
+
+    def add_watch(self, index:int, category:str, direpa:str):
+        wd=self.libc.inotify_add_watch(self.fd, os.fsencode(direpa), self.MASK)
+        if wd < 0:
+            errno=ctypes.get_errno()
+            # directory removed before it could be watched
+            if errno == 2:
+                return
+            raise OSError(errno, f"inotify_add_watch '{direpa}': {os.strerror(errno)}")
+        self.watches[wd]=(index, category, direpa)
+
+    def add_tree(self, index:int, category:str, direpa:str, exclude:str|None=None):
+        direpas=[direpa]
+        while len(direpas) > 0:
+            direpa_current=direpas.pop()
+            self.add_watch(index, category, direpa_current)
+            try:
+                with os.scandir(direpa_current) as entries:
+                    for entry in entries:
+                        if entry.name != exclude and entry.is_dir(follow_symlinks=False):
+                            direpas.append(entry.path)
+            except (FileNotFoundError, NotADirectoryError, PermissionError):
+                pass
+
+    def read(self, timeout:float|None) -> set[tuple[int, str]]|None:
+        """returns changed (repository index, category), None when the kernel queue overflowed and everything must be checked."""
+        readable, _, _=select.select([self.fd], [], [], timeout)
+        changes:set[tuple[int, str]]=set()
+        if len(readable) == 0:
+            return changes
+        try:
+            data=os.read(self.fd, 65536)
+        except BlockingIOError:
+            return changes
+        offset=0
+        while offset < len(data):
+            wd, mask, _, length=struct.unpack_from("iIII", data, offset)
+            name=os.fsdecode(data[offset+16:offset+16+length].rstrip(b"\0"))
+            offset+=16+length
+            if mask & self.IN_Q_OVERFLOW:
+                return None
+            if mask & self.IN_IGNORED:
+                self.watches.pop(wd, None)
+                continue
+            watch=self.watches.get(wd)
+            if watch is None:
+                continue
+            index, category, direpa=watch
+            if category == "git":
+                # only HEAD, index and packed-refs matter in the .git directory, lock files are renamed to them
+                if name in GIT_FILES:
+                    changes.add((index, GIT_FILES[name]))
+                continue
+            if mask & self.IN_ISDIR and mask & (self.IN_CREATE | self.IN_MOVED_TO):
+                self.add_tree(index, category, os.path.join(direpa, name), exclude=".git")
+            changes.add((index, category))
+        return changes
+
+    def close(self):
+        os.close(self.fd)
+
+class PollingWatcher():
+    """stat polling fallback with the same interface as InotifyWatcher."""
+    def __init__(self, interval:float=1.0):
+        self.interval=interval
+        # (repository index, category) -> (direpa, is tree, exclude)
+        self.paths:dict[tuple[int, str], list[tuple[str, bool, str|None]]]=dict()
+        self.signatures:dict[tuple[int, str], int]=dict()
+
+    def add_path(self, index:int, category:str, path:str, is_tree:bool, exclude:str|None=None):
+        self.paths.setdefault((index, category), []).append((path, is_tree, exclude))
+        self.signatures[(index, category)]=self.get_signature(index, category)
+
+    def get_signature(self, index:int, category:str) -> int:
+        signatures=[]
+        for path, is_tree, exclude in self.paths[(index, category)]:
+            if is_tree is True:
+                signatures.extend(get_tree_signatures(path, exclude=exclude))
+            else:
+                try:
+                    stat=os.stat(path)
+                    signatures.append((stat.st_mtime_ns, stat.st_size, stat.st_ino))
+                except FileNotFoundError:
+                    signatures.append(None)
+        return hash(tuple(signatures))
+
+    def read(self, timeout:float|None) -> set[tuple[int, str]]|None:
+        if timeout is None:
+            timeout=self.interval
+        time.sleep(min(timeout, self.interval))
+        changes:set[tuple[int, str]]=set()
+        for key in self.paths:
+            signature=self.get_signature(*key)
+            if signature != self.signatures[key]:
+                self.signatures[key]=signature
+                changes.add(key)
+        return changes
+
+    def close(self):
+        pass
+
+class RepoWatcher():
+    """watches repositories and calls callback with a RepoEvent on branch switch, new commit, dirty/clean transition
+    and new remote refs after a fetch. Git is only queried for repositories where files changed.
+    Bursts of changes are collected until the repositories are quiet for debounce seconds, at most max_delay seconds.
+    Linux inotify is used when available, stat polling every poll_interval seconds otherwise.
+    """
+    def __init__(self,
+        direpas:list[str],
+        debounce:float=0.2,
+        max_delay:float=2.0,
+        poll_interval:float=1.0,
+        inotify:bool|None=None,
+        **gitlib_options,
+    ):
+        self.debounce=debounce
+        self.max_delay=max_delay
+        if inotify is None:
+            inotify=InotifyWatcher.is_available()
+        self.watcher:InotifyWatcher|PollingWatcher
+        if inotify is True:
+            self.watcher=InotifyWatcher()
+        else:
+            self.watcher=PollingWatcher(interval=poll_interval)
+        gitlib_options.setdefault("quiet", True)
+        self.states:list[RepoState]=[]
+        for direpa in direpas:
+            self.add_repository(direpa, **gitlib_options)
+        self.stop_event=threading.Event()
+        self.thread:threading.Thread|None=None
+
+    def add_repository(self, direpa:str, **gitlib_options):
+        # status runs while the user works in the repository, it must not hold index.lock
+        # service mode so a failing query raises instead of exiting the watcher thread
+        gitlib_options["service"]=True
+        gitlib=GitLib(direpa=direpa, chdir=False, optional_locks=False, **gitlib_options)
+        if gitlib.exists is False:
+            raise FileNotFoundError(f"Not a git repository '{direpa}'")
+        if gitlib.is_bare_repository is True:
+            direpa_git=gitlib.direpa_root
+        else:
+            direpa_git=os.path.join(gitlib.direpa_root, ".git")
+        if not os.path.isdir(direpa_git):
+            raise NotImplementedError(f"Repository with a .git file can't be watched '{direpa}'")
+
+        index=len(self.states)
+        state=RepoState(gitlib, direpa_git)
+        self.states.append(state)
+        if isinstance(self.watcher, InotifyWatcher):
+            self.watcher.add_watch(index, "git", direpa_git)
+            self.watcher.add_tree(index, "refs", os.path.join(direpa_git, "refs"))
+            if gitlib.is_bare_repository is False:
+                self.watcher.add_tree(index, "worktree", gitlib.direpa_root, exclude=".git")
+        else:
+            self.watcher.add_path(index, "head", os.path.join(direpa_git, "HEAD"), is_tree=False)
+            self.watcher.add_path(index, "index", os.path.join(direpa_git, "index"), is_tree=False)
+            self.watcher.add_path(index, "refs", os.path.join(direpa_git, "refs"), is_tree=True)
+            self.watcher.add_path(index, "refs", os.path.join(direpa_git, "packed-refs"), is_tree=False)
+            if gitlib.is_bare_repository is False:
+                self.watcher.add_path(index, "worktree", gitlib.direpa_root, is_tree=True, exclude=".git")
+        # initial state, no events
+        self.update_state(state, set(CATEGORIES))
+
+    def get_head(self, gitlib:GitLib) -> tuple[str|None, str|None]:
+        with SwitchDir(gitlib):
+            # one process so a checkout running meanwhile can't mix the branch of one HEAD with the commit of another
+            output=gitlib.cmd_get_value(["git", "rev-parse", "HEAD", "--symbolic-full-name", "HEAD"], none_on_error=True)
+            if output is None:
+                # branch without commits
+                branch_name=gitlib.cmd_get_value(["git", "symbolic-ref", "--quiet", "--short", "HEAD"], none_on_error=True)
+                return branch_name, None
+        head, refname=(output.splitlines()+[""])[:2]
+        if refname.startswith("refs/heads/"):
+            return refname[len("refs/heads/"):], head
+        # detached HEAD
+        return None, head
+
+    def get_remote_refs(self, gitlib:GitLib) -> dict[str, str]:
+        with SwitchDir(gitlib):
+            output=gitlib.cmd_get_value(["git", "for-each-ref", "--format=%(objectname) %(refname)", "refs/remotes/"], none_on_error=True)
+        refs=dict()
+        if output is not None:
+            for line in output.splitlines():
+                sha, refname=line.split(" ", 1)
+                refs[refname]=sha
+        return refs
+
+    def update_state(self, state:RepoState, categories:set[str]) -> list[RepoEvent]:
+        events=[]
+        direpa=state.gitlib.direpa_root
+        if categories & {"head", "refs"}:
+            branch_name, head=self.get_head(state.gitlib)
+            if branch_name != state.branch_name:
+                events.append(RepoEvent(RepoEventKind.BRANCH_SWITCHED, direpa, value=branch_name, previous=state.branch_name))
+            elif head != state.head and head is not None:
+                events.append(RepoEvent(RepoEventKind.NEW_COMMIT, direpa, value=head, previous=state.head))
+            state.branch_name=branch_name
+            state.head=head
+
+        if "refs" in categories:
+            remote_refs=self.get_remote_refs(state.gitlib)
+            updated={refname: sha for refname, sha in remote_refs.items() if state.remote_refs.get(refname) != sha}
+            if len(updated) > 0:
+                events.append(RepoEvent(RepoEventKind.REMOTE_REFS, direpa, value=updated))
+            state.remote_refs=remote_refs
+
+        if categories & {"head", "index", "worktree"} and state.gitlib.is_bare_repository is False:
+            dirty=state.gitlib.need_commit()
+            if dirty != state.dirty:
+                events.append(RepoEvent(RepoEventKind.DIRTY if dirty is True else RepoEventKind.CLEAN, direpa))
+            state.dirty=dirty
+        return events
+
+    def wait_changes(self) -> dict[int, set[str]]:
+        """blocks until something changed, then collects changes until quiet for debounce seconds."""
+        changes:dict[int, set[str]]=dict()
+        start=None
+        while not self.stop_event.is_set():
+            timeout=None
+            if start is not None:
+                timeout=max(0, min(self.debounce, start+self.max_delay-time.monotonic()))
+            elif isinstance(self.watcher, InotifyWatcher):
+                # wake up regularly to check stop_event
+                timeout=0.5
+            read=self.watcher.read(timeout)
+            if read is None:
+                for index in range(len(self.states)):
+                    changes[index]=set(CATEGORIES)
+                read=set()
+            for index, category in read:
+                changes.setdefault(index, set()).add(category)
+            if start is None:
+                if len(changes) > 0:
+                    start=time.monotonic()
+            elif len(read) == 0 or time.monotonic()-start >= self.max_delay:
+                break
+        return changes
+
+    def poll(self) -> list[RepoEvent]:
+        """waits for the next burst of changes and returns its events, empty after stop()."""
+        events=[]
+        for index, categories in self.wait_changes().items():
+            try:
+                events.extend(self.update_state(self.states[index], categories))
+            except (GitLibError, OSError) as e:
+                # repository deleted or locked while querying, it is checked again on next change
+                events.append(RepoEvent(RepoEventKind.ERROR, self.states[index].gitlib.direpa_root, value=e))
+        return events
+
+    def run(self, callback:Callable[[RepoEvent], None]):
+        while not self.stop_event.is_set():
+            for event in self.poll():
+                callback(event)
+
+    def start(self, callback:Callable[[RepoEvent], None]):
+        self.stop_event.clear()
+        self.thread=threading.Thread(target=self.run, args=(callback,), daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.stop_event.set()
+        if self.thread is not None:
+            self.thread.join()
+            self.thread=None
+
+    def close(self):
+        self.stop()
+        self.watcher.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
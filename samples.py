@@ -6,6 +6,7 @@ if __name__ == "__main__":
     import os
     import sys
     import tempfile
+    import time
     direpa_script_parent=os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
     module_name=os.path.basename(os.path.dirname(os.path.realpath(__file__)))
     sys.path.insert(0, direpa_script_parent)
@@ -97,3 +98,157 @@ if __name__ == "__main__":
     git.set_upstream(remote_name="origin", branch_name="work", filenpa_config=None, show_only=True)
     git.rename_branch(new_branch_name="new_dev", show_only=True)
 
+
+    git.start_batch()
+    print(git.has_head(show_cmds=True))
+    print(git.get_branch_compare_status(active_branch="dev", compare_branch="work", show_cmds=True))
+    print(git.is_branch_on_local(branch_name="dev", show_cmds=True))
+    print(git.is_branch_on_local_remote(remote_name="origin", branch_name="nothing", show_cmds=True))
+    print(git.get_object("HEAD", show_cmds=True).type)
+    git.stop_batch()
+
+    git_native=pkg.GitLib(direpa=direpa_src, native=True)
+    print(git_native.get_active_branch_name(show_cmds=True))
+    print(git_native.has_head(show_cmds=True))
+    print(git_native.get_local_branches(show_cmds=True))
+    print(git_native.get_local_remote_branches(show_cmds=True))
+    print(git_native.is_branch_on_local(branch_name="dev", show_cmds=True))
+    print(git_native.is_branch_on_local_remote(remote_name="origin", branch_name="dev", show_cmds=True))
+    print(git_native.get_remote_names(show_cmds=True))
+    print(git_native.get_remote_location(name="origin", show_cmds=True))
+    print(git_native.get_user_name(show_cmds=True))
+    print(git_native.get_user_email(show_cmds=True))
+
+    git_lazy=pkg.GitLib(direpa=direpa_src)
+    print(git_lazy.exists, git_lazy.is_bare_repository, git_lazy.direpa_root)
+    print([remote.name for remote in git_lazy.remotes])
+    git_lazy.refresh()
+
+    from concurrent.futures import ThreadPoolExecutor
+    gits=[pkg.GitLib(direpa=direpa, chdir=False) for direpa in [direpa_src, direpa_repository_git]]
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        print(list(executor.map(lambda g: g.get_local_branches(), gits)))
+    gits[0].checkout(branch_name="work", show_only=True)
+
+    import asyncio
+    async def async_samples():
+        agits=[pkg.AsyncGitLib(direpa=direpa) for direpa in [direpa_src, direpa_src]]
+        print(await asyncio.gather(*[agit.get_local_branches() for agit in agits]))
+        print(await agits[0].get_branch_compare_status(active_branch="dev", compare_branch="work", show_cmds=True))
+        print(await agits[0].get_remote_branches(remote_name="origin", show_cmds=True))
+        print(await agits[0].need_commit(show_cmds=True))
+        await agits[0].fetch(remote="origin", quiet=True, show_only=True)
+        await agits[0].push(remote_name="origin", set_upstream=True, quiet=True, show_only=True)
+    asyncio.run(async_samples())
+
+    fleet=pkg.GitFleet(direpas=[direpa_src, direpa_repository_git], workers=2, timeout=30)
+    for result in fleet.run("get_local_branches"):
+        print(result.direpa, result.value, result.error, result.timed_out)
+    for result in fleet.run(lambda g: g.get_branch_compare_status(active_branch="dev", compare_branch="work")):
+        print(result.direpa, result.value)
+
+    for branch_compare in git.get_branches_compare_status(show_cmds=True).values():
+        print(branch_compare.branch_name, branch_compare.compare_branch, branch_compare.status, branch_compare.ahead, branch_compare.behind)
+    for branch_compare in git.get_branches_compare_status(compare_branch="main", show_cmds=True).values():
+        print(branch_compare.branch_name, branch_compare.compare_branch, branch_compare.status, branch_compare.ahead, branch_compare.behind)
+
+    ls_remote_cache=pkg.LsRemoteCache(ttl=30)
+    git_cached=pkg.GitLib(direpa=direpa_src, ls_remote_cache=ls_remote_cache)
+    print(git_cached.get_all_branches(show_cmds=True))
+    print(git_cached.get_remote_branches(remote_name="origin", show_cmds=True))
+    print(git_cached.is_branch_on_remote(remote_name="origin", branch_name="dev", show_cmds=True))
+    print(git_cached.is_branch_on_remote(remote_name="origin", branch_name="nothing", show_cmds=True))
+    git_cached.delete_branch_remote(remote_name="origin", branch_name="nothing", show_only=True)
+
+    remote_refs=git.get_remote_refs(remote_name="origin", show_cmds=True)
+    print(remote_refs.get_branches(), remote_refs.get_sha("dev"), remote_refs.has_branch("work"))
+    print([git.is_branch_on_remote(remote_name="origin", branch_name=name, remote_refs=remote_refs) for name in ["dev", "work", "nothing"]])
+    print(git.get_remote_branches(remote_refs=remote_refs))
+    git.delete_branch_remote(branch_name="work", remote_name="origin", remote_refs=remote_refs, show_only=True)
+
+    git_stats=pkg.GitStats()
+    git_instrumented=pkg.GitLib(direpa=direpa_src, on_cmd=git_stats)
+    git_instrumented.get_all_branches()
+    git_instrumented.need_commit()
+    git_instrumented.fetch(remote="origin", quiet=True)
+    print(git_stats.get_spawns(), [(call.subcommand, call.exit_code, call.output_size) for call in git_stats.calls])
+    pprint(git_stats.get_summary().keys())
+
+    print(git.get_root_commits(show_cmds=True))
+    for entry in git.iter_status(show_cmds=True):
+        print(entry.kind, entry.index_state, entry.worktree_state, entry.path, entry.orig_path)
+    print([entry.to_porcelain_v1() for entry in git.get_status()])
+
+    git_status_cached=pkg.GitLib(direpa=direpa_src, status_cache=pkg.StatusCache())
+    for _ in range(2):
+        print(git_status_cached.need_commit(show_cmds=True), git_status_cached.get_active_branch_name(show_cmds=True))
+
+    with pkg.RepoWatcher([direpa_src], debounce=0.2) as watcher:
+        watcher.start(lambda event: print(event.kind, event.direpa, event.value, event.previous))
+        git.checkout("work")
+        git.checkout("dev")
+        time.sleep(1)
+
+    batch=git.get_push_batch()
+    batch.add_branch("dev", remote_names=["origin"])
+    batch.add_branch("work", remote_names=["origin"], set_upstream=True)
+    batch.delete_branch("nothing", remote_names=["origin"])
+    batch.push(show_only=True)
+
+    with pkg.SshMux(persist=30) as ssh_mux:
+        git_mux=pkg.GitLib(direpa=direpa_src, ssh_mux=ssh_mux)
+        print(ssh_mux.get_ssh_cmd())
+        print(git_mux.get_remote_branches(remote_name="origin", show_cmds=True), ssh_mux.get_sockets())
+
+    git_service=pkg.GitLib(direpa=direpa_src, service=True)
+    try:
+        git_service.commit()
+    except pkg.PromptRequiredError as e:
+        print(type(e).__name__, e)
+    commit_result=git_service.commit(message="service commit")
+    print(commit_result.committed, commit_result.files, [(message.level, message.text) for message in git_service.pop_messages()])
+
+    direpa_planned=os.path.join(direpa_project, "planned")
+    os.makedirs(direpa_planned, exist_ok=True)
+    git_plan=pkg.GitLib(direpa=direpa_planned)
+    plan=git_plan.start_plan()
+    git_plan.init()
+    git_plan.set_user(username="planner", email="planner@example.com")
+    git_plan.commit(message="planned commit")
+    git_plan.stop_plan()
+    print(plan.get_script())
+    print(pkg.CommandPlan.from_json(plan.to_json()).get_cmds())
+    plan.run()
+    git_plan.refresh()
+
+    for _ in range(2):
+        print(git_plan.get_user_name(show_cmds=True), git_plan.get_user_email(show_cmds=True), git_plan.get_remote_names(show_cmds=True))
+    git_plan.set_user_email("planner@example.org")
+    print(git_plan.get_user_email(show_cmds=True))
+
+    snapshot=git.get_snapshot(show_cmds=True)
+    print(snapshot, snapshot.active_branch_name, list(snapshot.heads), list(snapshot.remote_branches), list(snapshot.tags))
+    git.checkout("work")
+    for change in git.get_snapshot().diff(snapshot):
+        print(change.kind, change.name)
+    git.checkout("dev")
+
+    git.cmd("git commit-graph write --reachable")
+    git_graph=pkg.GitLib(direpa=direpa_src, native=True)
+    print(git_graph.get_branch_compare_status("work", "dev", show_cmds=True))
+    print({name: (compare.status, compare.ahead, compare.behind) for name, compare in git_graph.get_branches_compare_status(compare_branch="dev", show_cmds=True).items()})
+
+    scheduler=pkg.MaintenanceScheduler([direpa_repository_git, direpa_src], budget=60, loose_objects_limit=10)
+    print(scheduler.get_health())
+    for maintenance_result in scheduler.run():
+        print(maintenance_result, maintenance_result.health)
+
+    clone_cache=pkg.CloneCache(os.path.join(direpa_project, "clone_cache"), max_age=60)
+    for filen in ["cached", "cached_again"]:
+        git.clone(direpa_src=direpa_repository_git, direpa_dst=os.path.join(direpa_project, filen), remote_name="origin", clone_cache=clone_cache, quiet=True)
+    git.clone(direpa_src=direpa_repository_git, direpa_dst=os.path.join(direpa_project, "shallow"), remote_name="origin", depth=1, single_branch=True, branch="main", no_checkout=True, quiet=True)
+    print(clone_cache.get_mirrors(), os.listdir(os.path.join(direpa_project, "cached", ".git", "objects", "info")))
+
+    print(git.fetch_remotes(jobs=2, prune=True, show_only=True))
+    for fetched_ref in git.fetch_remotes(remote_names=["origin"], prune=True, refspecs=["+refs/heads/*:refs/remotes/origin/*"], negotiation_tips=["refs/remotes/origin/*"]):
+        print(fetched_ref.kind, fetched_ref.refname, fetched_ref.old_sha, fetched_ref.new_sha)